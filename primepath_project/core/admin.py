@@ -4,8 +4,8 @@ from .models import School, Teacher, Program, SubProgram, CurriculumLevel, Place
 
 @admin.register(School)
 class SchoolAdmin(admin.ModelAdmin):
-    list_display = ['name', 'created_at']
-    search_fields = ['name']
+    list_display = ['name', 'normalized_name', 'created_at']
+    search_fields = ['name', 'normalized_name']
 
 
 @admin.register(Teacher)
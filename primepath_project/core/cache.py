@@ -0,0 +1,86 @@
+"""
+Versioned in-process caches for compiled lookup structures.
+
+A compiled structure (for example the placement rule table) is built once per
+worker process and kept in memory. Its freshness is tracked by a version token
+stored in the shared Django cache: writers bump the token after their
+transaction commits, and every worker compares tokens on lookup and rebuilds
+when they differ. If the shared cache cannot hold the token (DummyCache, cache
+outage) the structure is still invalidated locally, which keeps single-process
+deployments consistent.
+"""
+import logging
+import threading
+import uuid
+from typing import Any, Callable, Dict
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .constants import COMPILED_CACHE_KEY_PREFIX
+
+logger = logging.getLogger(__name__)
+
+_registry: Dict[str, 'CompiledCache'] = {}
+
+
+class CompiledCache:
+    """Holds one compiled value per process, rebuilt when its version changes."""
+
+    def __init__(self, name: str, builder: Callable[[], Any]):
+        self.name = name
+        self.builder = builder
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = None
+        self._local_generation = 0
+        _registry[name] = self
+
+    @property
+    def version_key(self) -> str:
+        return f'{COMPILED_CACHE_KEY_PREFIX}{self.name}_version'
+
+    def _shared_version(self):
+        try:
+            version = cache.get(self.version_key)
+            if version is None:
+                cache.add(self.version_key, uuid.uuid4().hex, timeout=None)
+                version = cache.get(self.version_key)
+            return version
+        except Exception as e:
+            logger.warning(f"Shared cache unavailable for {self.name}: {e}")
+            return None
+
+    def get(self) -> Any:
+        """Return the compiled value, rebuilding it if it is stale."""
+        # Read the version before building so a concurrent invalidation is
+        # picked up on the next lookup instead of being masked.
+        version = (self._shared_version(), self._local_generation)
+        if self._version == version:
+            return self._value
+
+        with self._lock:
+            if self._version != version:
+                self._value = self.builder()
+                self._version = version
+                logger.info(f"Compiled {self.name} (version {version[0]})")
+            return self._value
+
+    def invalidate(self) -> None:
+        """Mark the value stale in this process and in every other worker."""
+        with self._lock:
+            self._local_generation += 1
+            self._version = None
+            self._value = None
+        try:
+            cache.set(self.version_key, uuid.uuid4().hex, timeout=None)
+        except Exception as e:
+            logger.warning(f"Could not publish new version for {self.name}: {e}")
+
+    def invalidate_on_commit(self) -> None:
+        """Invalidate once the surrounding transaction (if any) commits."""
+        transaction.on_commit(self.invalidate)
+
+
+def get_compiled_cache(name: str) -> CompiledCache:
+    return _registry[name]
@@ -16,6 +16,22 @@ ACADEMIC_RANK_PERCENTILES = {
 # Reverse mapping for display purposes
 PERCENTILE_TO_RANK = {v: k for k, v in ACADEMIC_RANK_PERCENTILES.items()}
 
+# Percentile range stored for each row of the placement rules matrix.
+# The ranks the matrix UI offers (top_10, top_20, top_30, average,
+# below_average) are disjoint, so a student percentile matches at most one of
+# their cells. top_40, top_50 and below_50 only label rules saved by older
+# versions of the matrix and overlap average and below_average.
+MATRIX_RANK_PERCENTILE_RANGES = {
+    'top_10': (0, 10),
+    'top_20': (11, 20),
+    'top_30': (21, 30),
+    'top_40': (31, 40),
+    'top_50': (41, 50),
+    'below_50': (51, 100),
+    'average': (31, 70),
+    'below_average': (71, 100),
+}
+
 # Question type constants
 QUESTION_TYPES = {
     'MCQ': 'Multiple Choice',
@@ -25,6 +41,21 @@ QUESTION_TYPES = {
     'MIXED': 'Mixed',
 }
 
+# Exam selection strategies for levels with several mapped exams
+MAX_EXAM_SLOTS = 5
+EXAM_SELECTION_UNIFORM = 'uniform'
+EXAM_SELECTION_WEIGHTED = 'weighted'
+EXAM_SELECTION_ROUND_ROBIN = 'round_robin'
+EXAM_SELECTION_LEAST_LOADED = 'least_loaded'
+
+# How submitted answers reach StudentAnswer
+ANSWER_WRITE_DIRECT = 'direct'
+ANSWER_WRITE_BEHIND = 'write_behind'
+
+# Where a session's answers are stored
+ANSWER_STORAGE_ROWS = 'rows'
+ANSWER_STORAGE_PACKED = 'packed'
+
 # Default values
 DEFAULT_EXAM_TIMER_MINUTES = 60
 DEFAULT_OPTIONS_COUNT = 5
@@ -41,8 +72,16 @@ MAX_PDF_SIZE = 10 * 1024 * 1024  # 10MB
 MAX_AUDIO_SIZE = 50 * 1024 * 1024  # 50MB
 MAX_IMAGE_SIZE = 5 * 1024 * 1024  # 5MB
 
+# Bytes read per step when the async audio view streams a file
+AUDIO_STREAM_CHUNK_SIZE = 64 * 1024
+
 # Session settings
 SESSION_TIMEOUT_HOURS = 24
+# Minutes past the exam timer before an unfinished session is auto-completed
+SESSION_EXPIRY_GRACE_MINUTES = 10
+SESSION_REAPER_BATCH_SIZE = 200
+# Seconds after deadline_at that answers are still accepted (covers request latency)
+SESSION_DEADLINE_GRACE_SECONDS = 30
 MIN_PASSING_PERCENTAGE = 70
 
 # Grade limits
@@ -53,10 +92,43 @@ MAX_GRADE = 12
 DEFAULT_PAGE_SIZE = 20
 MAX_PAGE_SIZE = 100
 
+# Short answer matching (defaults of the PLACEMENT_SHORT_ANSWER_* settings)
+SHORT_ANSWER_IGNORE_CASE = True
+SHORT_ANSWER_IGNORE_PUNCTUATION = False
+SHORT_ANSWER_COLLAPSE_WHITESPACE = True
+SHORT_ANSWER_MAX_DISTANCE = 0  # typos (Levenshtein edits) tolerated; 0 for exact matching
+SHORT_ANSWER_FUZZY_MIN_LENGTH = 5  # shorter answers must match exactly
+
+# Partial-credit schemes and the question types they apply to (others grade
+# all or nothing)
+SCORING_ALL_OR_NOTHING = 'ALL_OR_NOTHING'
+SCORING_PER_OPTION = 'PER_OPTION'
+SCORING_RIGHT_MINUS_WRONG = 'RIGHT_MINUS_WRONG'
+SCORING_PER_PART = 'PER_PART'
+SCORING_SCHEMES_BY_TYPE = {
+    'MCQ': (SCORING_ALL_OR_NOTHING,),
+    'CHECKBOX': (SCORING_ALL_OR_NOTHING, SCORING_PER_OPTION, SCORING_RIGHT_MINUS_WRONG),
+    'SHORT': (SCORING_ALL_OR_NOTHING, SCORING_PER_PART),
+    'LONG': (SCORING_ALL_OR_NOTHING,),
+    'MIXED': (SCORING_ALL_OR_NOTHING, SCORING_PER_PART),
+}
+
+# Regrading after answer key changes
+REGRADE_CHUNK_SIZE = 200  # sessions regraded per transaction
+# A running job whose heartbeat is older than this is taken to have died and
+# is resumed by the next runner; must be well above the time one chunk takes
+REGRADE_STALE_SECONDS = 600
+
 # Cache settings
 CACHE_TTL_SECONDS = 3600  # 1 hour
 CURRICULUM_CACHE_KEY_PREFIX = 'curriculum_'
 EXAM_CACHE_KEY_PREFIX = 'exam_'
+COMPILED_CACHE_KEY_PREFIX = 'compiled_'
+ANSWER_BUFFER_KEY_PREFIX = 'answer_buf_'
+SESSION_SNAPSHOT_KEY_PREFIX = 'session_snapshot_'
+SESSION_DEADLINE_KEY_PREFIX = 'session_deadline_'
+ANSWER_IDEMPOTENCY_KEY_PREFIX = 'answer_idem_'
+ANSWER_KEY_CACHE_SIZE = 200  # compiled answer keys kept per process (exams)
 
 # API rate limiting
 API_RATE_LIMIT_PER_MINUTE = 60
@@ -70,4 +142,11 @@ STUDENT_EMAIL_NOTIFICATIONS = False
 FEATURE_DIFFICULTY_ADJUSTMENT = True
 FEATURE_AUDIO_SUPPORT = True
 FEATURE_LONG_ANSWER_QUESTIONS = True
-FEATURE_AUTO_GRADING = True
\ No newline at end of file
+FEATURE_AUTO_GRADING = True
+
+# School directory
+SCHOOL_AUTOCOMPLETE_LIMIT = 10
+# Trigram (Jaccard) similarity a near match needs to be suggested
+SCHOOL_FUZZY_MIN_SIMILARITY = 0.3
+# Browser cache lifetime of autocomplete responses
+SCHOOL_AUTOCOMPLETE_MAX_AGE_SECONDS = 300
@@ -3,6 +3,7 @@ Decorators for consistent error handling and logging across the application.
 """
 import functools
 import logging
+from asgiref.sync import iscoroutinefunction, sync_to_async
 from django.http import JsonResponse
 from django.shortcuts import render, redirect
 from django.contrib.auth.decorators import login_required
@@ -11,68 +12,98 @@ from .exceptions import PrimePathException
 logger = logging.getLogger(__name__)
 
 
+def _error_response(func, request, e, template_name, ajax_only):
+    """
+    Log an exception raised by a view and build the response for it.
+    
+    Returns:
+        Error response, or None if the exception should propagate
+    """
+    if isinstance(e, PrimePathException):
+        # Log the custom exception with details
+        logger.warning(
+            f"PrimePath exception in {func.__name__}: {e.message}",
+            extra={
+                'code': e.code,
+                'details': e.details,
+                'user': getattr(request.user, 'username', 'anonymous'),
+                'path': request.path
+            }
+        )
+        
+        if ajax_only or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({
+                'success': False,
+                'error': e.message,
+                'code': e.code,
+                'details': e.details
+            }, status=e.status_code)
+        if template_name:
+            return render(request, template_name, {
+                'error': e.message,
+                'error_code': e.code
+            }, status=e.status_code)
+        return None
+    
+    # Log unexpected exceptions
+    logger.error(
+        f"Unexpected error in {func.__name__}: {str(e)}",
+        exc_info=e,
+        extra={
+            'user': getattr(request.user, 'username', 'anonymous'),
+            'path': request.path
+        }
+    )
+    
+    if ajax_only or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+        return JsonResponse({
+            'success': False,
+            'error': 'An unexpected error occurred. Please try again.'
+        }, status=500)
+    if template_name:
+        return render(request, template_name, {
+            'error': 'An unexpected error occurred.'
+        }, status=500)
+    return None
+
+
 def handle_errors(view_func=None, *, template_name=None, ajax_only=False):
     """
     Decorator for consistent error handling in views.
     
+    Works on sync and async views; for async views the error response is
+    built in a worker thread, since logging and templates may touch the
+    database (request.user).
+    
     Args:
         template_name: Template to render for non-AJAX requests on error
         ajax_only: If True, always return JSON responses
     """
     def decorator(func):
+        if iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(request, *args, **kwargs):
+                try:
+                    return await func(request, *args, **kwargs)
+                except Exception as e:
+                    response = await sync_to_async(_error_response)(
+                        func, request, e, template_name, ajax_only
+                    )
+                    if response is None:
+                        raise
+                    return response
+            
+            return async_wrapper
+        
         @functools.wraps(func)
         def wrapper(request, *args, **kwargs):
             try:
                 return func(request, *args, **kwargs)
-            except PrimePathException as e:
-                # Log the custom exception with details
-                logger.warning(
-                    f"PrimePath exception in {func.__name__}: {e.message}",
-                    extra={
-                        'code': e.code,
-                        'details': e.details,
-                        'user': getattr(request.user, 'username', 'anonymous'),
-                        'path': request.path
-                    }
-                )
-                
-                if ajax_only or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    return JsonResponse({
-                        'success': False,
-                        'error': e.message,
-                        'code': e.code,
-                        'details': e.details
-                    }, status=400)
-                else:
-                    if template_name:
-                        return render(request, template_name, {
-                            'error': e.message,
-                            'error_code': e.code
-                        }, status=400)
-                    raise
-                    
             except Exception as e:
-                # Log unexpected exceptions
-                logger.error(
-                    f"Unexpected error in {func.__name__}: {str(e)}",
-                    exc_info=True,
-                    extra={
-                        'user': getattr(request.user, 'username', 'anonymous'),
-                        'path': request.path
-                    }
-                )
-                
-                if ajax_only or request.headers.get('X-Requested-With') == 'XMLHttpRequest':
-                    return JsonResponse({
-                        'success': False,
-                        'error': 'An unexpected error occurred. Please try again.'
-                    }, status=500)
-                else:
-                    if template_name:
-                        return render(request, template_name, {
-                            'error': 'An unexpected error occurred.'
-                        }, status=500)
+                response = _error_response(func, request, e, template_name, ajax_only)
+                if response is None:
                     raise
+                return response
                     
         return wrapper
     
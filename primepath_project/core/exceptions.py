@@ -6,6 +6,8 @@ These provide specific error handling for different scenarios.
 class PrimePathException(Exception):
     """Base exception for all PrimePath custom exceptions"""
     default_message = "An error occurred in PrimePath"
+    # HTTP status used by handle_errors for JSON/template error responses
+    status_code = 400
     
     def __init__(self, message=None, code=None, details=None):
         self.message = message or self.default_message
@@ -42,11 +44,25 @@ class SessionException(PrimePathException):
 class SessionAlreadyCompletedException(SessionException):
     """Raised when trying to modify a completed session"""
     default_message = "Session has already been completed"
+    status_code = 409
+
+
+class SessionExpiredException(SessionException):
+    """Raised when a session is written to after its deadline"""
+    default_message = "Time is up for this test"
+    status_code = 409
 
 
 class SessionNotFoundException(SessionException):
     """Raised when a session cannot be found"""
     default_message = "Session not found"
+    status_code = 404
+
+
+class AnswersNotSavedException(SessionException):
+    """Raised when buffered answers could not be written before grading"""
+    default_message = "Some answers are still being saved, please try again"
+    status_code = 503
 
 
 class FileProcessingException(PrimePathException):
@@ -0,0 +1,62 @@
+"""
+Management command to check placement rules for gaps, overlaps and
+unreachable rules across grades 1-12.
+"""
+import json
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = 'Report gaps, overlaps and unreachable placement rules for every grade'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the full analysis as JSON',
+        )
+        parser.add_argument(
+            '--show-info',
+            action='store_true',
+            help='Also list informational findings (unreachable gaps, overlaps resolved by priority)',
+        )
+        parser.add_argument(
+            '--fail-on-warning',
+            action='store_true',
+            help='Exit with an error when warnings are found, not only errors',
+        )
+
+    def handle(self, *args, **options):
+        from placement_test.services import PlacementService
+
+        analysis = PlacementService.analyze_rules()
+
+        if options['json']:
+            self.stdout.write(json.dumps(analysis, indent=2))
+        else:
+            styles = {
+                'error': self.style.ERROR,
+                'warning': self.style.WARNING,
+                'info': lambda text: text,
+            }
+            for item in analysis['issues']:
+                if item['severity'] == 'info' and not options['show_info']:
+                    continue
+                affects = (
+                    f" (affects {', '.join(item['academic_ranks'])})"
+                    if item['academic_ranks'] else ''
+                )
+                self.stdout.write(styles[item['severity']](
+                    f"[{item['severity'].upper()}] {item['message']}{affects}"
+                ))
+
+            counts = analysis['counts']
+            self.stdout.write(
+                f"{analysis['rule_count']} rules checked: {counts['error']} errors, "
+                f"{counts['warning']} warnings, {counts['info']} info."
+            )
+
+        if not analysis['is_valid']:
+            raise CommandError('Placement rules have errors.')
+        if options['fail_on_warning'] and analysis['counts']['warning']:
+            raise CommandError('Placement rules have warnings.')
@@ -0,0 +1,61 @@
+"""
+Management command that lists the schools migration core 0004 merges.
+
+The migration merges schools whose names share a normalized key (case,
+punctuation, whitespace and the school-type suffix; see its frozen copy of
+normalize_school_name) and deletes all but the oldest of each group. That
+cannot be undone, so run this first, before `migrate core`, and rename any
+school that would be merged by mistake. It only reads the school names, so
+it also works on a database the migration has not run on yet.
+"""
+import csv
+import importlib
+import sys
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+
+
+class Command(BaseCommand):
+    help = 'List the schools that migration core 0004 merges into one (dry run)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--csv',
+            action='store_true',
+            help='Print one line per merged school as CSV',
+        )
+
+    def handle(self, *args, **options):
+        from core.models import School
+        from placement_test.models import StudentSession
+
+        migration = importlib.import_module('core.migrations.0004_school_normalized_name')
+        groups = migration.plan_school_merges(
+            School.objects.order_by('created_at', 'id').values_list('id', 'name')
+        )
+        sessions = dict(
+            StudentSession.objects.filter(school__isnull=False)
+            .values_list('school_id').annotate(count=Count('id'))
+        )
+        merges = [
+            (key, members[0], school)
+            for key, members in groups.items()
+            for school in members[1:]
+        ]
+
+        if options['csv']:
+            writer = csv.writer(sys.stdout)
+            writer.writerow(['key', 'kept_id', 'kept_name', 'merged_id', 'merged_name', 'sessions_moved'])
+            for key, (kept_id, kept_name), (school_id, name) in merges:
+                writer.writerow([key, kept_id, kept_name, school_id, name, sessions.get(school_id, 0)])
+            return
+
+        for key, (kept_id, kept_name), (school_id, name) in merges:
+            self.stdout.write(
+                f'{name!r} (id {school_id}, {sessions.get(school_id, 0)} sessions) '
+                f'-> {kept_name!r} (id {kept_id})  [{key}]'
+            )
+        self.stdout.write(
+            f'{len(merges)} of {sum(len(members) for members in groups.values())} schools '
+            f'would be merged into {sum(1 for members in groups.values() if len(members) > 1)} others.'
+        )
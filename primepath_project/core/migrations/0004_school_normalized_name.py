@@ -0,0 +1,132 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:10
+
+import logging
+import unicodedata
+
+from django.db import migrations, models
+
+logger = logging.getLogger(__name__)
+
+
+# Frozen copy of core.schools.normalize_school_name as of this migration, so
+# later changes to the heuristics do not change what it does
+ELEMENTARY_SUFFIX = '초등학교'
+MIDDLE_SUFFIX = '중학교'
+HIGH_SUFFIX = '고등학교'
+
+LATIN_SUFFIXES = [
+    (('elementary', 'school'), ELEMENTARY_SUFFIX),
+    (('primary', 'school'), ELEMENTARY_SUFFIX),
+    (('middle', 'school'), MIDDLE_SUFFIX),
+    (('high', 'school'), HIGH_SUFFIX),
+    (('elementary',), ELEMENTARY_SUFFIX),
+    (('elem',), ELEMENTARY_SUFFIX),
+    (('es',), ELEMENTARY_SUFFIX),
+    (('middle',), MIDDLE_SUFFIX),
+    (('ms',), MIDDLE_SUFFIX),
+    (('high',), HIGH_SUFFIX),
+    (('hs',), HIGH_SUFFIX),
+]
+
+HANGUL_SUFFIXES = [
+    ('여자고등학교', '여자' + HIGH_SUFFIX),
+    ('여자중학교', '여자' + MIDDLE_SUFFIX),
+    (ELEMENTARY_SUFFIX, ELEMENTARY_SUFFIX),
+    (HIGH_SUFFIX, HIGH_SUFFIX),
+    (MIDDLE_SUFFIX, MIDDLE_SUFFIX),
+    ('초등교', ELEMENTARY_SUFFIX),
+    ('초교', ELEMENTARY_SUFFIX),
+    ('여고', '여자' + HIGH_SUFFIX),
+    ('여중', '여자' + MIDDLE_SUFFIX),
+    ('고교', HIGH_SUFFIX),
+    ('초', ELEMENTARY_SUFFIX),
+    ('중', MIDDLE_SUFFIX),
+    ('고', HIGH_SUFFIX),
+]
+
+
+def normalize_school_name(name):
+    text = unicodedata.normalize('NFKC', name or '').casefold()
+    words = ''.join(
+        char if unicodedata.category(char)[0] in 'LN' else ' '
+        for char in text
+    ).split()
+    for suffix, canonical in LATIN_SUFFIXES:
+        if len(words) > len(suffix) and tuple(words[-len(suffix):]) == suffix:
+            return ''.join(words[:-len(suffix)] + [canonical])
+    if words:
+        last = words[-1]
+        for suffix, canonical in HANGUL_SUFFIXES:
+            if last.endswith(suffix) and (len(last) > len(suffix) or len(words) > 1):
+                return ''.join(words[:-1] + [last[:-len(suffix)] + canonical])
+    return ''.join(words)
+
+
+def plan_school_merges(schools):
+    """
+    Group schools by normalized name, oldest first.
+
+    Args:
+        schools: (id, name) pairs in the order the schools were created
+
+    Returns:
+        {key: [(id, name), ...]}; the first school of a group is kept and
+        the others are merged into it
+    """
+    groups = {}
+    for school_id, name in schools:
+        key = normalize_school_name(name) or f'#{school_id}'
+        groups.setdefault(key, []).append((school_id, name))
+    return groups
+
+
+def merge_school_variants(apps, schema_editor):
+    """
+    Backfill normalized_name and merge schools that are spelling variants.
+
+    Schools are merged on the suffix heuristics above alone (case,
+    punctuation, whitespace and the school-type suffix); nothing checks that
+    two merged names are really the same school. The oldest school of each
+    group is kept; sessions pointing at the others are moved to it before
+    they are deleted. This cannot be undone: migrating back drops
+    normalized_name but does not bring the deleted schools back. Run
+    `manage.py report_school_merges` before migrating to see what will be
+    merged; every merge is also logged here.
+
+    Schools whose name has no letters or digits get a key of their own so
+    the unique index can be added.
+    """
+    School = apps.get_model('core', 'School')
+    StudentSession = apps.get_model('placement_test', 'StudentSession')
+
+    groups = plan_school_merges(
+        School.objects.order_by('created_at', 'id').values_list('id', 'name')
+    )
+    for key, members in groups.items():
+        (kept_id, kept_name), merged = members[0], members[1:]
+        School.objects.filter(id=kept_id).update(normalized_name=key)
+        for school_id, name in merged:
+            moved = StudentSession.objects.filter(school_id=school_id).update(school_id=kept_id)
+            School.objects.filter(id=school_id).delete()
+            logger.warning(
+                f"Merged school {school_id} ({name!r}) into {kept_id} ({kept_name!r}), "
+                f"{moved} sessions moved"
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_examlevelmapping'),
+        ('placement_test', '0015_studentsession_packed_answers'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='school',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=200),
+            preserve_default=False,
+        ),
+        migrations.RunPython(merge_school_variants, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.0.1 on 2026-10-16 22:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0004 so the index is built after the merge has committed
+
+    dependencies = [
+        ('core', '0004_school_normalized_name'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='school',
+            name='normalized_name',
+            field=models.CharField(editable=False, max_length=200, unique=True),
+        ),
+    ]
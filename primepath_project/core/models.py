@@ -1,15 +1,42 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
+from django.core.exceptions import ValidationError
+from .schools import normalize_school_name
 
 
 class School(models.Model):
     name = models.CharField(max_length=200)
+    # Directory key shared by spelling variants of the name (see core/schools.py)
+    normalized_name = models.CharField(max_length=200, unique=True, editable=False)
     address = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True, null=True)
 
     def __str__(self):
         return self.name
 
+    def clean(self):
+        key = normalize_school_name(self.name)
+        if not key:
+            raise ValidationError({'name': 'School name must contain letters or digits.'})
+        duplicate = School.objects.filter(normalized_name=key).exclude(pk=self.pk).first()
+        if duplicate:
+            raise ValidationError({'name': f'This is the same school as "{duplicate.name}".'})
+
+    def save(self, *args, **kwargs):
+        key = normalize_school_name(self.name)
+        if not key and self.pk is None:
+            # A name without letters or digits is keyed by its id ('#<id>',
+            # never a normalized key), so it is inserted under a placeholder
+            self.normalized_name = f'#new-{uuid.uuid4().hex}'
+            super().save(*args, **kwargs)
+            self.normalized_name = f'#{self.pk}'
+            School.objects.filter(pk=self.pk).update(normalized_name=self.normalized_name)
+            return
+        self.normalized_name = key or f'#{self.pk}'
+        super().save(*args, **kwargs)
+
 
 class Teacher(models.Model):
     name = models.CharField(max_length=100)
@@ -0,0 +1,244 @@
+"""
+School directory: name normalization, autocomplete and name resolution.
+
+Typed school names are reduced to a normalized key so that spelling variants
+of one school ("서울초" and "서울 초등학교", or "Seoul Elementary School" and
+"Seoul Elem.") resolve to the same School row. The key is NFKC-folded,
+case-folded, stripped of punctuation and whitespace, and has the school-type
+suffix rewritten to one canonical Hangul form in either script. The name
+itself is not transliterated, so a Hangul and a Latin spelling of one school
+are two schools; autocomplete's trigram search only catches typos within one
+script.
+
+The directory used by autocomplete is compiled once per process (see
+core/cache.py) and searched in memory, so the start page no longer ships the
+full school list.
+"""
+import bisect
+import logging
+import unicodedata
+from typing import Any, Dict, List
+
+from .cache import CompiledCache
+from .constants import SCHOOL_AUTOCOMPLETE_LIMIT, SCHOOL_FUZZY_MIN_SIMILARITY
+
+logger = logging.getLogger(__name__)
+
+ELEMENTARY_SUFFIX = '초등학교'
+MIDDLE_SUFFIX = '중학교'
+HIGH_SUFFIX = '고등학교'
+
+# Trailing words (Latin spellings) and their canonical suffix, longest first
+LATIN_SUFFIXES = [
+    (('elementary', 'school'), ELEMENTARY_SUFFIX),
+    (('primary', 'school'), ELEMENTARY_SUFFIX),
+    (('middle', 'school'), MIDDLE_SUFFIX),
+    (('high', 'school'), HIGH_SUFFIX),
+    (('elementary',), ELEMENTARY_SUFFIX),
+    (('elem',), ELEMENTARY_SUFFIX),
+    (('es',), ELEMENTARY_SUFFIX),
+    (('middle',), MIDDLE_SUFFIX),
+    (('ms',), MIDDLE_SUFFIX),
+    (('high',), HIGH_SUFFIX),
+    (('hs',), HIGH_SUFFIX),
+]
+
+# Trailing Hangul abbreviations and their full form, longest first
+HANGUL_SUFFIXES = [
+    ('여자고등학교', '여자' + HIGH_SUFFIX),
+    ('여자중학교', '여자' + MIDDLE_SUFFIX),
+    (ELEMENTARY_SUFFIX, ELEMENTARY_SUFFIX),
+    (HIGH_SUFFIX, HIGH_SUFFIX),
+    (MIDDLE_SUFFIX, MIDDLE_SUFFIX),
+    ('초등교', ELEMENTARY_SUFFIX),
+    ('초교', ELEMENTARY_SUFFIX),
+    ('여고', '여자' + HIGH_SUFFIX),
+    ('여중', '여자' + MIDDLE_SUFFIX),
+    ('고교', HIGH_SUFFIX),
+    ('초', ELEMENTARY_SUFFIX),
+    ('중', MIDDLE_SUFFIX),
+    ('고', HIGH_SUFFIX),
+]
+
+
+def _words(name: str) -> List[str]:
+    """NFKC- and case-folded words of a name, punctuation dropped."""
+    text = unicodedata.normalize('NFKC', name or '').casefold()
+    return ''.join(
+        char if unicodedata.category(char)[0] in 'LN' else ' '
+        for char in text
+    ).split()
+
+
+def _canonical_suffix(words: List[str]) -> List[str]:
+    for suffix, canonical in LATIN_SUFFIXES:
+        if len(words) > len(suffix) and tuple(words[-len(suffix):]) == suffix:
+            return words[:-len(suffix)] + [canonical]
+
+    if words:
+        last = words[-1]
+        for suffix, canonical in HANGUL_SUFFIXES:
+            if last.endswith(suffix) and (len(last) > len(suffix) or len(words) > 1):
+                return words[:-1] + [last[:-len(suffix)] + canonical]
+    return words
+
+
+def normalize_school_name(name: str) -> str:
+    """
+    Return the directory key of a school name.
+
+    Args:
+        name: School name as typed
+
+    Returns:
+        Normalized key ('' for a name without letters or digits)
+    """
+    return ''.join(_canonical_suffix(_words(name)))
+
+
+def trigrams(key: str) -> set:
+    """Character trigrams of a normalized key, padded so short keys get some."""
+    padded = f'  {key} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _compile_school_directory() -> Dict[str, Any]:
+    """
+    Compile the directory of all schools for autocomplete.
+
+    Returns a dict with 'schools' ([(id, name)] indexed by a dense ordinal),
+    'prefixes' (sorted [(search key, ordinal)], one for the full key and one
+    per later word as typed and with its canonical suffix, for bisect prefix
+    search), 'keys' ({normalized key:
+    ordinal}), 'trigrams' ({trigram: [ordinal, ...]}) and 'trigram_counts'
+    (number of trigrams of each school's key, by ordinal).
+    """
+    from .models import School
+
+    schools, prefixes, keys, grams, sizes = [], [], {}, {}, []
+    rows = School.objects.order_by('name', 'id').values_list('id', 'name', 'normalized_name')
+    for ordinal, (school_id, name, key) in enumerate(rows):
+        schools.append((school_id, name))
+        keys.setdefault(key, ordinal)
+        prefixes.append((key, ordinal))
+        words = _words(name)
+        later = set()
+        for variant in (words, _canonical_suffix(words)):
+            later.update(''.join(variant[start:]) for start in range(1, len(variant)))
+        prefixes.extend((search_key, ordinal) for search_key in later - {key})
+        key_grams = trigrams(key)
+        sizes.append(len(key_grams))
+        for gram in key_grams:
+            grams.setdefault(gram, []).append(ordinal)
+    prefixes.sort()
+    return {
+        'schools': schools,
+        'prefixes': prefixes,
+        'keys': keys,
+        'trigrams': grams,
+        'trigram_counts': sizes,
+    }
+
+
+school_directory = CompiledCache('school_directory', _compile_school_directory)
+
+
+def _prefix_matches(directory: Dict[str, Any], prefix: str) -> List[int]:
+    prefixes = directory['prefixes']
+    matches = []
+    for search_key, ordinal in prefixes[bisect.bisect_left(prefixes, (prefix,)):]:
+        if not search_key.startswith(prefix):
+            break
+        matches.append(ordinal)
+    return matches
+
+
+def _fuzzy_matches(directory: Dict[str, Any], key: str) -> List[int]:
+    """Ordinals of schools whose key shares enough trigrams with key, best first."""
+    query_grams = trigrams(key)
+    overlaps = {}
+    for gram in query_grams:
+        for ordinal in directory['trigrams'].get(gram, ()):
+            overlaps[ordinal] = overlaps.get(ordinal, 0) + 1
+
+    counts = directory['trigram_counts']
+    scored = []
+    for ordinal, overlap in overlaps.items():
+        similarity = overlap / (len(query_grams) + counts[ordinal] - overlap)
+        if similarity >= SCHOOL_FUZZY_MIN_SIMILARITY:
+            scored.append((-similarity, ordinal))
+    scored.sort()
+    return [ordinal for _, ordinal in scored]
+
+
+def search_schools(query: str, limit: int = SCHOOL_AUTOCOMPLETE_LIMIT) -> List[Dict[str, Any]]:
+    """
+    Autocomplete schools for a partly typed name.
+
+    An exact key match comes first, then schools whose name or a later word
+    of it starts with the query (shortest names first), then near matches by
+    trigram similarity to fill up the limit.
+
+    Args:
+        query: Text typed so far
+        limit: Maximum number of results
+
+    Returns:
+        List of {'id', 'name'} dicts
+    """
+    raw = ''.join(_words(query))
+    key = normalize_school_name(query)
+    if not raw:
+        return []
+
+    directory = school_directory.get()
+    ordinals = []
+    if key in directory['keys']:
+        ordinals.append(directory['keys'][key])
+    # The raw form keeps an abbreviation being typed ("서울초") a prefix
+    prefix_hits = set()
+    for prefix in {raw, key}:
+        prefix_hits.update(_prefix_matches(directory, prefix))
+    schools = directory['schools']
+    ordinals.extend(sorted(prefix_hits, key=lambda ordinal: (len(schools[ordinal][1]), ordinal)))
+    if len(set(ordinals)) < limit:
+        ordinals.extend(_fuzzy_matches(directory, key))
+
+    results, seen = [], set()
+    for ordinal in ordinals:
+        if ordinal in seen:
+            continue
+        seen.add(ordinal)
+        school_id, name = schools[ordinal]
+        results.append({'id': school_id, 'name': name})
+        if len(results) == limit:
+            break
+    return results
+
+
+def resolve_school(name: str):
+    """
+    Return the School a typed name refers to, creating it if it is new.
+
+    Takes one lookup on the unique normalized_name index; a new school is
+    stored under the name as typed (whitespace collapsed).
+
+    Args:
+        name: School name as typed
+
+    Returns:
+        School instance, or None if the name is blank
+    """
+    from .models import School
+
+    key = normalize_school_name(name)
+    if not key:
+        return None
+
+    school, created = School.objects.get_or_create(
+        normalized_name=key,
+        defaults={'name': ' '.join(name.split())}
+    )
+    if created:
+        logger.info(f"Added school {school.name!r} to the directory")
+    return school
@@ -0,0 +1,12 @@
+"""
+Signal handlers that keep compiled core caches in sync with the database.
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .models import School
+from .schools import school_directory
+
+
+@receiver([post_save, post_delete], sender=School)
+def schools_changed(sender, **kwargs):
+    school_directory.invalidate_on_commit()
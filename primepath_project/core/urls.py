@@ -12,6 +12,8 @@ urlpatterns = [
     path('placement-rules/<int:pk>/delete/', views.delete_placement_rule, name='delete_placement_rule'),
     path('api/placement-rules/', views.get_placement_rules, name='get_placement_rules'),
     path('api/placement-rules/save/', views.save_placement_rules, name='save_placement_rules'),
+    path('api/placement-rules/analyze/', views.analyze_placement_rules, name='analyze_placement_rules'),
     path('exam-mapping/', views.exam_mapping, name='exam_mapping'),
     path('api/exam-mappings/save/', views.save_exam_mappings, name='save_exam_mappings'),
+    path('api/schools/search/', views.school_search, name='school_search'),
 ]
\ No newline at end of file
@@ -1,12 +1,30 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse
 from django.views.decorators.http import require_http_methods
+from django.views.decorators.cache import cache_control
 from django.contrib import messages
 from django.db import transaction
 from .models import Teacher, Program, SubProgram, CurriculumLevel, PlacementRule
+from .constants import MATRIX_RANK_PERCENTILE_RANGES, SCHOOL_AUTOCOMPLETE_LIMIT, SCHOOL_AUTOCOMPLETE_MAX_AGE_SECONDS
+from .schools import search_schools
 import json
 
 
+def _matrix_to_rules(rules_data):
+    """Build unsaved PlacementRule instances from placement matrix cells."""
+    rules = []
+    for rule_data in rules_data:
+        min_perc, max_perc = MATRIX_RANK_PERCENTILE_RANGES.get(rule_data['rank'], (0, 100))
+        rules.append(PlacementRule(
+            grade=int(rule_data['grade']),
+            min_rank_percentile=min_perc,
+            max_rank_percentile=max_perc,
+            curriculum_level_id=int(rule_data['curriculum_level_id']),
+            priority=1  # Default priority
+        ))
+    return rules
+
+
 def index(request):
     return render(request, 'core/index.html')
 
@@ -159,7 +177,8 @@ def get_placement_rules(request):
     rules = PlacementRule.objects.all()
     rules_data = []
     
-    # Convert academic rank to our rank system
+    # Matrix rows by stored range; older rules are matched on their upper bound
+    rank_by_range = {ranges: rank for rank, ranges in MATRIX_RANK_PERCENTILE_RANGES.items()}
     rank_mapping = {
         10: 'top_10',
         20: 'top_20', 
@@ -171,11 +190,13 @@ def get_placement_rules(request):
     
     for rule in rules:
         # Find the appropriate rank value
-        rank_value = 'below_50'  # default
-        for percentile, rank_key in rank_mapping.items():
-            if rule.max_rank_percentile <= percentile:
-                rank_value = rank_key
-                break
+        rank_value = rank_by_range.get((rule.min_rank_percentile, rule.max_rank_percentile))
+        if rank_value is None:
+            rank_value = 'below_50'  # default
+            for percentile, rank_key in rank_mapping.items():
+                if rule.max_rank_percentile <= percentile:
+                    rank_value = rank_key
+                    break
                 
         rules_data.append({
             'grade': rule.grade,
@@ -186,40 +207,50 @@ def get_placement_rules(request):
     return JsonResponse({'success': True, 'rules': rules_data})
 
 
+@require_http_methods(["GET", "POST"])
+def analyze_placement_rules(request):
+    """Report gaps, overlaps and unreachable rules for stored or proposed rules"""
+    from placement_test.services import PlacementService
+    
+    try:
+        rules = None
+        if request.method == 'POST':
+            data = json.loads(request.body)
+            rules = _matrix_to_rules(data.get('rules', []))
+        
+        analysis = PlacementService.analyze_rules(rules)
+        return JsonResponse({'success': True, **analysis})
+    except Exception as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+
 @require_http_methods(["POST"]) 
 def save_placement_rules(request):
     """Save placement rules from the matrix view"""
     try:
-        data = json.loads(request.body)
-        rules = data.get('rules', [])
+        from placement_test.services import PlacementService
         
-        # Clear existing rules
-        PlacementRule.objects.all().delete()
+        data = json.loads(request.body)
+        rules = _matrix_to_rules(data.get('rules', []))
         
-        # Define percentile ranges for each rank
-        rank_percentiles = {
-            'top_10': (0, 10),
-            'top_20': (10, 20),
-            'top_30': (20, 30),
-            'top_40': (30, 40),
-            'top_50': (40, 50),
-            'below_50': (50, 100),
-        }
+        # Reject matrices that would leave students with an ambiguous or dead rule
+        analysis = PlacementService.analyze_rules(rules)
+        if not analysis['is_valid']:
+            return JsonResponse({
+                'success': False,
+                'error': 'Placement matrix has conflicting or unreachable rules',
+                **analysis
+            }, status=400)
         
-        # Create new rules
-        for rule_data in rules:
-            rank = rule_data['rank']
-            min_perc, max_perc = rank_percentiles.get(rank, (0, 100))
+        # Replace the rule set atomically so the compiled rule table is
+        # never rebuilt from a half-written matrix
+        with transaction.atomic():
+            PlacementRule.objects.all().delete()
             
-            PlacementRule.objects.create(
-                grade=rule_data['grade'],
-                min_rank_percentile=min_perc,
-                max_rank_percentile=max_perc,
-                curriculum_level_id=rule_data['curriculum_level_id'],
-                priority=1  # Default priority
-            )
+            for rule in rules:
+                rule.save()
         
-        return JsonResponse({'success': True})
+        return JsonResponse({'success': True, **analysis})
     except Exception as e:
         return JsonResponse({'success': False, 'error': str(e)}, status=400)
 
@@ -272,6 +303,7 @@ def exam_mapping(request):
                     level.existing_mappings.append({
                         'slot': mapping.slot,
                         'exam_id': str(mapping.exam.id),
+                        'exam_uuid': mapping.exam_id,
                         'exam_name': mapping.exam.name,
                         'exam_display_name': display_name,
                         'has_pdf': bool(mapping.exam.pdf_file)
@@ -286,6 +318,17 @@ def exam_mapping(request):
                 elif program.name == 'PINNACLE':
                     pinnacle_levels.append(level)
     
+    # Report in-progress sessions per mapped exam (one cache round trip)
+    from placement_test.services.exam_selection import get_exam_loads
+    
+    all_levels = core_levels + ascent_levels + edge_levels + pinnacle_levels
+    loads = get_exam_loads({
+        mapping['exam_uuid'] for level in all_levels for mapping in level.existing_mappings
+    })
+    for level in all_levels:
+        for mapping in level.existing_mappings:
+            mapping['in_progress'] = loads.get(mapping['exam_uuid'], 0)
+    
     context = {
         'core_levels': core_levels,
         'ascent_levels': ascent_levels,
@@ -350,4 +393,16 @@ def save_exam_mappings(request):
         return JsonResponse({'success': False, 'error': f'Invalid JSON: {str(e)}'}, status=400)
     except Exception as e:
         logger.error(f"Error saving exam mappings: {e}", exc_info=True)
-        return JsonResponse({'success': False, 'error': str(e)}, status=400)
\ No newline at end of file
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+
+@require_http_methods(["GET"])
+@cache_control(public=True, max_age=SCHOOL_AUTOCOMPLETE_MAX_AGE_SECONDS)
+def school_search(request):
+    """Autocomplete schools for the start test form (?q=typed text)"""
+    try:
+        limit = min(int(request.GET.get('limit', SCHOOL_AUTOCOMPLETE_LIMIT)), SCHOOL_AUTOCOMPLETE_LIMIT)
+    except ValueError:
+        limit = SCHOOL_AUTOCOMPLETE_LIMIT
+    results = search_schools(request.GET.get('q', ''), limit=max(limit, 1))
+    return JsonResponse({'success': True, 'results': results})
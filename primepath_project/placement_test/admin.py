@@ -1,5 +1,8 @@
 from django.contrib import admin
-from .models import Exam, AudioFile, Question, StudentSession, StudentAnswer, DifficultyAdjustment
+from .models import (
+    Exam, AudioFile, Question, StudentSession, StudentAnswer, DifficultyAdjustment,
+    RegradeJob, RegradeChange,
+)
 
 
 class AudioFileInline(admin.TabularInline):
@@ -43,8 +46,8 @@ class StudentSessionAdmin(admin.ModelAdmin):
 
 @admin.register(StudentAnswer)
 class StudentAnswerAdmin(admin.ModelAdmin):
-    list_display = ['session', 'question', 'is_correct', 'points_earned']
-    list_filter = ['is_correct', 'question__question_type']
+    list_display = ['session', 'question', 'is_correct', 'points_earned', 'grading_status']
+    list_filter = ['grading_status', 'is_correct', 'question__question_type']
     search_fields = ['session__student_name']
 
 
@@ -52,4 +55,25 @@ class StudentAnswerAdmin(admin.ModelAdmin):
 class DifficultyAdjustmentAdmin(admin.ModelAdmin):
     list_display = ['session', 'from_level', 'to_level', 'adjustment', 'adjusted_at']
     list_filter = ['adjustment']
-    search_fields = ['session__student_name']
\ No newline at end of file
+    search_fields = ['session__student_name']
+
+
+class RegradeChangeInline(admin.TabularInline):
+    model = RegradeChange
+    fields = ['session', 'old_score', 'new_score', 'old_percentage', 'new_percentage']
+    readonly_fields = fields
+    raw_id_fields = ['session']
+    extra = 0
+    can_delete = False
+
+
+@admin.register(RegradeJob)
+class RegradeJobAdmin(admin.ModelAdmin):
+    list_display = ['exam', 'status', 'processed_sessions', 'total_sessions', 'changed_sessions', 'created_at', 'finished_at']
+    list_filter = ['status']
+    search_fields = ['exam__name']
+    readonly_fields = [
+        'exam', 'key_version', 'total_sessions', 'processed_sessions', 'changed_sessions',
+        'last_session_id', 'error', 'created_at', 'started_at', 'finished_at', 'heartbeat_at'
+    ]
+    inlines = [RegradeChangeInline]
@@ -3,4 +3,7 @@ from django.apps import AppConfig
 
 class PlacementTestConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'placement_test'
\ No newline at end of file
+    name = 'placement_test'
+
+    def ready(self):
+        from . import signals  # noqa: F401
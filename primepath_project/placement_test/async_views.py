@@ -0,0 +1,101 @@
+"""
+Async versions of the student-facing test endpoints, for ASGI deployments.
+
+With PLACEMENT_ASYNC_VIEWS on (the default under primepath_project/asgi.py)
+urls.py routes answer saves (single and batched), test completion, the test
+page's snapshot and clock polls, and audio streaming here instead of to
+views.py. A request that waits on the database or streams a file then holds
+no worker, so the number of students one process can serve is no longer
+capped by its worker count.
+
+Lookups use the async ORM and cache API. Service calls that need a
+transaction (answer writes, completion) run in a thread through
+sync_to_async, in one hop per request; the parsing and response building are
+shared with the sync views. Audio is read in chunks off the event loop,
+since FileResponse's sync iterator would be read whole into memory by the
+ASGI handler. See ASGI_DEPLOYMENT.md.
+"""
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404
+from django.views.decorators.cache import never_cache
+from django.views.decorators.http import require_http_methods
+from core.constants import AUDIO_STREAM_CHUNK_SIZE
+from core.decorators import handle_errors
+from .models import AudioFile, StudentSession
+from .services import SessionService
+from .views import (
+    _audio_headers, _open_audio, _parse_answer_submission, _parse_answers_submission,
+    _save_answer, _save_answers, _time_payload
+)
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@require_http_methods(["GET"])
+@handle_errors(ajax_only=True)
+async def session_snapshot(request, session_id):
+    """Compact JSON state of a session, used to restore the test page."""
+    return JsonResponse(await sync_to_async(SessionService.get_snapshot)(session_id))
+
+
+@never_cache
+@require_http_methods(["GET"])
+@handle_errors(ajax_only=True)
+async def session_time(request, session_id):
+    """Server clock and session deadline, in epoch milliseconds."""
+    return JsonResponse(_time_payload(await SessionService.aget_deadline(session_id)))
+
+
+@require_http_methods(["POST"])
+@handle_errors(ajax_only=True)
+async def submit_answer(request, session_id):
+    """Submit an answer for a specific question (see views.submit_answer)."""
+    submission = _parse_answer_submission(request)
+    return JsonResponse(await sync_to_async(_save_answer)(session_id, *submission))
+
+
+@require_http_methods(["POST"])
+@handle_errors(ajax_only=True)
+async def submit_answers(request, session_id):
+    """Submit a batch of answers, as the test page autosaves (see views.submit_answers)."""
+    submission = _parse_answers_submission(request)
+    return JsonResponse(await sync_to_async(_save_answers)(session_id, *submission))
+
+
+@require_http_methods(["POST"])
+@handle_errors(ajax_only=True)
+async def complete_test(request, session_id):
+    """Complete a test session and calculate final scores."""
+    session = await aget_object_or_404(StudentSession, id=session_id)
+    completion_results = await sync_to_async(SessionService.complete_session)(session)
+    
+    return JsonResponse({
+        'success': True,
+        'redirect_url': f'/api/placement/session/{session_id}/result/',
+        'results': completion_results
+    })
+
+
+async def _stream_file(file, chunk_size=AUDIO_STREAM_CHUNK_SIZE):
+    """Yield a file's content chunk by chunk, reading in a worker thread."""
+    read = sync_to_async(file.read, thread_sensitive=False)
+    try:
+        while True:
+            chunk = await read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        await sync_to_async(file.close, thread_sensitive=False)()
+
+
+@handle_errors()
+async def get_audio(request, audio_id):
+    """Stream an audio file without holding a worker or loading it into memory."""
+    audio = await aget_object_or_404(AudioFile, id=audio_id)
+    audio_file, size = await sync_to_async(_open_audio, thread_sensitive=False)(audio)
+    
+    response = StreamingHttpResponse(_stream_file(audio_file), content_type='audio/mpeg')
+    return _audio_headers(response, audio, size)
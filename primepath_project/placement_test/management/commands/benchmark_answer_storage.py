@@ -0,0 +1,131 @@
+"""
+Management command that compares the two answer storages side by side.
+
+For each storage ('rows' and 'packed', see services/answer_store.py) it
+creates throwaway sessions on an exam, answers every question, and reports
+the storage footprint per session, the cost of reading a session's answer
+sheet and the cost of saving one answer. Everything runs inside a
+transaction that is rolled back, so it can be pointed at a real database.
+Footprint is measured with pg_column_size and is only reported on
+PostgreSQL; for rows it counts the table rows, not their three index entries.
+"""
+import random
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from placement_test.models import Exam, StudentAnswer, StudentSession
+from placement_test.services import GradingService, SessionService
+from placement_test.services import answer_buffer
+from .benchmark_answer_writes import QueryTimer, Rollback
+
+
+class Command(BaseCommand):
+    help = 'Compare footprint and read/write cost of row and packed answer storage (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', help='Exam UUID (defaults to the active exam with most questions)')
+        parser.add_argument('--sessions', type=int, default=50, help='Sessions per storage')
+        parser.add_argument('--reads', type=int, default=200, help='Answer sheet reads per storage')
+
+    def get_exam(self, exam_id):
+        exams = Exam.objects.filter(is_active=True, questions__isnull=False)
+        if exam_id:
+            exams = Exam.objects.filter(id=exam_id)
+        exam = exams.order_by('-total_questions').first()
+        if exam is None or not exam.questions.exists():
+            raise CommandError('No exam with questions found')
+        return exam
+
+    def create_sessions(self, exam, count, packed, question_ids):
+        sessions = []
+        for _ in range(count):
+            session = StudentSession.objects.create(
+                student_name=f'benchmark-{uuid.uuid4().hex[:8]}',
+                grade=1,
+                academic_rank='TOP_10',
+                exam=exam,
+                packed_answers={} if packed else None,
+            )
+            SessionService.submit_answers(session, [
+                {'question_id': question_id, 'answer': f'answer {question_id}'}
+                for question_id in question_ids
+            ])
+            answer_buffer.flush_session(session.id, wait=True)
+            sessions.append(session)
+        return sessions
+
+    def footprint(self, sessions, packed):
+        """Bytes per session on PostgreSQL, None elsewhere."""
+        if connection.vendor != 'postgresql':
+            return None
+        session_ids = [session.id for session in sessions]
+        with connection.cursor() as cursor:
+            if packed:
+                cursor.execute(
+                    f'SELECT COALESCE(SUM(pg_column_size(packed_answers)), 0) '
+                    f'FROM {StudentSession._meta.db_table} WHERE id = ANY(%s)',
+                    [session_ids]
+                )
+            else:
+                cursor.execute(
+                    f'SELECT COALESCE(SUM(pg_column_size(a.*)), 0) '
+                    f'FROM {StudentAnswer._meta.db_table} a WHERE session_id = ANY(%s)',
+                    [session_ids]
+                )
+            total = cursor.fetchone()[0]
+        return total / len(sessions)
+
+    def measure(self, iterations, action):
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            for i in range(iterations):
+                action(i)
+            elapsed = time.perf_counter() - started
+        return timer.count / iterations, timer.seconds / iterations * 1000, elapsed / iterations * 1000
+
+    def handle(self, *args, **options):
+        exam = self.get_exam(options['exam'])
+        session_count = max(1, options['sessions'])
+        reads = max(1, options['reads'])
+        question_ids = list(exam.questions.values_list('id', flat=True))
+        self.stdout.write(
+            f'Exam {exam.name}: {len(question_ids)} questions, '
+            f'{session_count} sessions and {reads} reads per storage'
+        )
+        self.stdout.write(
+            f"{'storage':<8} {'bytes/session':>14} {'queries/read':>13} {'ms DB/read':>11} "
+            f"{'ms/read':>8} {'queries/save':>13} {'ms DB/save':>11} {'ms/save':>8}"
+        )
+
+        rng = random.Random(0)
+        try:
+            with transaction.atomic():
+                for label, packed in (('rows', False), ('packed', True)):
+                    sessions = self.create_sessions(exam, session_count, packed, question_ids)
+                    footprint = self.footprint(sessions, packed)
+
+                    def read(i):
+                        # What test_result and session_detail do
+                        session = StudentSession.objects.get(id=rng.choice(sessions).id)
+                        GradingService.get_answer_sheet(session)
+
+                    def save(i):
+                        session = sessions[i % len(sessions)]
+                        SessionService.submit_answer(session, rng.choice(question_ids), f'changed {i}')
+
+                    read_cost = self.measure(reads, read)
+                    save_cost = self.measure(reads, save)
+                    footprint = f'{footprint:.0f}' if footprint is not None else 'n/a'
+                    self.stdout.write(
+                        f"{label:<8} {footprint:>14} "
+                        f"{read_cost[0]:>13.2f} {read_cost[1]:>11.3f} {read_cost[2]:>8.3f} "
+                        f"{save_cost[0]:>13.2f} {save_cost[1]:>11.3f} {save_cost[2]:>8.3f}"
+                    )
+                raise Rollback
+        except Rollback:
+            pass
+
+        if connection.vendor != 'postgresql':
+            self.stdout.write('Footprint is only measured on PostgreSQL (pg_column_size).')
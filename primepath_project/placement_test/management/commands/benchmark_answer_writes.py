@@ -0,0 +1,98 @@
+"""
+Management command that measures the database cost of saving answers.
+
+Runs inside a transaction that is rolled back, so it can be pointed at a
+real database: it creates a throwaway session on an exam, answers every
+question once, then times repeated answer changes through each save path.
+"""
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from placement_test.models import Exam, StudentSession
+from placement_test.services import SessionService
+
+
+class Rollback(Exception):
+    pass
+
+
+class QueryTimer:
+    """connection.execute_wrapper that counts queries and sums their time."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = 'Measure queries and DB time per answer save (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', help='Exam UUID (defaults to the active exam with most questions)')
+        parser.add_argument('--iterations', type=int, default=200, help='Answer saves per path')
+
+    def get_exam(self, exam_id):
+        exams = Exam.objects.filter(is_active=True, questions__isnull=False)
+        if exam_id:
+            exams = Exam.objects.filter(id=exam_id)
+        exam = exams.order_by('-total_questions').first()
+        if exam is None or not exam.questions.exists():
+            raise CommandError('No exam with questions found')
+        return exam
+
+    def measure(self, label, iterations, question_ids, save):
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            for i in range(iterations):
+                save(question_ids[i % len(question_ids)], f'answer {i}')
+            elapsed = time.perf_counter() - started
+
+        self.stdout.write(
+            f'{label:<28} {timer.count / iterations:6.2f} queries/save  '
+            f'{timer.seconds / iterations * 1000:7.3f} ms DB/save  '
+            f'{elapsed / iterations * 1000:7.3f} ms total/save'
+        )
+
+    def handle(self, *args, **options):
+        exam = self.get_exam(options['exam'])
+        iterations = options['iterations']
+        question_ids = list(exam.questions.values_list('id', flat=True))
+        self.stdout.write(
+            f'Exam {exam.name}: {len(question_ids)} questions, {iterations} saves per path'
+        )
+
+        try:
+            with transaction.atomic():
+                session = StudentSession.objects.create(
+                    student_name=f'benchmark-{uuid.uuid4().hex[:8]}',
+                    grade=1,
+                    academic_rank='TOP_10',
+                    exam=exam,
+                )
+                for question_id in question_ids:
+                    SessionService.submit_answer(session, question_id, '')
+
+                def full_path(question_id, answer):
+                    # What the endpoint does without the fast path
+                    loaded = StudentSession.objects.get(id=session.id)
+                    SessionService.submit_answer(loaded, question_id, answer)
+
+                def fast_path(question_id, answer):
+                    if not SessionService.update_answer(session.id, question_id, answer):
+                        full_path(question_id, answer)
+
+                self.measure('session load + upsert', iterations, question_ids, full_path)
+                self.measure('conditional UPDATE', iterations, question_ids, fast_path)
+                raise Rollback
+        except Rollback:
+            pass
@@ -0,0 +1,95 @@
+"""
+Management command that measures and checks the cost of completing a session.
+
+For each answer storage it creates throwaway sessions on an exam, one with a
+single answer and one answering every question, completes them through
+SessionService.complete_session and reports queries and time. Completion
+grades in memory and saves all grades at once, so both sessions must take
+the same number of queries; the command fails if they do not, or if either
+takes more than --max-queries, so it can guard that in CI. Everything runs
+inside a transaction that is rolled back.
+"""
+import time
+import uuid
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from placement_test.models import Exam, StudentSession
+from placement_test.services import SessionService
+from placement_test.services import answer_buffer, answer_keys
+from .benchmark_answer_writes import QueryTimer, Rollback
+
+
+class Command(BaseCommand):
+    help = 'Measure and check queries per session completion (changes are rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exam', help='Exam UUID (defaults to the active exam with most questions)')
+        parser.add_argument('--max-queries', type=int, default=12,
+                            help='Fail if completing a session takes more queries')
+
+    def get_exam(self, exam_id):
+        exams = Exam.objects.filter(is_active=True, questions__isnull=False)
+        if exam_id:
+            exams = Exam.objects.filter(id=exam_id)
+        exam = exams.order_by('-total_questions').first()
+        if exam is None or not exam.questions.exists():
+            raise CommandError('No exam with questions found')
+        return exam
+
+    def create_session(self, exam, packed, question_ids):
+        session = StudentSession.objects.create(
+            student_name=f'benchmark-{uuid.uuid4().hex[:8]}',
+            grade=1,
+            academic_rank='TOP_10',
+            exam=exam,
+            packed_answers={} if packed else None,
+        )
+        SessionService.submit_answers(session, [
+            {'question_id': question_id, 'answer': 'A'}
+            for question_id in question_ids
+        ])
+        answer_buffer.flush_session(session.id, wait=True)
+        return StudentSession.objects.select_related('exam').get(id=session.id)
+
+    def measure(self, session):
+        timer = QueryTimer()
+        with connection.execute_wrapper(timer):
+            started = time.perf_counter()
+            SessionService.complete_session(session)
+            elapsed = time.perf_counter() - started
+        return timer.count, timer.seconds * 1000, elapsed * 1000
+
+    def handle(self, *args, **options):
+        exam = self.get_exam(options['exam'])
+        question_ids = list(exam.questions.values_list('id', flat=True))
+        self.stdout.write(f'Exam {exam.name}: {len(question_ids)} questions')
+        # Measure steady state: the compiled answer key is built once per exam version
+        answer_keys.get_answer_key(exam)
+        self.stdout.write(f"{'storage':<8} {'answers':>8} {'queries':>8} {'ms DB':>8} {'ms':>8}")
+
+        problems = []
+        try:
+            with transaction.atomic():
+                for label, packed in (('rows', False), ('packed', True)):
+                    counts = {}
+                    for answered in sorted({1, len(question_ids)}):
+                        session = self.create_session(exam, packed, question_ids[:answered])
+                        queries, db_ms, total_ms = self.measure(session)
+                        counts[answered] = queries
+                        self.stdout.write(
+                            f'{label:<8} {answered:>8} {queries:>8} {db_ms:>8.2f} {total_ms:>8.2f}'
+                        )
+                        if queries > options['max_queries']:
+                            problems.append(
+                                f'{label}: {queries} queries for {answered} answers '
+                                f"(max {options['max_queries']})"
+                            )
+                    if len(set(counts.values())) > 1:
+                        problems.append(f'{label}: query count grows with the number of answers {counts}')
+                raise Rollback
+        except Rollback:
+            pass
+
+        if problems:
+            raise CommandError('; '.join(problems))
+        self.stdout.write('Query count is independent of the number of answers.')
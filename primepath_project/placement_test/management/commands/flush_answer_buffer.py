@@ -0,0 +1,47 @@
+"""
+Management command that writes buffered answers to the database.
+
+Only does something when PLACEMENT_ANSWER_WRITE_MODE is 'write_behind'. Run
+it once (e.g. from cron) or keep it running with --loop as the background
+flush worker.
+"""
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from placement_test.services import answer_buffer
+
+
+class Command(BaseCommand):
+    help = 'Flush write-behind answer buffers to StudentAnswer'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep flushing every --interval seconds until interrupted',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=settings.PLACEMENT_ANSWER_FLUSH_INTERVAL,
+            help='Seconds between flushes in --loop mode (default: PLACEMENT_ANSWER_FLUSH_INTERVAL)',
+        )
+
+    def handle(self, *args, **options):
+        if not answer_buffer.is_enabled():
+            self.stdout.write(self.style.WARNING(
+                'Write-behind mode is off or the cache is not shared; nothing to flush'
+            ))
+            return
+
+        while True:
+            result = answer_buffer.flush_pending()
+            if result['answers'] or not options['loop']:
+                self.stdout.write(
+                    f"Flushed {result['answers']} answers from {result['sessions']} sessions"
+                    + (f", {len(result['incomplete'])} sessions left for the next run"
+                       if result['incomplete'] else '')
+                )
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,216 @@
+"""
+Management command that load tests a running server with simulated students.
+
+Each simulated student goes through a test the way the browser does: opens
+the start page, starts a session, loads the test page, streams the exam's
+audio (with --audio), saves an answer per question with think time in
+between while polling the session clock, and completes the test. Students
+run concurrently in threads; for every concurrency level given with
+--students the command reports latency percentiles per endpoint and errors.
+
+The client only talks HTTP, so it can run from another machine. Run it once
+against the sync stack (gunicorn) and once against the ASGI stack (uvicorn
+workers) with the same options to compare how many concurrent students each
+serves within the latency limit; see ASGI_DEPLOYMENT.md. It creates real
+sessions on the target, so point it at a staging copy, not production.
+"""
+import json
+import random
+import re
+import statistics
+import threading
+import time
+import uuid
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+from django.core.management.base import BaseCommand, CommandError
+
+SESSION_URL = re.compile(r'/api/placement/session/([0-9a-f-]{36})/')
+QUESTION_ID = re.compile(r'data-question-id="(\d+)"')
+AUDIO_URL = re.compile(r'/api/placement/audio/(\d+)/')
+
+
+class StudentFailed(Exception):
+    pass
+
+
+class Results:
+    """Latencies and errors per endpoint, shared by the student threads."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.completed = 0
+
+    def record(self, label, seconds, ok):
+        with self.lock:
+            self.latencies[label].append(seconds)
+            if not ok:
+                self.errors[label] += 1
+
+
+class Student:
+    def __init__(self, base_url, options, results, rng):
+        self.base_url = base_url
+        self.options = options
+        self.results = results
+        self.rng = rng
+        self.cookies = CookieJar()
+        self.opener = build_opener(HTTPCookieProcessor(self.cookies))
+
+    def csrf_token(self):
+        for cookie in self.cookies:
+            if cookie.name == 'csrftoken':
+                return cookie.value
+        return ''
+
+    def request(self, label, path, data=None, json_body=None, headers=None):
+        headers = dict(headers or {})
+        body = None
+        if json_body is not None:
+            body = json.dumps(json_body).encode()
+            headers['Content-Type'] = 'application/json'
+        elif data is not None:
+            body = urlencode(data).encode()
+        if body is not None:
+            headers['X-CSRFToken'] = self.csrf_token()
+
+        started = time.perf_counter()
+        ok = False
+        try:
+            with self.opener.open(
+                Request(self.base_url + path, data=body, headers=headers),
+                timeout=self.options['timeout']
+            ) as response:
+                # Read everything, so streamed responses are timed to the end
+                content = b''.join(iter(lambda: response.read(64 * 1024), b''))
+                ok = True
+                return response.geturl(), content
+        except (HTTPError, URLError, OSError) as e:
+            raise StudentFailed(f'{label}: {e}')
+        finally:
+            self.results.record(label, time.perf_counter() - started, ok)
+
+    def run(self):
+        self.request('start page', '/api/placement/start/')
+        url, page = self.request('start', '/api/placement/start/', data={
+            'csrfmiddlewaretoken': self.csrf_token(),
+            'student_name': f'loadtest-{uuid.uuid4().hex[:8]}',
+            'parent_phone': '010-0000-0000',
+            'grade': self.options['grade'],
+            'academic_rank': self.options['rank'],
+        })
+        match = SESSION_URL.search(url)
+        if not match:
+            raise StudentFailed('start: no session was created')
+        session = f'/api/placement/session/{match.group(1)}/'
+        page = page.decode(errors='replace')
+        question_ids = list(dict.fromkeys(QUESTION_ID.findall(page)))
+
+        self.request('snapshot', session + 'snapshot/')
+        if self.options['audio']:
+            for audio_id in dict.fromkeys(AUDIO_URL.findall(page)):
+                self.request('audio', f'/api/placement/audio/{audio_id}/')
+
+        think_time = self.options['think_time']
+        for number, question_id in enumerate(question_ids, 1):
+            time.sleep(self.rng.uniform(0.5, 1.5) * think_time)
+            # Autosave, as the test page sends it
+            key = uuid.uuid4().hex
+            self.request('save', session + 'submit-batch/', json_body={
+                'answers': [{'question_id': int(question_id), 'answer': self.rng.choice('ABCDE')}],
+                'seq': int(time.time() * 1000),
+                'idempotency_key': key,
+            }, headers={'Idempotency-Key': key})
+            if number % self.options['time_every'] == 0:
+                self.request('time', session + 'time/')
+
+        self.request('complete', session + 'complete/', json_body={})
+        with self.results.lock:
+            self.results.completed += 1
+
+
+class Command(BaseCommand):
+    help = 'Load test a running server with concurrent simulated students (creates sessions)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server')
+        parser.add_argument('--students', default='25,50,100,200',
+                            help='Comma-separated numbers of concurrent students, one run each')
+        parser.add_argument('--ramp', type=float, default=10.0,
+                            help='Seconds over which each run starts its students')
+        parser.add_argument('--think-time', type=float, default=2.0,
+                            help='Mean seconds between two answer saves of a student')
+        parser.add_argument('--time-every', type=int, default=5,
+                            help='Poll the session clock after every N answers')
+        parser.add_argument('--audio', action='store_true', help="Stream the exam's audio files")
+        parser.add_argument('--grade', type=int, default=5)
+        parser.add_argument('--rank', default='TOP_20')
+        parser.add_argument('--timeout', type=float, default=30.0, help='Seconds per request')
+        parser.add_argument('--p95-limit', type=float, default=500.0,
+                            help='Answer save p95 (ms) a run must stay under to count as served')
+
+    def run_step(self, students, options):
+        results = Results()
+        failures = []
+        base_url = options['url'].rstrip('/')
+
+        def simulate(i):
+            time.sleep(options['ramp'] * i / students)
+            try:
+                Student(base_url, options, results, random.Random(i)).run()
+            except StudentFailed as e:
+                failures.append(str(e))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=students) as executor:
+            list(executor.map(simulate, range(students)))
+        return results, failures, time.perf_counter() - started
+
+    def percentile(self, values, fraction):
+        if len(values) < 2:
+            return values[0] * 1000 if values else 0.0
+        return statistics.quantiles(values, n=100, method='inclusive')[int(fraction * 100) - 1] * 1000
+
+    def handle(self, *args, **options):
+        try:
+            steps = [int(value) for value in options['students'].split(',') if value.strip()]
+        except ValueError:
+            raise CommandError('--students must be comma-separated integers')
+        if not steps or min(steps) < 1 or options['time_every'] < 1:
+            raise CommandError('--students and --time-every must be positive')
+
+        capacity = 0
+        for students in steps:
+            results, failures, elapsed = self.run_step(students, options)
+            requests = sum(len(values) for values in results.latencies.values())
+            self.stdout.write(
+                f'\n{students} students: {results.completed} completed, {len(failures)} failed, '
+                f'{requests / elapsed:.1f} requests/s over {elapsed:.1f}s'
+            )
+            self.stdout.write(
+                f"  {'endpoint':<12} {'requests':>9} {'errors':>7} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+            )
+            for label, values in results.latencies.items():
+                self.stdout.write(
+                    f'  {label:<12} {len(values):>9} {results.errors[label]:>7} '
+                    f'{self.percentile(values, 0.5):>9.1f} {self.percentile(values, 0.95):>9.1f} '
+                    f'{self.percentile(values, 0.99):>9.1f}'
+                )
+            for failure in failures[:5]:
+                self.stdout.write(f'  failed: {failure}')
+
+            save_p95 = self.percentile(results.latencies['save'], 0.95)
+            if not failures and results.latencies['save'] and save_p95 <= options['p95_limit']:
+                capacity = max(capacity, students)
+
+        self.stdout.write(
+            f"\nServed without errors and with answer save p95 <= {options['p95_limit']:.0f} ms: "
+            f'up to {capacity} concurrent students' if capacity else
+            f"\nNo run stayed without errors and under the {options['p95_limit']:.0f} ms answer save p95"
+        )
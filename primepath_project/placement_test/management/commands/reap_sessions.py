@@ -0,0 +1,73 @@
+"""
+Management command that auto-completes sessions whose time has run out.
+
+A session expires once its exam timer plus a grace period has passed (or
+SESSION_TIMEOUT_HOURS after it started). Expired sessions are graded and
+completed in bounded batches. Run it from cron, or keep it running with
+--loop as a periodic worker.
+"""
+import time
+from django.core.management.base import BaseCommand
+from core.constants import SESSION_EXPIRY_GRACE_MINUTES, SESSION_REAPER_BATCH_SIZE
+from placement_test.services import SessionService
+
+
+class Command(BaseCommand):
+    help = 'Grade and complete in-progress sessions whose exam timer has expired'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=SESSION_REAPER_BATCH_SIZE,
+            help=f'Sessions completed per transaction (default: {SESSION_REAPER_BATCH_SIZE})',
+        )
+        parser.add_argument(
+            '--grace-minutes',
+            type=int,
+            default=SESSION_EXPIRY_GRACE_MINUTES,
+            help=f'Minutes allowed past the exam timer (default: {SESSION_EXPIRY_GRACE_MINUTES})',
+        )
+        parser.add_argument(
+            '--max-batches',
+            type=int,
+            help='Stop after this many batches',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only report how many sessions (up to one batch) have expired',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, checking every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='Seconds between runs in --loop mode (default: 60)',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            expired = SessionService.find_expired_sessions(
+                options['batch_size'], options['grace_minutes']
+            )
+            self.stdout.write(f'{len(expired)} expired sessions in the next batch')
+            return
+
+        while True:
+            result = SessionService.reap_expired_sessions(
+                batch_size=options['batch_size'],
+                grace_minutes=options['grace_minutes'],
+                max_batches=options['max_batches'],
+            )
+            if result['completed'] or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Completed {result['completed']} expired sessions in {result['batches']} batches"
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
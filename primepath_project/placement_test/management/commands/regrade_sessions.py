@@ -0,0 +1,119 @@
+"""
+Management command that regrades completed sessions after answer key changes.
+
+Saving answers for an exam that students have already taken schedules a
+regrade job. This command runs the pending jobs in bounded chunks, reporting
+progress after each, and prints the score changes as CSV (or writes them to
+--diff). A job that failed or was interrupted resumes where it stopped when
+run again with --job; one left running by a worker that died is resumed
+without --job once its heartbeat is REGRADE_STALE_SECONDS old. Run it from cron, or keep it running with --loop as a
+periodic worker.
+"""
+import csv
+import sys
+import time
+from django.core.management.base import BaseCommand, CommandError
+from core.constants import REGRADE_CHUNK_SIZE
+from placement_test.models import Exam, RegradeJob
+from placement_test.services import RegradeService
+
+
+class Command(BaseCommand):
+    help = 'Regrade completed sessions of exams whose answer key changed'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=REGRADE_CHUNK_SIZE,
+            help=f'Sessions regraded per transaction (default: {REGRADE_CHUNK_SIZE})',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Processes regrading chunks in parallel (default: 1)',
+        )
+        parser.add_argument('--job', type=int, help='Run or resume this job, whatever its status')
+        parser.add_argument('--exam', help='Schedule a regrade of this exam (UUID) and run it')
+        parser.add_argument('--diff', help='Append the score changes to this CSV file instead of printing them')
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, checking for pending jobs every --interval seconds',
+        )
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=60,
+            help='Seconds between runs in --loop mode (default: 60)',
+        )
+
+    def progress(self, job):
+        self.stderr.write(
+            f'Job {job.id}: {job.processed_sessions}/{job.total_sessions} sessions, '
+            f'{job.changed_sessions} changed'
+        )
+
+    def write_diff(self, jobs, path):
+        # Appended to, so a --loop worker keeps the changes of every run
+        out = open(path, 'a', newline='') if path else sys.stdout
+        try:
+            writer = csv.writer(out)
+            if not path or out.tell() == 0:
+                writer.writerow([
+                    'job', 'exam', 'session', 'student',
+                    'old_score', 'new_score', 'old_percentage', 'new_percentage'
+                ])
+            for job in jobs:
+                for change in job.changes.select_related('session'):
+                    writer.writerow([
+                        job.id, job.exam.name, change.session_id, change.session.student_name,
+                        change.old_score, change.new_score,
+                        change.old_percentage, change.new_percentage,
+                    ])
+        finally:
+            if path:
+                out.close()
+
+    def run_once(self, options):
+        kwargs = {
+            'chunk_size': options['chunk_size'],
+            'workers': options['workers'],
+            'progress': self.progress,
+        }
+        if options['job']:
+            try:
+                job = RegradeJob.objects.select_related('exam').get(id=options['job'])
+            except RegradeJob.DoesNotExist:
+                raise CommandError(f"Regrade job {options['job']} not found")
+            if job.status == 'DONE':
+                return [job]
+            return [RegradeService.run_job(job, **kwargs)]
+
+        if options['exam']:
+            try:
+                exam = Exam.objects.get(id=options['exam'])
+            except (Exam.DoesNotExist, ValueError):
+                raise CommandError(f"Exam {options['exam']} not found")
+            if RegradeService.schedule_regrade(exam) is None:
+                self.stdout.write(f'No completed sessions on {exam.name}')
+                return []
+        return RegradeService.run_pending(**kwargs)
+
+    def handle(self, *args, **options):
+        if options['chunk_size'] < 1 or options['workers'] < 1:
+            raise CommandError('--chunk-size and --workers must be positive')
+
+        while True:
+            jobs = self.run_once(options)
+            for job in jobs:
+                self.stderr.write(self.style.SUCCESS(
+                    f'Job {job.id} ({job.exam.name}): {job.changed_sessions} of '
+                    f'{job.processed_sessions} sessions changed score'
+                ))
+            if jobs:
+                self.write_diff(jobs, options['diff'])
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
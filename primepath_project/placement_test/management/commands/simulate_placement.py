@@ -0,0 +1,65 @@
+"""
+Management command to preview where an applicant roster would be placed.
+
+Reads a CSV or JSON roster of (grade, academic_rank) rows and resolves every
+row against the compiled placement rules in one pass, without creating
+sessions.
+"""
+import json
+from pathlib import Path
+from django.core.management.base import BaseCommand, CommandError
+from core.exceptions import ValidationException
+from placement_test.services import PlacementService
+
+
+class Command(BaseCommand):
+    help = 'Simulate placement for an applicant roster (CSV or JSON) and report per-level counts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('roster', help='Path to a CSV or JSON roster file')
+        parser.add_argument(
+            '--format',
+            choices=['csv', 'json'],
+            help='Roster format (defaults to the file extension)',
+        )
+        parser.add_argument(
+            '--json',
+            action='store_true',
+            help='Print the full report as JSON',
+        )
+
+    def handle(self, *args, **options):
+        path = Path(options['roster'])
+        if not path.exists():
+            raise CommandError(f'Roster file not found: {path}')
+
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        try:
+            rows = PlacementService.parse_applicant_rows(
+                path.read_text(encoding='utf-8-sig'), file_format
+            )
+        except ValidationException as e:
+            raise CommandError(e.message)
+
+        report = PlacementService.simulate_placements(rows)
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2, ensure_ascii=False))
+            return
+
+        for level in report['levels']:
+            exams = ', '.join(exam['exam_name'] for exam in level['exams'])
+            self.stdout.write(f"{level['count']:>6}  {level['curriculum_level']}  [{exams}]")
+
+        for student in report['unplaced']:
+            self.stdout.write(self.style.WARNING(
+                f"Row {student['row']} {student['student_name'] or '-'} "
+                f"(grade {student['grade']}, {student['academic_rank']}): "
+                f"{student['code']} - {student['reason']}"
+            ))
+
+        style = self.style.SUCCESS if not report['flagged'] else self.style.WARNING
+        self.stdout.write(style(
+            f"{report['placed']} of {report['total']} applicants placed, "
+            f"{report['flagged']} flagged."
+        ))
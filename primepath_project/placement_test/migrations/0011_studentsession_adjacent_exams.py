@@ -0,0 +1,35 @@
+# Generated by Django 5.0.1 on 2026-10-16 19:18
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_examlevelmapping'),
+        ('placement_test', '0010_convert_audio_assignments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentsession',
+            name='easier_curriculum_level',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.curriculumlevel'),
+        ),
+        migrations.AddField(
+            model_name='studentsession',
+            name='easier_exam',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='placement_test.exam'),
+        ),
+        migrations.AddField(
+            model_name='studentsession',
+            name='harder_curriculum_level',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='core.curriculumlevel'),
+        ),
+        migrations.AddField(
+            model_name='studentsession',
+            name='harder_exam',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='placement_test.exam'),
+        ),
+    ]
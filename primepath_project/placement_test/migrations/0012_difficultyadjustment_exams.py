@@ -0,0 +1,28 @@
+# Generated by Django 5.0.1 on 2026-10-16 19:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('placement_test', '0011_studentsession_adjacent_exams'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='difficultyadjustment',
+            options={'ordering': ['adjusted_at', 'id']},
+        ),
+        migrations.AddField(
+            model_name='difficultyadjustment',
+            name='from_exam',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='placement_test.exam'),
+        ),
+        migrations.AddField(
+            model_name='difficultyadjustment',
+            name='to_exam',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='placement_test.exam'),
+        ),
+    ]
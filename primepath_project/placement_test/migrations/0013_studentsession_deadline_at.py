@@ -0,0 +1,34 @@
+# Generated by Django 5.0.1 on 2026-10-16 19:44
+
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_deadlines(apps, schema_editor):
+    """Set deadline_at = started_at + exam timer for existing sessions."""
+    Exam = apps.get_model('placement_test', 'Exam')
+    StudentSession = apps.get_model('placement_test', 'StudentSession')
+
+    timers = Exam.objects.order_by().values_list('timer_minutes', flat=True).distinct()
+    for minutes in timers:
+        StudentSession.objects.filter(exam__timer_minutes=minutes).update(
+            deadline_at=F('started_at') + timedelta(minutes=minutes)
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('placement_test', '0012_difficultyadjustment_exams'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentsession',
+            name='deadline_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_deadlines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 19:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('placement_test', '0013_studentsession_deadline_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentanswer',
+            name='client_seq',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 19:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('placement_test', '0014_studentanswer_client_seq'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentsession',
+            name='packed_answers',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:09
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('placement_test', '0015_studentsession_packed_answers'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegradeJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('PENDING', 'Pending'), ('RUNNING', 'Running'), ('DONE', 'Done'), ('FAILED', 'Failed')], default='PENDING', max_length=20)),
+                ('key_version', models.DateTimeField()),
+                ('total_sessions', models.IntegerField(default=0)),
+                ('processed_sessions', models.IntegerField(default=0)),
+                ('changed_sessions', models.IntegerField(default=0)),
+                ('last_session_id', models.UUIDField(blank=True, null=True)),
+                ('error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('started_at', models.DateTimeField(blank=True, null=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('exam', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='regrade_jobs', to='placement_test.exam')),
+            ],
+            options={
+                'ordering': ['created_at'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RegradeChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('old_score', models.IntegerField(null=True)),
+                ('new_score', models.IntegerField(null=True)),
+                ('old_percentage', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('new_percentage', models.DecimalField(decimal_places=2, max_digits=5, null=True)),
+                ('session', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='placement_test.studentsession')),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='changes', to='placement_test.regradejob')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='regradejob',
+            index=models.Index(fields=['status', 'created_at'], name='placement_t_status_464259_idx'),
+        ),
+    ]
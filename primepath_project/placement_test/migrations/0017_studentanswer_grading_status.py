@@ -0,0 +1,56 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:14
+
+from django.db import migrations, models
+
+MANUAL_TYPES = ('LONG', 'MIXED', 'SHORT')
+
+
+def backfill_grading_status(apps, schema_editor):
+    """
+    Mark the answers of completed sessions as graded or waiting for a teacher.
+
+    Answers the auto-grader left without a verdict (is_correct NULL) to
+    questions it may not grade are queued; existing packed entries get the
+    status as their fifth element.
+    """
+    StudentAnswer = apps.get_model('placement_test', 'StudentAnswer')
+    StudentSession = apps.get_model('placement_test', 'StudentSession')
+
+    completed = StudentAnswer.objects.filter(session__completed_at__isnull=False)
+    pending = completed.filter(
+        is_correct__isnull=True, question__question_type__in=MANUAL_TYPES
+    ).exclude(answer='')
+    pending.update(grading_status='PENDING')
+    completed.exclude(grading_status='PENDING').update(grading_status='AUTO')
+
+    sessions = StudentSession.objects.filter(packed_answers__isnull=False).only(
+        'id', 'completed_at', 'packed_answers'
+    )
+    for session in sessions.iterator(chunk_size=500):
+        for entry in session.packed_answers.values():
+            if len(entry) == 4:
+                status = 'UNGRADED'
+                if session.completed_at:
+                    status = 'PENDING' if entry[2] is None and entry[0].strip() else 'AUTO'
+                entry.append(status)
+        session.save(update_fields=['packed_answers'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('placement_test', '0016_regradejob_regradechange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studentanswer',
+            name='grading_status',
+            field=models.CharField(choices=[('UNGRADED', 'Not graded yet'), ('AUTO', 'Graded automatically'), ('PENDING', 'Needs manual grading'), ('MANUAL', 'Graded by a teacher')], default='UNGRADED', max_length=10),
+        ),
+        migrations.AddIndex(
+            model_name='studentanswer',
+            index=models.Index(condition=models.Q(('grading_status', 'PENDING')), fields=['id'], name='answer_grading_queue_idx'),
+        ),
+        migrations.RunPython(backfill_grading_status, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('placement_test', '0017_studentanswer_grading_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='question',
+            name='scoring_scheme',
+            field=models.CharField(choices=[('ALL_OR_NOTHING', 'All or nothing'), ('PER_OPTION', 'Per option (CHECKBOX)'), ('RIGHT_MINUS_WRONG', 'Right minus wrong (CHECKBOX)'), ('PER_PART', 'Per part (SHORT, MIXED)')], default='ALL_OR_NOTHING', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='regradechange',
+            name='new_score',
+            field=models.DecimalField(decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AlterField(
+            model_name='regradechange',
+            name='old_score',
+            field=models.DecimalField(decimal_places=2, max_digits=8, null=True),
+        ),
+        migrations.AlterField(
+            model_name='studentanswer',
+            name='points_earned',
+            field=models.DecimalField(decimal_places=2, default=0, max_digits=6),
+        ),
+        migrations.AlterField(
+            model_name='studentsession',
+            name='score',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=8, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.0.1 on 2026-10-16 20:33
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('placement_test', '0018_question_scoring_scheme_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='regradejob',
+            name='heartbeat_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
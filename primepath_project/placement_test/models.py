@@ -68,6 +68,12 @@ class Question(models.Model):
         ('LONG', 'Long Answer'),
         ('MIXED', 'Mixed'),
     ]
+    SCORING_SCHEMES = [
+        ('ALL_OR_NOTHING', 'All or nothing'),
+        ('PER_OPTION', 'Per option (CHECKBOX)'),
+        ('RIGHT_MINUS_WRONG', 'Right minus wrong (CHECKBOX)'),
+        ('PER_PART', 'Per part (SHORT, MIXED)'),
+    ]
 
     exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='questions')
     question_number = models.IntegerField(validators=[MinValueValidator(1)])
@@ -75,6 +81,8 @@ class Question(models.Model):
     correct_answer = models.TextField(help_text="For MCQ: single letter, For CHECKBOX: comma-separated letters")
     points = models.IntegerField(default=1, validators=[MinValueValidator(1)])
     options_count = models.IntegerField(default=5, validators=[MinValueValidator(2), MaxValueValidator(10)])
+    # How partly correct answers are credited (see answer_keys.QuestionKey.credit)
+    scoring_scheme = models.CharField(max_length=20, choices=SCORING_SCHEMES, default='ALL_OR_NOTHING')
     audio_file = models.ForeignKey('AudioFile', on_delete=models.SET_NULL, null=True, blank=True, related_name='assigned_question')
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -120,13 +128,32 @@ class StudentSession(models.Model):
         related_name='final_sessions'
     )
     difficulty_adjustments = models.IntegerField(default=0)
+    # Exams pre-resolved one level down/up so a difficulty change is a swap
+    easier_curriculum_level = models.ForeignKey(
+        CurriculumLevel, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    easier_exam = models.ForeignKey(
+        Exam, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    harder_curriculum_level = models.ForeignKey(
+        CurriculumLevel, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    harder_exam = models.ForeignKey(
+        Exam, on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
     started_at = models.DateTimeField(auto_now_add=True)
+    # Set once at session start from the exam timer; answers after it are rejected
+    deadline_at = models.DateTimeField(null=True, blank=True)
     completed_at = models.DateTimeField(null=True, blank=True)
     time_spent_seconds = models.IntegerField(null=True, blank=True)
     
-    score = models.IntegerField(null=True, blank=True)
+    score = models.DecimalField(max_digits=8, decimal_places=2, null=True, blank=True)
     percentage_score = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
     
+    # All answers of the session when it uses packed storage (see
+    # services/answer_store.py); NULL when its answers are StudentAnswer rows
+    packed_answers = models.JSONField(null=True, blank=True)
+    
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
 
@@ -147,11 +174,24 @@ class StudentSession(models.Model):
 
 
 class StudentAnswer(models.Model):
+    GRADING_STATUS_CHOICES = [
+        ('UNGRADED', 'Not graded yet'),
+        ('AUTO', 'Graded automatically'),
+        ('PENDING', 'Needs manual grading'),
+        ('MANUAL', 'Graded by a teacher'),
+    ]
+
     session = models.ForeignKey(StudentSession, on_delete=models.CASCADE, related_name='answers')
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     answer = models.TextField(blank=True)
     is_correct = models.BooleanField(null=True)
-    points_earned = models.IntegerField(default=0)
+    points_earned = models.DecimalField(max_digits=6, decimal_places=2, default=0)
+    # Sequence number of the client write that last changed the answer;
+    # writes carrying a lower or equal number are dropped
+    client_seq = models.PositiveBigIntegerField(default=0)
+    # Set when the session is graded; PENDING answers make up the manual
+    # grading queue (GradingService.get_grading_queue)
+    grading_status = models.CharField(max_length=10, choices=GRADING_STATUS_CHOICES, default='UNGRADED')
     answered_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -160,26 +200,102 @@ class StudentAnswer(models.Model):
         unique_together = ['session', 'question']
         indexes = [
             models.Index(fields=['session', 'question']),
+            # Only the few answers waiting for a teacher, in queue order
+            models.Index(
+                fields=['id'],
+                condition=models.Q(grading_status='PENDING'),
+                name='answer_grading_queue_idx',
+            ),
         ]
 
     def __str__(self):
         return f"{self.session.student_name} - Q{self.question.question_number}"
 
-    def auto_grade(self):
-        """Automatically grade this answer using GradingService."""
+    def auto_grade(self, key=None):
+        """
+        Automatically grade this answer using GradingService (key: compiled
+        QuestionKey). Answers the auto-grader cannot grade are queued for a
+        teacher unless blank.
+        
+        Returns:
+            The grading result of GradingService.auto_grade_answer
+        """
         from placement_test.services import GradingService
         
-        result = GradingService.auto_grade_answer(self)
+        result = GradingService.auto_grade_answer(self, key)
         self.is_correct = result['is_correct']
         self.points_earned = result['points_earned']
+        self.grading_status = (
+            'PENDING' if result['requires_manual_grading'] and self.answer.strip() else 'AUTO'
+        )
+        return result
+
+
+class RegradeJob(models.Model):
+    """Regrade of an exam's completed sessions after its answer key changed."""
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    exam = models.ForeignKey(Exam, on_delete=models.CASCADE, related_name='regrade_jobs')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    # exam.updated_at when the job was scheduled
+    key_version = models.DateTimeField()
+    total_sessions = models.IntegerField(default=0)
+    processed_sessions = models.IntegerField(default=0)
+    changed_sessions = models.IntegerField(default=0)
+    # Sessions are regraded in id order; all up to this one are done, so a
+    # failed or interrupted job resumes after it
+    last_session_id = models.UUIDField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    # Refreshed by the runner after every chunk; a RUNNING job whose
+    # heartbeat went stale lost its runner and is picked up again
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'created_at']),
+        ]
+
+    def __str__(self):
+        return f"Regrade {self.exam.name} ({self.get_status_display()})"
+
+
+class RegradeChange(models.Model):
+    """Score of a session before and after a regrade, for sessions whose score changed."""
+    job = models.ForeignKey(RegradeJob, on_delete=models.CASCADE, related_name='changes')
+    session = models.ForeignKey(StudentSession, on_delete=models.CASCADE, related_name='+')
+    old_score = models.DecimalField(max_digits=8, decimal_places=2, null=True)
+    new_score = models.DecimalField(max_digits=8, decimal_places=2, null=True)
+    old_percentage = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+    new_percentage = models.DecimalField(max_digits=5, decimal_places=2, null=True)
+
+    class Meta:
+        ordering = ['id']
+
+    def __str__(self):
+        return f"{self.session_id}: {self.old_score} -> {self.new_score}"
 
 
 class DifficultyAdjustment(models.Model):
     session = models.ForeignKey(StudentSession, on_delete=models.CASCADE, related_name='adjustments')
     from_level = models.ForeignKey(CurriculumLevel, on_delete=models.CASCADE, related_name='adjustments_from')
     to_level = models.ForeignKey(CurriculumLevel, on_delete=models.CASCADE, related_name='adjustments_to')
+    # Answers to from_exam stay on the session as the archived attempt at from_level
+    from_exam = models.ForeignKey(Exam, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    to_exam = models.ForeignKey(Exam, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
     adjustment = models.IntegerField()
     adjusted_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        ordering = ['adjusted_at', 'id']
+
     def __str__(self):
         return f"{self.session.student_name}: {self.from_level} → {self.to_level}"
\ No newline at end of file
@@ -5,10 +5,12 @@ from .exam_service import ExamService
 from .placement_service import PlacementService
 from .session_service import SessionService
 from .grading_service import GradingService
+from .regrade_service import RegradeService
 
 __all__ = [
     'ExamService',
     'PlacementService', 
     'SessionService',
     'GradingService',
+    'RegradeService',
 ]
\ No newline at end of file
@@ -0,0 +1,306 @@
+"""
+Write-behind buffer for student answers.
+
+With PLACEMENT_ANSWER_WRITE_MODE = 'write_behind', submitted answers are
+appended to a per-session log in the shared cache instead of being written to
+StudentAnswer straight away:
+
+    answer_buf_<session>_seq       last sequence number handed out (cache.incr)
+    answer_buf_<session>_<n>       (question_id, answer text, client seq) for sequence n
+    answer_buf_<session>_flushed   last sequence number written to the database
+
+Every answer takes its own sequence number, so concurrent saves never
+overwrite each other. A flush reads the entries after the flushed mark, keeps
+the latest answer per question (the highest client sequence number when the
+client sends one) and writes them with one bulk update/insert.
+Flushes run periodically (flush_answer_buffer command), as soon as a session
+reaches PLACEMENT_ANSWER_BUFFER_MAX_PENDING unflushed answers, and
+synchronously before a session is completed or its answers are shown.
+
+Buffered answers only live in the cache until flushed, so the cache backend
+must be shared between workers and should not evict (e.g. Redis with
+maxmemory-policy noeviction). With a per-process or dummy cache, or when the
+cache raises, answers are written directly.
+"""
+import logging
+import time
+from datetime import timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.utils import timezone
+
+from core.constants import ANSWER_BUFFER_KEY_PREFIX, ANSWER_WRITE_BEHIND, SESSION_TIMEOUT_HOURS
+from core.exceptions import AnswersNotSavedException
+from ..models import StudentSession
+
+logger = logging.getLogger(__name__)
+
+# Buffered answers outlive the longest possible session
+BUFFER_TTL_SECONDS = SESSION_TIMEOUT_HOURS * 3600
+FLUSH_LOCK_SECONDS = 30
+# A sequence number whose entry is still missing after this long belongs to
+# a writer that died between cache.incr and cache.set_many
+GAP_GRACE_SECONDS = 60
+
+
+def _key(session_id, suffix) -> str:
+    return f'{ANSWER_BUFFER_KEY_PREFIX}{session_id}_{suffix}'
+
+
+def is_enabled() -> bool:
+    """Whether answers should be buffered with the current settings and cache."""
+    mode = getattr(settings, 'PLACEMENT_ANSWER_WRITE_MODE', None)
+    if mode != ANSWER_WRITE_BEHIND:
+        return False
+    # `cache` is a proxy; check the backend it resolves to
+    return not isinstance(caches['default'], (DummyCache, LocMemCache))
+
+
+def buffer_answers(session_id, answers: Dict[int, str], seqs: Optional[Dict[int, int]] = None) -> bool:
+    """
+    Append answers to the session's buffer.
+
+    Args:
+        session_id: Session ID
+        answers: {question_id: answer text}, already validated and formatted
+        seqs: {question_id: client sequence number} for sequenced answers
+
+    Returns:
+        True if the answers were buffered, False if the caller must write
+        them to the database itself
+    """
+    if not answers or not is_enabled():
+        return False
+
+    seqs = seqs or {}
+    try:
+        seq_key = _key(session_id, 'seq')
+        cache.add(seq_key, 0, timeout=BUFFER_TTL_SECONDS)
+        last = cache.incr(seq_key, len(answers))
+        first = last - len(answers) + 1
+        cache.set_many(
+            {
+                _key(session_id, seq): (question_id, text, seqs.get(question_id))
+                for seq, (question_id, text) in zip(range(first, last + 1), answers.items())
+            },
+            timeout=BUFFER_TTL_SECONDS
+        )
+        flushed = cache.get(_key(session_id, 'flushed'), 0)
+    except Exception as e:
+        logger.warning(f"Answer buffer unavailable, writing session {session_id} directly: {e}")
+        return False
+
+    max_pending = getattr(settings, 'PLACEMENT_ANSWER_BUFFER_MAX_PENDING', 20)
+    if last - flushed >= max_pending:
+        flush_session(session_id)
+    return True
+
+
+def _gap_expired(session_id, seq: int) -> bool:
+    """Remember when a missing sequence number was first seen; True once it is stale."""
+    gap_key = _key(session_id, 'gap')
+    gap = cache.get(gap_key)
+    now = time.time()
+    if not gap or gap[0] != seq:
+        cache.set(gap_key, (seq, now), timeout=BUFFER_TTL_SECONDS)
+        return False
+    return now - gap[1] > GAP_GRACE_SECONDS
+
+
+def _acquire_lock(lock_key: str, wait: bool) -> bool:
+    deadline = time.monotonic() + FLUSH_LOCK_SECONDS
+    while True:
+        if cache.add(lock_key, 1, timeout=FLUSH_LOCK_SECONDS):
+            return True
+        if not wait or time.monotonic() > deadline:
+            return False
+        time.sleep(0.05)
+
+
+def _mark_flushed(session_id, flushed_to: int, entry_keys) -> None:
+    """Advance the flushed mark to flushed_to and drop the entries written (lock held)."""
+    try:
+        # A later flush may have got further already; never move the mark back
+        if cache.get(_key(session_id, 'flushed'), 0) < flushed_to:
+            cache.set(_key(session_id, 'flushed'), flushed_to, timeout=BUFFER_TTL_SECONDS)
+        cache.delete_many(entry_keys)
+    except Exception as e:
+        # The entries stay buffered and are written again by the next flush
+        logger.warning(f"Could not advance answer buffer of session {session_id}: {e}")
+
+
+def _mark_flushed_on_commit(session_id, flushed_to: int, entry_keys) -> None:
+    lock_key = _key(session_id, 'lock')
+    try:
+        locked = _acquire_lock(lock_key, wait=True)
+    except Exception:
+        locked = False
+    try:
+        _mark_flushed(session_id, flushed_to, entry_keys)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+
+
+def _flush(session_id, wait: bool) -> Tuple[int, bool]:
+    """
+    Write the session's buffered answers; see flush_session.
+
+    Returns:
+        (questions written, whether every buffered answer was written)
+    """
+    from .session_service import SessionService
+
+    lock_key = _key(session_id, 'lock')
+    try:
+        if not _acquire_lock(lock_key, wait):
+            return 0, False
+    except Exception as e:
+        logger.warning(f"Answer buffer unavailable, cannot flush session {session_id}: {e}")
+        return 0, False
+
+    try:
+        state = cache.get_many([_key(session_id, 'seq'), _key(session_id, 'flushed')])
+        last = state.get(_key(session_id, 'seq'), 0)
+        flushed = state.get(_key(session_id, 'flushed'), 0)
+        if last <= flushed:
+            return 0, True
+
+        entry_keys = [_key(session_id, seq) for seq in range(flushed + 1, last + 1)]
+        entries = cache.get_many(entry_keys)
+
+        latest = {}
+        latest_seqs = {}
+        flushed_to = flushed
+        for seq, entry_key in enumerate(entry_keys, start=flushed + 1):
+            entry = entries.get(entry_key)
+            if entry is None:
+                # The writer may still be between incr and set_many
+                if not _gap_expired(session_id, seq):
+                    break
+                logger.warning(f"Skipping lost buffered answer {seq} for session {session_id}")
+            else:
+                # Entries buffered before client sequence numbers have no third item
+                question_id, answer, client_seq = (tuple(entry) + (None,))[:3]
+                if client_seq is None or client_seq >= latest_seqs.get(question_id, 0):
+                    latest[question_id] = answer
+                    if client_seq is not None:
+                        latest_seqs[question_id] = client_seq
+            flushed_to = seq
+
+        if latest:
+            with transaction.atomic():
+                SessionService.write_answers(session_id, latest, latest_seqs)
+        if flushed_to > flushed:
+            written = entry_keys[:flushed_to - flushed]
+            if transaction.get_connection().in_atomic_block:
+                # Inside a caller's transaction the answers only exist once
+                # it commits; if it rolls back they stay buffered
+                transaction.on_commit(lambda: _mark_flushed_on_commit(session_id, flushed_to, written))
+            else:
+                _mark_flushed(session_id, flushed_to, written)
+
+        logger.debug(f"Flushed {len(latest)} buffered answers for session {session_id}")
+        return len(latest), flushed_to == last
+    except Exception as e:
+        logger.error(f"Failed to flush answer buffer for session {session_id}: {e}", exc_info=True)
+        return 0, False
+    finally:
+        try:
+            cache.delete(lock_key)
+        except Exception:
+            pass
+
+
+def flush_session(session_id, wait: bool = False, strict: bool = False) -> int:
+    """
+    Write the session's buffered answers to StudentAnswer.
+
+    Only one flush per session runs at a time, so an older snapshot can never
+    overwrite a newer one. Buffered entries are dropped once the answers are
+    committed; call it outside a transaction where possible so they are
+    committed (and the buffer lock released) straight away.
+
+    Args:
+        session_id: Session ID
+        wait: Block until a concurrent flush of the same session finishes
+            (used before completing a session or displaying its answers)
+        strict: Raise instead of returning if some buffered answers could
+            not be written (lock not acquired, an entry still being written,
+            or an error); used before grading
+
+    Returns:
+        Number of questions written
+
+    Raises:
+        AnswersNotSavedException: If strict and the flush was incomplete
+    """
+    if not is_enabled():
+        return 0
+
+    written, complete = _flush(session_id, wait)
+    if strict and not complete:
+        raise AnswersNotSavedException(
+            code="ANSWERS_NOT_SAVED",
+            details={'session_id': str(session_id)}
+        )
+    return written
+
+
+def pending_sessions(session_ids: Iterable) -> Dict:
+    """
+    Return {session_id: unflushed answer count} for sessions with pending answers.
+
+    Reads the counters of all given sessions in one cache round trip.
+    """
+    session_ids = list(session_ids)
+    keys = []
+    for session_id in session_ids:
+        keys += [_key(session_id, 'seq'), _key(session_id, 'flushed')]
+    state = cache.get_many(keys)
+
+    pending = {}
+    for session_id in session_ids:
+        count = state.get(_key(session_id, 'seq'), 0) - state.get(_key(session_id, 'flushed'), 0)
+        if count > 0:
+            pending[session_id] = count
+    return pending
+
+
+def flush_pending(session_ids: Optional[Iterable] = None) -> Dict[str, int]:
+    """
+    Flush every session with buffered answers.
+
+    Args:
+        session_ids: Sessions to check; defaults to all in-progress sessions
+            started within SESSION_TIMEOUT_HOURS
+
+    Returns:
+        Dictionary with 'sessions' and 'answers' flushed, and 'incomplete':
+        the sessions some of whose answers could not be written yet
+    """
+    if not is_enabled():
+        return {'sessions': 0, 'answers': 0, 'incomplete': []}
+
+    if session_ids is None:
+        session_ids = StudentSession.objects.filter(
+            completed_at__isnull=True,
+            started_at__gte=timezone.now() - timedelta(hours=SESSION_TIMEOUT_HOURS)
+        ).values_list('id', flat=True)
+
+    flushed = {'sessions': 0, 'answers': 0, 'incomplete': []}
+    session_ids = list(session_ids)
+    for start in range(0, len(session_ids), 500):
+        for session_id in pending_sessions(session_ids[start:start + 500]):
+            count, complete = _flush(session_id, wait=False)
+            if count:
+                flushed['sessions'] += 1
+                flushed['answers'] += count
+            if not complete:
+                flushed['incomplete'].append(session_id)
+    return flushed
@@ -0,0 +1,273 @@
+"""
+Compiled answer keys, one per exam version.
+
+Grading used to re-split and re-normalize Question.correct_answer for every
+answer it graded. An AnswerKey parses an exam's correct answers once:
+
+    MCQ       the correct letter, upper-cased
+    CHECKBOX  the set of correct letters as a bitmask (A = 1, B = 2, C = 4, ...)
+    SHORT     the accepted answers, normalized (per input for a labelled key)
+    MIXED     the options' bitmask and the accepted typed answers
+    LONG, and SHORT or MIXED without a usable key: graded by hand
+
+Partial credit (Question.scoring_scheme) is worked out from the same
+compiled key: popcounts of the ticked and correct option masks for CHECKBOX,
+the per-part results for SHORT and MIXED.
+
+Typed answers are matched as described in answer_matching.py.
+
+Keys are kept per process (LRU, ANSWER_KEY_CACHE_SIZE exams) and labelled
+with the exam's updated_at. Any change to a question bumps updated_at (see
+signals.py; bulk edits bump it once, see deferred_exam_touches), so a key
+whose version differs from the exam row is rebuilt and there is nothing to
+invalidate.
+"""
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+from django.utils import timezone
+
+from core.constants import (
+    ANSWER_KEY_CACHE_SIZE, SCORING_ALL_OR_NOTHING, SCORING_PER_OPTION, SCORING_PER_PART,
+    SCORING_SCHEMES_BY_TYPE,
+)
+from ..models import Exam, Question
+from .answer_matching import MixedKey, Normalization, ShortKey, letter_mask
+
+# (earned, out_of) credit of a right and a wrong all-or-nothing answer
+FULL_CREDIT = (1, 1)
+NO_CREDIT = (0, 1)
+
+_lock = threading.Lock()
+_keys: 'OrderedDict[object, AnswerKey]' = OrderedDict()
+# Exams touched inside deferred_exam_touches, per thread
+_deferred = threading.local()
+
+
+class QuestionKey:
+    """Compiled correct answer of one question."""
+
+    __slots__ = ('question_id', 'question_type', 'points', 'scheme', 'options_mask', 'correct')
+
+    def __init__(self, question: Question, normalization: Optional[Normalization] = None):
+        self.question_id = question.id
+        self.question_type = question.question_type
+        self.points = question.points
+        self.correct = self.compile(question, normalization or Normalization.from_settings())
+        self.scheme = question.scoring_scheme
+        if self.scheme not in SCORING_SCHEMES_BY_TYPE.get(self.question_type, ()):
+            self.scheme = SCORING_ALL_OR_NOTHING
+        if self.question_type == 'CHECKBOX' and (not isinstance(self.correct, int) or not self.correct):
+            # Partial credit needs the key as a non-empty bitmask
+            self.scheme = SCORING_ALL_OR_NOTHING
+        # Every option the question shows (A..options_count)
+        self.options_mask = (1 << question.options_count) - 1
+
+    @staticmethod
+    def compile(question: Question, normalization: Normalization):
+        correct_answer = question.correct_answer or ''
+        if question.question_type == 'MCQ':
+            return correct_answer.strip().upper()
+        if question.question_type == 'CHECKBOX':
+            mask = letter_mask(correct_answer)
+            if mask is None:
+                # Not plain letters; compare the normalized parts instead
+                return frozenset(
+                    part.strip().upper() for part in correct_answer.split(',') if part.strip()
+                )
+            return mask
+        if question.question_type == 'SHORT':
+            key = ShortKey(correct_answer, normalization)
+            return key if key else None
+        if question.question_type == 'MIXED':
+            return MixedKey.compile(correct_answer, normalization)
+        return None
+
+    @property
+    def requires_manual_grading(self) -> bool:
+        return self.correct is None
+
+    def check(self, answer: str) -> Optional[bool]:
+        """
+        Whether an answer is correct (every part of it, for multi-part answers).
+
+        Returns:
+            True/False, or None if the question (or this answer to it) is graded by hand
+        """
+        credit = self.credit(answer)
+        return None if credit is None else credit[0] == credit[1]
+
+    def credit(self, answer: str) -> Optional[Tuple[int, int]]:
+        """
+        Credit an answer earns under the question's scoring scheme.
+
+        ALL_OR_NOTHING     1 out of 1 if correct, else 0
+        PER_OPTION         CHECKBOX: options ticked or left as in the key,
+                           out of all options
+        RIGHT_MINUS_WRONG  CHECKBOX: correct options ticked minus wrong ones
+                           ticked (at least 0), out of the correct options
+        PER_PART           SHORT, MIXED: parts answered correctly, out of
+                           the parts in the key (for SHORT, the inputs of a
+                           labelled key)
+
+        Under PER_OPTION and RIGHT_MINUS_WRONG, an answer with nothing
+        ticked, or with a letter beyond the question's options, earns nothing.
+
+        Returns:
+            (earned, out_of), or None if the question (or this answer to
+            it) is graded by hand
+        """
+        answer = answer or ''
+        if self.correct is None:
+            return None
+        scheme = self.scheme
+        if self.question_type == 'MCQ':
+            return FULL_CREDIT if answer.strip().upper() == self.correct else NO_CREDIT
+        if self.question_type == 'CHECKBOX':
+            if scheme == SCORING_ALL_OR_NOTHING:
+                if isinstance(self.correct, int):
+                    return FULL_CREDIT if letter_mask(answer) == self.correct else NO_CREDIT
+                return FULL_CREDIT if frozenset(
+                    part.strip().upper() for part in answer.split(',') if part.strip()
+                ) == self.correct else NO_CREDIT
+            ticked = letter_mask(answer)
+            if not ticked or ticked & ~self.options_mask:
+                # Nothing ticked, or a letter the question does not show
+                return NO_CREDIT
+            if scheme == SCORING_PER_OPTION:
+                options = self.options_mask.bit_count()
+                wrong = (ticked ^ self.correct) & self.options_mask
+                return options - wrong.bit_count(), options
+            right = (ticked & self.correct).bit_count()
+            wrong = (ticked & ~self.correct).bit_count()
+            return max(right - wrong, 0), self.correct.bit_count()
+        results = self.correct.part_results(answer)
+        if results is None:
+            return None
+        if scheme == SCORING_PER_PART:
+            return sum(results), len(results)
+        return FULL_CREDIT if all(results) else NO_CREDIT
+
+
+class AnswerKey:
+    """Compiled keys of all questions of one exam version."""
+
+    def __init__(self, exam_id, version, questions: Iterable[Question]):
+        self.exam_id = exam_id
+        self.version = version
+        normalization = Normalization.from_settings()
+        self.questions: Dict[int, QuestionKey] = {
+            question.id: QuestionKey(question, normalization) for question in questions
+        }
+        # Totals used for the session score (LONG answers do not count)
+        scored = [key for key in self.questions.values() if key.question_type != 'LONG']
+        self.total_possible = sum(key.points for key in scored)
+        self.graded_count = len(scored)
+
+    def get(self, question_id: int) -> Optional[QuestionKey]:
+        return self.questions.get(question_id)
+
+    def grades_like(self, other: 'AnswerKey') -> bool:
+        """Whether both keys grade every answer the same (same questions, answers, points and schemes)."""
+        def fingerprint(key):
+            return {
+                question_id: (
+                    question.question_type, question.points, question.scheme,
+                    question.options_mask, question.correct,
+                )
+                for question_id, question in key.questions.items()
+            }
+        return fingerprint(self) == fingerprint(other)
+
+
+def _compile(exam_id, version) -> AnswerKey:
+    questions = Question.objects.filter(exam_id=exam_id).only(
+        'id', 'exam_id', 'question_type', 'correct_answer', 'points', 'options_count', 'scoring_scheme'
+    )
+    return AnswerKey(exam_id, version, questions)
+
+
+def _cached(exam_id, version) -> Optional[AnswerKey]:
+    with _lock:
+        key = _keys.get(exam_id)
+        if key is not None and key.version == version:
+            _keys.move_to_end(exam_id)
+            return key
+    return None
+
+
+def _store(key: AnswerKey) -> None:
+    with _lock:
+        _keys[key.exam_id] = key
+        _keys.move_to_end(key.exam_id)
+        while len(_keys) > ANSWER_KEY_CACHE_SIZE:
+            _keys.popitem(last=False)
+
+
+def get_answer_key(exam: Exam) -> AnswerKey:
+    """
+    Return the compiled answer key of an exam, building it if stale.
+
+    Args:
+        exam: Exam instance; its updated_at is the version looked up
+
+    Returns:
+        AnswerKey
+    """
+    key = _cached(exam.id, exam.updated_at)
+    if key is None:
+        key = _compile(exam.id, exam.updated_at)
+        _store(key)
+    return key
+
+
+def get_answer_keys(exam_ids: Iterable) -> Dict[object, AnswerKey]:
+    """
+    Return {exam_id: AnswerKey} for many exams.
+
+    Takes one query for the exam versions, plus one per key to (re)build.
+    """
+    versions = dict(
+        Exam.objects.filter(id__in=set(exam_ids)).values_list('id', 'updated_at')
+    )
+    keys = {}
+    for exam_id, version in versions.items():
+        key = _cached(exam_id, version)
+        if key is None:
+            key = _compile(exam_id, version)
+            _store(key)
+        keys[exam_id] = key
+    return keys
+
+
+@contextmanager
+def deferred_exam_touches():
+    """
+    Bump each touched exam once, at the end of the block, instead of once per
+    question saved in it (the Question signal calls touch_exam on every
+    save). Nothing is bumped if the block raises.
+    """
+    if getattr(_deferred, 'exam_ids', None) is not None:
+        # Nested: the outermost block bumps
+        yield
+        return
+    _deferred.exam_ids = exam_ids = set()
+    try:
+        yield
+    finally:
+        _deferred.exam_ids = None
+    if exam_ids:
+        Exam.objects.filter(id__in=exam_ids).update(updated_at=timezone.now())
+
+
+def touch_exam(exam_id) -> None:
+    """Bump an exam's updated_at after its questions changed, retiring its key."""
+    exam_ids = getattr(_deferred, 'exam_ids', None)
+    if exam_ids is not None:
+        exam_ids.add(exam_id)
+        return
+    # update() rather than save(): no Exam signals, and no race with the
+    # exam form writing other fields
+    Exam.objects.filter(id=exam_id).update(updated_at=timezone.now())
@@ -0,0 +1,345 @@
+"""
+Matching of typed answers: normalization, fuzzy matching and answer formats.
+
+The test page stores some answers in structured text (see
+SessionService.format_answer):
+
+    SHORT with several inputs   "A: first | B: second" (empty parts left out)
+    MIXED                       "A,C|TEXT:free text", "A,C" or "free text"
+
+The parsers here split them back into parts so each part can be graded on
+its own. Typed text is compared after normalization (case, punctuation,
+whitespace; see the PLACEMENT_SHORT_ANSWER_* settings) and, if
+PLACEMENT_SHORT_ANSWER_MAX_DISTANCE is set, within a bounded Levenshtein
+distance. Accepted answers are normalized once, when the answer key is
+compiled, and kept sorted by length so only those close enough in length are
+compared.
+"""
+import bisect
+import json
+import re
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+from django.conf import settings
+
+from core.constants import (
+    SHORT_ANSWER_COLLAPSE_WHITESPACE, SHORT_ANSWER_FUZZY_MIN_LENGTH,
+    SHORT_ANSWER_IGNORE_CASE, SHORT_ANSWER_IGNORE_PUNCTUATION, SHORT_ANSWER_MAX_DISTANCE,
+)
+
+PART_SEPARATOR = ' | '
+PART_LABEL = re.compile(r'([A-J]):\s?(.*)', re.DOTALL)
+MIXED_TEXT_MARKER = '|TEXT:'
+CHECKBOX_ONLY = re.compile(r'[A-J](,[A-J])*', re.IGNORECASE)
+
+
+def letter_mask(text: str) -> Optional[int]:
+    """
+    Bitmask of comma-separated option letters ("A, c" -> 0b101).
+
+    Returns:
+        The mask, or None if a part is not a single letter
+    """
+    mask = 0
+    for part in text.split(','):
+        part = part.strip().upper()
+        if not part:
+            continue
+        if len(part) != 1 or not 'A' <= part <= 'Z':
+            return None
+        mask |= 1 << (ord(part) - ord('A'))
+    return mask
+
+
+class Normalization:
+    """How typed text is normalized and how far it may be from an accepted answer."""
+
+    __slots__ = ('ignore_case', 'ignore_punctuation', 'collapse_whitespace', 'max_distance', 'fuzzy_min_length')
+
+    def __init__(
+        self,
+        ignore_case: bool = SHORT_ANSWER_IGNORE_CASE,
+        ignore_punctuation: bool = SHORT_ANSWER_IGNORE_PUNCTUATION,
+        collapse_whitespace: bool = SHORT_ANSWER_COLLAPSE_WHITESPACE,
+        max_distance: int = SHORT_ANSWER_MAX_DISTANCE,
+        fuzzy_min_length: int = SHORT_ANSWER_FUZZY_MIN_LENGTH,
+    ):
+        self.ignore_case = ignore_case
+        self.ignore_punctuation = ignore_punctuation
+        self.collapse_whitespace = collapse_whitespace
+        self.max_distance = max_distance
+        self.fuzzy_min_length = fuzzy_min_length
+
+    @classmethod
+    def from_settings(cls) -> 'Normalization':
+        return cls(
+            ignore_case=getattr(settings, 'PLACEMENT_SHORT_ANSWER_IGNORE_CASE', SHORT_ANSWER_IGNORE_CASE),
+            ignore_punctuation=getattr(
+                settings, 'PLACEMENT_SHORT_ANSWER_IGNORE_PUNCTUATION', SHORT_ANSWER_IGNORE_PUNCTUATION
+            ),
+            collapse_whitespace=getattr(
+                settings, 'PLACEMENT_SHORT_ANSWER_COLLAPSE_WHITESPACE', SHORT_ANSWER_COLLAPSE_WHITESPACE
+            ),
+            max_distance=getattr(settings, 'PLACEMENT_SHORT_ANSWER_MAX_DISTANCE', SHORT_ANSWER_MAX_DISTANCE),
+            fuzzy_min_length=getattr(
+                settings, 'PLACEMENT_SHORT_ANSWER_FUZZY_MIN_LENGTH', SHORT_ANSWER_FUZZY_MIN_LENGTH
+            ),
+        )
+
+    def _identity(self) -> tuple:
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __eq__(self, other):
+        return isinstance(other, Normalization) and self._identity() == other._identity()
+
+    def __hash__(self):
+        return hash(self._identity())
+
+    def apply(self, text: str) -> str:
+        """Normalized form of a typed answer."""
+        text = unicodedata.normalize('NFKC', text or '')
+        if self.ignore_case:
+            text = text.casefold()
+        if self.ignore_punctuation:
+            text = ''.join(char for char in text if unicodedata.category(char)[0] != 'P')
+        if self.collapse_whitespace:
+            return ' '.join(text.split())
+        return text.strip()
+
+
+def bounded_distance(a: str, b: str, limit: int) -> int:
+    """
+    Levenshtein distance between a and b, or limit + 1 once it exceeds limit.
+
+    Only the diagonal band of width 2 * limit + 1 of what is left after the
+    common prefix and suffix is computed, and the scan stops as soon as a
+    whole row exceeds the limit.
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    # Common prefix and suffix cost nothing; typos are usually local
+    start = 0
+    while start < len(a) and start < len(b) and a[start] == b[start]:
+        start += 1
+    a, b = a[start:], b[start:]
+    while a and b and a[-1] == b[-1]:
+        a, b = a[:-1], b[:-1]
+    if len(a) > len(b):
+        a, b = b, a
+    too_far = limit + 1
+    previous = [j if j <= limit else too_far for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        low, high = max(1, i - limit), min(len(b), i + limit)
+        current = [too_far] * (len(b) + 1)
+        if i <= limit:
+            current[0] = i
+        for j in range(low, high + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost, too_far)
+        if min(current[low - 1:high + 1]) > limit:
+            return too_far
+        previous = current
+    return previous[len(b)]
+
+
+class ShortMatcher:
+    """Precompiled accepted answers of one typed answer (part)."""
+
+    __slots__ = ('normalization', 'exact', 'by_length')
+
+    def __init__(self, alternatives, normalization: Normalization):
+        self.normalization = normalization
+        self.exact = frozenset(
+            normalized for normalized in (normalization.apply(text) for text in alternatives) if normalized
+        )
+        # (length, text), for fuzzy candidates within max_distance of a length
+        self.by_length = tuple(sorted((len(text), text) for text in self.exact))
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ShortMatcher)
+            and self.exact == other.exact and self.normalization == other.normalization
+        )
+
+    def __hash__(self):
+        return hash((self.exact, self.normalization))
+
+    def __bool__(self):
+        return bool(self.exact)
+
+    def matches(self, text: str) -> bool:
+        text = self.normalization.apply(text)
+        if not text:
+            return False
+        if text in self.exact:
+            return True
+        limit = self.normalization.max_distance
+        if limit <= 0 or len(text) < self.normalization.fuzzy_min_length:
+            return False
+        start = bisect.bisect_left(self.by_length, (len(text) - limit,))
+        for length, accepted in self.by_length[start:]:
+            if length > len(text) + limit:
+                break
+            if length >= self.normalization.fuzzy_min_length and bounded_distance(text, accepted, limit) <= limit:
+                return True
+        return False
+
+
+def parse_multi_short(answer: str) -> Optional[Dict[str, str]]:
+    """
+    Split a multi-input SHORT answer ("A: x | B: y") into {'A': 'x', 'B': 'y'}.
+
+    Returns:
+        The parts, or None if the answer is plain text
+    """
+    parts = {}
+    for part in (answer or '').split(PART_SEPARATOR):
+        match = PART_LABEL.fullmatch(part.strip())
+        if match is None:
+            return None
+        parts[match.group(1)] = match.group(2)
+    return parts
+
+
+def parse_mixed(answer: str) -> Tuple[int, str]:
+    """
+    Split a MIXED answer into the mask of ticked options and the typed text.
+
+    Mirrors how the test page reads the answer back: "A,C|TEXT:x" has both,
+    a plain list of letters only options, anything else only text.
+    """
+    answer = answer or ''
+    if MIXED_TEXT_MARKER in answer:
+        options, text = answer.split(MIXED_TEXT_MARKER, 1)
+        return letter_mask(options) or 0, text
+    if CHECKBOX_ONLY.fullmatch(answer.strip()):
+        return letter_mask(answer), ''
+    return 0, answer
+
+
+class ShortKey:
+    """
+    Key of a SHORT question, as saved by the answer editor: accepted answers
+    separated by "|".
+
+    A plain key ("cat|kitten") holds the alternatives of one answer. A plain
+    answer, or a multi-input answer with one input filled, is correct if it
+    matches any of them. Which input should hold what is not in such a key,
+    so a multi-input answer with several inputs filled is left to a teacher.
+
+    A labelled key ("A: cat | A: kitten | B: dog") holds the alternatives of
+    each input; a label used more than once gives more alternatives for that
+    input. Multi-input answers are graded input by input, and every input
+    in the key must be answered; a plain answer is input A.
+    """
+
+    __slots__ = ('accepted', 'parts')
+
+    def __init__(self, correct_answer: str, normalization: Normalization):
+        texts = [text for text in correct_answer.split('|') if text.strip()]
+        labels = [PART_LABEL.fullmatch(text.strip()) for text in texts]
+        if texts and all(labels):
+            alternatives = {}
+            for match in labels:
+                alternatives.setdefault(match.group(1), []).append(match.group(2))
+            self.accepted = None
+            self.parts = tuple(
+                (label, ShortMatcher(alternatives[label], normalization))
+                for label in sorted(alternatives)
+            )
+        else:
+            self.accepted = ShortMatcher(texts, normalization)
+            self.parts = None
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, ShortKey)
+            and (self.accepted, self.parts) == (other.accepted, other.parts)
+        )
+
+    def __hash__(self):
+        return hash((self.accepted, self.parts))
+
+    def __bool__(self):
+        if self.parts is not None:
+            return all(matcher for _, matcher in self.parts)
+        return bool(self.accepted)
+
+    def part_results(self, answer: str) -> Optional[Tuple[bool, ...]]:
+        """
+        Whether each graded part of an answer is correct.
+
+        Returns:
+            The results, or None if the answer must be graded by hand
+        """
+        labelled = parse_multi_short(answer)
+        if self.parts is not None:
+            if labelled is None:
+                labelled = {'A': answer}
+            return tuple(matcher.matches(labelled.get(label, '')) for label, matcher in self.parts)
+        if labelled is None:
+            return (self.accepted.matches(answer),)
+        filled = [text for text in labelled.values() if text.strip()]
+        if len(filled) > 1:
+            return None
+        return (self.accepted.matches(filled[0] if filled else ''),)
+
+
+class MixedKey:
+    """
+    Key of a MIXED question, compiled from the sections saved by the answer
+    editor ([{"type": "Multiple Choice" | "Short Answer" | "Long Answer",
+    "value": ...}]). The ticked options and the typed text are graded
+    separately against the sections that have a key.
+    """
+
+    __slots__ = ('mask', 'text')
+
+    def __init__(self, mask: Optional[int], text: Optional[ShortMatcher]):
+        self.mask = mask
+        self.text = text
+
+    @classmethod
+    def compile(cls, correct_answer: str, normalization: Normalization) -> Optional['MixedKey']:
+        """
+        Returns:
+            The key, or None if the question must be graded by hand (no key,
+            a key that is not the editor's JSON, or a Long Answer section)
+        """
+        try:
+            sections = json.loads(correct_answer or '')
+        except ValueError:
+            return None
+        if not isinstance(sections, list):
+            return None
+        mask, texts = None, []
+        for section in sections:
+            if not isinstance(section, dict):
+                return None
+            value = str(section.get('value', ''))
+            if section.get('type') == 'Multiple Choice':
+                mask = (mask or 0) | (letter_mask(value) or 0)
+            elif section.get('type') == 'Short Answer':
+                texts.extend(value.split('|'))
+            else:
+                return None
+        text = ShortMatcher(texts, normalization) if texts else None
+        if mask is None and not text:
+            return None
+        return cls(mask, text or None)
+
+    def __eq__(self, other):
+        return isinstance(other, MixedKey) and (self.mask, self.text) == (other.mask, other.text)
+
+    def __hash__(self):
+        return hash((self.mask, self.text))
+
+    def part_results(self, answer: str) -> Tuple[bool, ...]:
+        mask, text = parse_mixed(answer)
+        results = ()
+        if self.mask is not None:
+            results += (mask == self.mask,)
+        if self.text is not None:
+            results += (self.text.matches(text),)
+        return results
@@ -0,0 +1,276 @@
+"""
+Storage of student answers: one row per answer, or one packed column per session.
+
+With PLACEMENT_ANSWER_STORAGE = 'rows' every answer is a StudentAnswer row.
+With 'packed', sessions started from then on keep all their answers in
+StudentSession.packed_answers, a JSON object keyed by question id:
+
+    {"<question_id>": [answer text, client seq, is_correct, points_earned, grading_status]}
+
+(points_earned is a JSON number: an int, or a float for partial credit.)
+
+Saving an answer rewrites that one session row, and reading a session's
+answers reads it together with the session. Keys are question ids rather than
+question numbers because a session keeps its answers to exams it left through
+a difficulty adjustment, and their question numbers overlap.
+
+A session's storage is fixed when it is created (packed_answers NULL means
+rows), so changing the setting never strands existing answers. Packed answers
+are handed out as unsaved StudentAnswer instances, so grading and templates
+work on both storages. With PLACEMENT_ANSWER_PROJECT_ROWS, completed packed
+sessions also get StudentAnswer rows as a normalized copy for the admin and
+reporting queries; packed_answers stays the source of truth. Answers graded
+by hand are projected whatever the setting, since the manual grading queue
+reads and grades rows.
+"""
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from django.conf import settings
+from django.db.models import F
+
+from core.constants import ANSWER_STORAGE_PACKED, ANSWER_STORAGE_ROWS
+from ..models import Question, StudentAnswer, StudentSession
+
+
+def is_packed_mode() -> bool:
+    """Whether new sessions use packed storage."""
+    return getattr(settings, 'PLACEMENT_ANSWER_STORAGE', ANSWER_STORAGE_ROWS) == ANSWER_STORAGE_PACKED
+
+
+def initial_packed_answers() -> Optional[dict]:
+    """Value of packed_answers for a session being created."""
+    return {} if is_packed_mode() else None
+
+
+def is_packed(session: StudentSession) -> bool:
+    return session.packed_answers is not None
+
+
+def _pack_points(points):
+    # JSON numbers: whole points stay ints, partial credit (two decimals) a float
+    points = Decimal(points)
+    return int(points) if points == points.to_integral_value() else float(points)
+
+
+def _unpack_points(points) -> Decimal:
+    # Through str, so 0.67 comes back as Decimal('0.67'), not the float's binary value
+    return Decimal(str(points))
+
+
+def _pack(answer: StudentAnswer) -> list:
+    return [
+        answer.answer, answer.client_seq, answer.is_correct,
+        _pack_points(answer.points_earned), answer.grading_status,
+    ]
+
+
+def _unpack(session: StudentSession, question: Question, entry: list) -> StudentAnswer:
+    text, client_seq, is_correct, points_earned, grading_status = entry
+    return StudentAnswer(
+        session=session,
+        question=question,
+        answer=text,
+        client_seq=client_seq,
+        is_correct=is_correct,
+        points_earned=_unpack_points(points_earned),
+        grading_status=grading_status,
+    )
+
+
+def is_stored(answer: StudentAnswer) -> bool:
+    """Whether the answer was saved (a row, or an entry of the packed column)."""
+    if answer.pk is not None:
+        return True
+    packed = answer.session.packed_answers
+    return packed is not None and str(answer.question_id) in packed
+
+
+def load_answers(
+    sessions: Iterable[StudentSession],
+    exam_ids=None,
+    questions: Optional[Iterable[Question]] = None
+) -> List[StudentAnswer]:
+    """
+    Return the saved answers of the given sessions, with question loaded.
+
+    Takes one query for the row sessions and one for the packed ones, however
+    many sessions are passed; none for the questions when they are passed in.
+
+    Args:
+        sessions: StudentSession instances
+        exam_ids: Only answers to questions of these exams; defaults to each
+            session's current exam
+        questions: Questions the caller already loaded; answers are matched
+            against them instead of joining or querying (answers to other
+            questions are left out)
+
+    Returns:
+        List of StudentAnswer instances (unsaved for packed sessions), in no
+        particular order
+    """
+    sessions = list(sessions)
+    answers = []
+    if questions is not None:
+        questions = {
+            question.id: question for question in questions
+            if exam_ids is None or question.exam_id in exam_ids
+        }
+
+    row_sessions = {session.id: session for session in sessions if not is_packed(session)}
+    if row_sessions:
+        rows = StudentAnswer.objects.filter(session_id__in=row_sessions)
+        if questions is not None:
+            # No join needed; filtered on the session's exam below
+            rows = rows.filter(question_id__in=questions)
+        elif exam_ids is None:
+            rows = rows.filter(question__exam_id=F('session__exam_id')).select_related('question')
+        else:
+            rows = rows.filter(question__exam_id__in=exam_ids).select_related('question')
+        for answer in rows:
+            answer.session = row_sessions[answer.session_id]
+            if questions is not None:
+                answer.question = questions[answer.question_id]
+                if exam_ids is None and answer.question.exam_id != answer.session.exam_id:
+                    continue
+            answers.append(answer)
+
+    packed_sessions = [session for session in sessions if is_packed(session)]
+    question_ids = {int(key) for session in packed_sessions for key in session.packed_answers}
+    if question_ids:
+        if questions is None:
+            questions = Question.objects.filter(id__in=question_ids)
+            if exam_ids is not None:
+                questions = questions.filter(exam_id__in=exam_ids)
+            questions = {question.id: question for question in questions}
+        for session in packed_sessions:
+            for key, entry in session.packed_answers.items():
+                question = questions.get(int(key))
+                if question is None or (exam_ids is None and question.exam_id != session.exam_id):
+                    continue
+                answers.append(_unpack(session, question, entry))
+
+    return answers
+
+
+def write_packed(session_id, answers: Dict[int, str], seqs: Optional[Dict[int, int]] = None) -> Optional[int]:
+    """
+    Merge answers into a packed session's column.
+
+    Locks the session row, so concurrent saves are applied one after the
+    other; call inside a transaction. An answer with a client sequence number
+    only replaces an entry holding a lower one. Grades of changed answers are
+    cleared.
+
+    Args:
+        session_id: Session ID
+        answers: {question_id: answer text}, already validated
+        seqs: {question_id: client sequence number} for sequenced answers
+
+    Returns:
+        Number of answers written, or None if the session stores rows
+    """
+    seqs = seqs or {}
+    session = (
+        StudentSession.objects.select_for_update()
+        .filter(id=session_id, packed_answers__isnull=False)
+        .only('id', 'packed_answers')
+        .first()
+    )
+    if session is None:
+        return None
+
+    packed = session.packed_answers
+    written = 0
+    for question_id, text in answers.items():
+        key = str(question_id)
+        seq = seqs.get(question_id)
+        entry = packed.get(key)
+        if entry is not None and seq is not None and seq <= entry[1]:
+            # Duplicate or out-of-order delivery
+            continue
+        client_seq = seq if seq is not None else (entry[1] if entry else 0)
+        packed[key] = [text, client_seq, None, 0, 'UNGRADED']
+        written += 1
+
+    if written:
+        StudentSession.objects.filter(id=session_id).update(packed_answers=packed)
+    return written
+
+
+def save_grades(answers: Iterable[StudentAnswer]) -> None:
+    """
+    Save the grades (is_correct, points_earned, grading_status) of answers,
+    whatever their storage.
+
+    Existing rows are saved with one bulk_update and new rows (a grade for an
+    unanswered question) with one bulk_create. Packed answers, including
+    projected rows of a packed session, are written back into their
+    sessions' column with one bulk_update; completed sessions also get their
+    row projection refreshed.
+    """
+    existing, new, packed_sessions = [], [], {}
+    for answer in answers:
+        if is_packed(answer.session):
+            answer.session.packed_answers[str(answer.question_id)] = _pack(answer)
+            packed_sessions[answer.session.pk] = answer.session
+        elif answer.pk is not None:
+            existing.append(answer)
+        else:
+            new.append(answer)
+
+    StudentAnswer.objects.bulk_update(
+        existing, ['is_correct', 'points_earned', 'grading_status'], batch_size=500
+    )
+    StudentAnswer.objects.bulk_create(new, batch_size=500)
+    if packed_sessions:
+        sessions = list(packed_sessions.values())
+        StudentSession.objects.bulk_update(sessions, ['packed_answers'], batch_size=500)
+        project_rows([session for session in sessions if session.completed_at])
+
+
+def project_rows(sessions: Iterable[StudentSession]) -> int:
+    """
+    Copy the answers of packed sessions into StudentAnswer rows.
+
+    With PLACEMENT_ANSWER_PROJECT_ROWS off, only answers waiting for or
+    given a manual grade are copied: the grading queue lists PENDING rows
+    and manual grades are applied to rows (and written back from them), so
+    the projected row must follow the answer from PENDING to MANUAL.
+
+    Returns:
+        Number of rows written
+    """
+    project_all = getattr(settings, 'PLACEMENT_ANSWER_PROJECT_ROWS', True)
+    entries = [
+        (session.id, int(key), entry)
+        for session in sessions if is_packed(session)
+        for key, entry in session.packed_answers.items()
+        if project_all or entry[4] in ('PENDING', 'MANUAL')
+    ]
+    # Skip answers to questions deleted since
+    question_ids = set(
+        Question.objects.filter(id__in={question_id for _, question_id, _ in entries})
+        .values_list('id', flat=True)
+    ) if entries else set()
+    rows = [
+        StudentAnswer(
+            session_id=session_id,
+            question_id=question_id,
+            answer=text,
+            client_seq=client_seq,
+            is_correct=is_correct,
+            points_earned=_unpack_points(points_earned),
+            grading_status=grading_status,
+        )
+        for session_id, question_id, (text, client_seq, is_correct, points_earned, grading_status) in entries
+        if question_id in question_ids
+    ]
+    StudentAnswer.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['session', 'question'],
+        update_fields=['answer', 'client_seq', 'is_correct', 'points_earned', 'grading_status', 'updated_at'],
+        batch_size=500,
+    )
+    return len(rows)
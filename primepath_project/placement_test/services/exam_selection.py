@@ -0,0 +1,191 @@
+"""
+Strategies for picking one exam out of a curriculum level's exam pool.
+
+A pool is the list of (exam, slot) pairs for the active exams mapped to a
+level through ExamLevelMapping, ordered by slot. Strategies are selected by
+name through the PLACEMENT_EXAM_SELECTION_STRATEGY setting. Strategies that
+change state on every pick (round robin) have a preview that picks without
+changing it, for exams that are only pre-resolved.
+
+This module also keeps the per-exam count of in-progress sessions used by the
+least_loaded strategy. Counts live in the shared cache and are re-seeded from
+StudentSession whenever a key is missing or expires.
+"""
+import itertools
+import logging
+import random
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count
+
+from core.constants import (
+    CACHE_TTL_SECONDS,
+    EXAM_CACHE_KEY_PREFIX,
+    EXAM_SELECTION_UNIFORM,
+    EXAM_SELECTION_WEIGHTED,
+    EXAM_SELECTION_ROUND_ROBIN,
+    EXAM_SELECTION_LEAST_LOADED,
+    MAX_EXAM_SLOTS,
+)
+from ..models import Exam, StudentSession
+
+logger = logging.getLogger(__name__)
+
+ExamPool = List[Tuple[Exam, int]]
+
+# Per-process fallback counters for round robin when the shared cache is unavailable
+_local_counters: Dict[int, itertools.count] = {}
+
+
+def select_uniform(level_id: int, pool: ExamPool) -> Exam:
+    """Every active exam is equally likely."""
+    return random.choice(pool)[0]
+
+
+def select_weighted_by_slot(level_id: int, pool: ExamPool) -> Exam:
+    """Lower slots are preferred: slot 1 weighs MAX_EXAM_SLOTS, slot 5 weighs 1."""
+    weights = [max(MAX_EXAM_SLOTS + 1 - slot, 1) for _, slot in pool]
+    return random.choices(pool, weights=weights)[0][0]
+
+
+def _round_robin_key(level_id: int) -> str:
+    return f'{EXAM_CACHE_KEY_PREFIX}rr_{level_id}'
+
+
+def select_round_robin(level_id: int, pool: ExamPool) -> Exam:
+    """Hand out exams in slot order, so the least recently assigned one goes next."""
+    counter_key = _round_robin_key(level_id)
+    try:
+        cache.add(counter_key, 0, timeout=None)
+        position = cache.incr(counter_key)
+    except Exception:
+        # DummyCache or cache outage: rotate within this worker only
+        position = next(_local_counters.setdefault(level_id, itertools.count(1)))
+    return pool[(position - 1) % len(pool)][0]
+
+
+def peek_round_robin(level_id: int, pool: ExamPool) -> Exam:
+    """The exam round robin would hand out next, without advancing the rotation."""
+    try:
+        position = cache.get(_round_robin_key(level_id), 0)
+    except Exception:
+        position = 0
+    return pool[position % len(pool)][0]
+
+
+def _load_key(exam_id) -> str:
+    return f'{EXAM_CACHE_KEY_PREFIX}load_{exam_id}'
+
+
+def get_exam_loads(exam_ids: Iterable) -> Dict:
+    """
+    Return {exam_id: in-progress session count}.
+
+    Counts come from the cache in one round trip; any missing ones are
+    counted in a single grouped query and written back (expiring after
+    CACHE_TTL_SECONDS, so drift from abandoned sessions heals itself).
+    """
+    exam_ids = list(exam_ids)
+    keys = {_load_key(exam_id): exam_id for exam_id in exam_ids}
+    try:
+        cached = cache.get_many(list(keys))
+    except Exception as e:
+        logger.warning(f"Exam load cache unavailable, counting from database: {e}")
+        cached = {}
+
+    loads = {keys[key]: max(count, 0) for key, count in cached.items()}
+    missing = [exam_id for exam_id in exam_ids if exam_id not in loads]
+    if missing:
+        counted = dict(
+            StudentSession.objects.filter(
+                exam_id__in=missing, completed_at__isnull=True
+            ).values_list('exam_id').annotate(count=Count('id'))
+        )
+        for exam_id in missing:
+            loads[exam_id] = counted.get(exam_id, 0)
+            try:
+                cache.add(_load_key(exam_id), loads[exam_id], timeout=CACHE_TTL_SECONDS)
+            except Exception:
+                pass
+    return loads
+
+
+def _change_load(exam_id, delta: int) -> None:
+    try:
+        if delta > 0:
+            cache.incr(_load_key(exam_id), delta)
+        else:
+            cache.decr(_load_key(exam_id), -delta)
+    except Exception:
+        # Key missing or cache unavailable: the next read re-seeds from the database
+        pass
+
+
+def record_session_started(exam_id) -> None:
+    """Count a new in-progress session on an exam once the transaction commits."""
+    transaction.on_commit(lambda: _change_load(exam_id, 1))
+
+
+def record_session_finished(exam_id, count: int = 1) -> None:
+    """Release `count` in-progress sessions from an exam once the transaction commits."""
+    transaction.on_commit(lambda: _change_load(exam_id, -count))
+
+
+def select_least_loaded(level_id: int, pool: ExamPool) -> Exam:
+    """Pick the exam with the fewest in-progress sessions; ties are broken at random."""
+    loads = get_exam_loads(exam.id for exam, _ in pool)
+    lowest = min(loads.values())
+    return random.choice([exam for exam, _ in pool if loads[exam.id] == lowest])
+
+
+STRATEGIES: Dict[str, Callable[[int, ExamPool], Exam]] = {
+    EXAM_SELECTION_UNIFORM: select_uniform,
+    EXAM_SELECTION_WEIGHTED: select_weighted_by_slot,
+    EXAM_SELECTION_ROUND_ROBIN: select_round_robin,
+    EXAM_SELECTION_LEAST_LOADED: select_least_loaded,
+}
+
+
+# Side-effect-free stand-ins for strategies that change state on every pick,
+# used to pre-resolve exams a session may never switch to
+PREVIEWS: Dict[str, Callable[[int, ExamPool], Exam]] = {
+    EXAM_SELECTION_ROUND_ROBIN: peek_round_robin,
+}
+
+
+def register_strategy(
+    name: str,
+    strategy: Callable[[int, ExamPool], Exam],
+    preview: Optional[Callable[[int, ExamPool], Exam]] = None
+) -> None:
+    """
+    Register an additional selection strategy under `name`.
+
+    A strategy that changes state on every pick (a rotation, a quota) must
+    come with a `preview` that picks without changing it.
+    """
+    STRATEGIES[name] = strategy
+    if preview is not None:
+        PREVIEWS[name] = preview
+    else:
+        PREVIEWS.pop(name, None)
+
+
+def is_stateful(name: str) -> bool:
+    """Whether picking with a strategy changes state (it has a preview)."""
+    return name in PREVIEWS
+
+
+def get_preview(name: str) -> Callable[[int, ExamPool], Exam]:
+    """The strategy's side-effect-free preview, or the strategy itself if it has none."""
+    return PREVIEWS.get(name) or get_strategy(name)
+
+
+def get_strategy(name: str) -> Callable[[int, ExamPool], Exam]:
+    strategy = STRATEGIES.get(name)
+    if strategy is None:
+        logger.warning(f"Unknown exam selection strategy '{name}', using uniform")
+        return select_uniform
+    return strategy
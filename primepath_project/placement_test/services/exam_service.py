@@ -5,8 +5,11 @@ from typing import List, Dict, Any, Optional
 from django.db import transaction
 from django.core.files.uploadedfile import UploadedFile
 from core.exceptions import ValidationException, ExamConfigurationException
-from core.constants import DEFAULT_OPTIONS_COUNT, DEFAULT_QUESTION_POINTS
+from core.constants import (
+    DEFAULT_OPTIONS_COUNT, DEFAULT_QUESTION_POINTS, SCORING_ALL_OR_NOTHING, SCORING_SCHEMES_BY_TYPE,
+)
 from ..models import Exam, Question, AudioFile
+from . import answer_keys
 import logging
 
 logger = logging.getLogger(__name__)
@@ -93,6 +96,9 @@ class ExamService:
                 )
         
         created_questions = Question.objects.bulk_create(questions_to_create)
+        if created_questions:
+            # bulk_create sends no signals; retire the exam's compiled key
+            answer_keys.touch_exam(exam.id)
         
         logger.info(
             f"Created {len(created_questions)} questions for exam {exam.id}"
@@ -146,6 +152,7 @@ class ExamService:
     
     @staticmethod
     @transaction.atomic
+    @answer_keys.deferred_exam_touches()
     def update_exam_questions(
         exam: Exam,
         questions_data: List[Dict[str, Any]]
@@ -159,6 +166,10 @@ class ExamService:
             
         Returns:
             Summary of updates
+            
+        Raises:
+            ValidationException: If a scoring scheme does not apply to its
+                question type
         """
         updated_count = 0
         created_count = 0
@@ -177,6 +188,13 @@ class ExamService:
                     if question.question_type == 'MCQ' and 'options_count' in q_data:
                         question.options_count = q_data['options_count']
                     
+                    if 'scoring_scheme' in q_data:
+                        question.scoring_scheme = q_data['scoring_scheme']
+                    # Changing type keeps a scheme only where it still applies
+                    question.scoring_scheme = ExamService.validate_scoring_scheme(
+                        question.question_type, question.scoring_scheme, strict='scoring_scheme' in q_data
+                    )
+                    
                     question.save()
                     updated_count += 1
                     
@@ -187,15 +205,19 @@ class ExamService:
             else:
                 # Create new question
                 question_num = int(q_data.get('question_number'))
+                question_type = q_data.get('question_type', 'MCQ')
                 
                 Question.objects.update_or_create(
                     exam=exam,
                     question_number=question_num,
                     defaults={
-                        'question_type': q_data.get('question_type', 'MCQ'),
+                        'question_type': question_type,
                         'correct_answer': q_data.get('correct_answer', ''),
                         'points': q_data.get('points', DEFAULT_QUESTION_POINTS),
-                        'options_count': q_data.get('options_count', DEFAULT_OPTIONS_COUNT)
+                        'options_count': q_data.get('options_count', DEFAULT_OPTIONS_COUNT),
+                        'scoring_scheme': ExamService.validate_scoring_scheme(
+                            question_type, q_data.get('scoring_scheme', SCORING_ALL_OR_NOTHING)
+                        ),
                     }
                 )
                 created_count += 1
@@ -210,6 +232,34 @@ class ExamService:
             'total': len(questions_data)
         }
     
+    @staticmethod
+    def validate_scoring_scheme(question_type: str, scheme: str, strict: bool = True) -> str:
+        """
+        Check that a partial-credit scheme applies to a question type.
+        
+        Args:
+            question_type: Question type
+            scheme: Scoring scheme (Question.SCORING_SCHEMES)
+            strict: Raise for a scheme that does not apply; otherwise fall
+                back to all or nothing
+            
+        Returns:
+            The scheme to save
+            
+        Raises:
+            ValidationException: If strict and the scheme does not apply
+        """
+        allowed = SCORING_SCHEMES_BY_TYPE.get(question_type, (SCORING_ALL_OR_NOTHING,))
+        if scheme in allowed:
+            return scheme
+        if not strict:
+            return SCORING_ALL_OR_NOTHING
+        raise ValidationException(
+            f"Scoring scheme {scheme!r} does not apply to {question_type} questions",
+            code="INVALID_SCORING_SCHEME",
+            details={'question_type': question_type, 'allowed': list(allowed)}
+        )
+    
     @staticmethod
     def get_next_version_letter(curriculum_level_id: int) -> str:
         """
@@ -275,6 +325,7 @@ class ExamService:
     
     @staticmethod
     @transaction.atomic
+    @answer_keys.deferred_exam_touches()
     def update_audio_assignments(
         exam: Exam,
         audio_assignments: Dict[str, int]
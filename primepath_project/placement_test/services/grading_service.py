@@ -1,9 +1,15 @@
 """
 Service for grading and evaluation of student answers.
 """
+from datetime import date
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
 from typing import Dict, Any, List, Optional
 from django.db import transaction
-from ..models import StudentAnswer, Question, StudentSession
+from core.constants import DEFAULT_PAGE_SIZE
+from core.exceptions import AnswerValidationException
+from ..models import StudentAnswer, StudentSession
+from . import answer_keys, answer_store
+from .answer_keys import AnswerKey, QuestionKey
 import logging
 
 logger = logging.getLogger(__name__)
@@ -13,126 +19,146 @@ class GradingService:
     """Handles grading logic for different question types."""
     
     @staticmethod
-    def grade_mcq_answer(student_answer: str, correct_answer: str) -> bool:
+    def auto_grade_answer(answer: StudentAnswer, key: Optional[QuestionKey] = None) -> Dict[str, Any]:
         """
-        Grade a multiple choice question.
+        Automatically grade an answer based on question type.
         
         Args:
-            student_answer: Student's answer
-            correct_answer: Correct answer
+            answer: StudentAnswer instance
+            key: Compiled key of the answer's question (see answer_keys);
+                compiled from the question when not given
             
         Returns:
-            True if correct, False otherwise
+            Dictionary with grading results
         """
-        return student_answer.strip().upper() == correct_answer.strip().upper()
+        question = answer.question
+        if key is None:
+            key = QuestionKey(question)
+        credit = key.credit(answer.answer)
+        if credit is None:
+            return {'is_correct': None, 'points_earned': 0, 'requires_manual_grading': True}
+        earned, out_of = credit
+        if earned == out_of:
+            points = question.points
+        elif earned:
+            points = GradingService.points(Decimal(question.points * earned) / out_of)
+        else:
+            points = 0
+        return {
+            'is_correct': earned == out_of,
+            'points_earned': points,
+            'requires_manual_grading': False
+        }
     
     @staticmethod
-    def grade_checkbox_answer(student_answer: str, correct_answer: str) -> bool:
+    def question_key(answer: StudentAnswer, keys: Dict[Any, AnswerKey]) -> Optional[QuestionKey]:
+        """Key of an answer's question from {exam_id: AnswerKey}, or None."""
+        exam_key = keys.get(answer.question.exam_id)
+        return exam_key.get(answer.question_id) if exam_key else None
+    
+    @staticmethod
+    def grade_answers(
+        answers: List[StudentAnswer],
+        keys: Optional[Dict[Any, AnswerKey]] = None
+    ) -> None:
         """
-        Grade a checkbox (select all) question.
+        Auto-grade many answers and save the grades with one bulk_update.
+        
+        Answers need their question loaded (select_related('question'), or
+        answer_store.load_answers).
         
         Args:
-            student_answer: Comma-separated student answers
-            correct_answer: Comma-separated correct answers
-            
-        Returns:
-            True if all correct options selected, False otherwise
+            answers: StudentAnswer instances to grade
+            keys: {exam_id: AnswerKey} covering the answers' exams; looked up
+                when not given
         """
-        # Convert to sets for comparison
-        student_set = {
-            ans.strip().upper() 
-            for ans in student_answer.split(',') 
-            if ans.strip()
-        }
-        correct_set = {
-            ans.strip().upper() 
-            for ans in correct_answer.split(',') 
-            if ans.strip()
-        }
-        
-        return student_set == correct_set
+        if keys is None:
+            keys = answer_keys.get_answer_keys({answer.question.exam_id for answer in answers})
+        for answer in answers:
+            answer.auto_grade(GradingService.question_key(answer, keys))
+        answer_store.save_grades(answers)
     
     @staticmethod
-    def grade_short_answer(
-        student_answer: str,
-        correct_answer: str,
-        case_sensitive: bool = False
-    ) -> Optional[bool]:
+    def get_answer_sheet(session: StudentSession) -> List[StudentAnswer]:
         """
-        Grade a short answer question.
+        Return one StudentAnswer per question of the session's exam.
+        
+        Answers only exist for questions the student answered; every other
+        question gets an unsaved, empty StudentAnswer so callers can treat
+        the sheet as complete.
         
         Args:
-            student_answer: Student's answer
-            correct_answer: Correct answer(s) separated by |
-            case_sensitive: Whether to check case
+            session: Student session
             
         Returns:
-            True if matches any acceptable answer, None if manual grading needed
+            List of StudentAnswer instances in question order
         """
-        if not correct_answer:
-            # No automatic grading possible
-            return None
-            
-        # Get all acceptable answers
-        acceptable_answers = [
-            ans.strip() for ans in correct_answer.split('|')
-        ]
-        
-        student_ans = student_answer.strip()
-        
-        if not case_sensitive:
-            student_ans = student_ans.lower()
-            acceptable_answers = [ans.lower() for ans in acceptable_answers]
-        
-        return student_ans in acceptable_answers
+        questions = list(session.exam.questions.all())
+        answered = {
+            answer.question_id: answer
+            for answer in answer_store.load_answers([session], questions=questions)
+        }
+        sheet = []
+        for question in questions:
+            answer = answered.get(question.id) or StudentAnswer(session=session, answer='')
+            answer.question = question
+            sheet.append(answer)
+        return sheet
     
     @staticmethod
-    def auto_grade_answer(answer: StudentAnswer) -> Dict[str, Any]:
+    def get_attempts(session: StudentSession) -> List[Dict[str, Any]]:
         """
-        Automatically grade an answer based on question type.
+        Return one entry per exam the student worked on, in the order taken.
+        
+        Difficulty adjustments keep the answers to the exam being left, so a
+        session can hold several attempts. Archived attempts are scored in
+        memory with the auto-grader; nothing is written.
         
         Args:
-            answer: StudentAnswer instance
+            session: Student session
             
         Returns:
-            Dictionary with grading results
+            List of dicts with level, exam, answered, total_questions,
+            score, total_possible and is_current
         """
-        question = answer.question
-        result = {
-            'is_correct': None,
-            'points_earned': 0,
-            'requires_manual_grading': False
-        }
-        
-        if question.question_type == 'MCQ':
-            result['is_correct'] = GradingService.grade_mcq_answer(
-                answer.answer,
-                question.correct_answer
-            )
-            
-        elif question.question_type == 'CHECKBOX':
-            result['is_correct'] = GradingService.grade_checkbox_answer(
-                answer.answer,
-                question.correct_answer
+        adjustments = list(
+            session.adjustments.select_related(
+                'from_level__subprogram__program', 'from_exam'
             )
-            
-        elif question.question_type == 'SHORT':
-            result['is_correct'] = GradingService.grade_short_answer(
-                answer.answer,
-                question.correct_answer
-            )
-            if result['is_correct'] is None:
-                result['requires_manual_grading'] = True
-                
-        elif question.question_type in ['LONG', 'MIXED']:
-            # These require manual grading
-            result['requires_manual_grading'] = True
-            
-        # Calculate points
-        if result['is_correct']:
-            result['points_earned'] = question.points
-            
-        return result
+        )
+        path = [(adj.from_level, adj.from_exam) for adj in adjustments]
+        path.append((session.final_curriculum_level, session.exam))
+        
+        exam_ids = {exam.id for _, exam in path if exam is not None}
+        answers_by_exam = {}
+        for answer in answer_store.load_answers([session], exam_ids):
+            answers_by_exam.setdefault(answer.question.exam_id, []).append(answer)
+        keys = answer_keys.get_answer_keys(exam_ids)
+        
+        attempts = []
+        for index, (level, exam) in enumerate(path):
+            is_current = index == len(path) - 1
+            answers = answers_by_exam.get(exam.id, []) if exam else []
+            score = 0
+            for answer in answers:
+                if answer.question.question_type == 'LONG':
+                    continue
+                if is_current and session.is_completed:
+                    score += answer.points_earned
+                elif answer.answer:
+                    score += GradingService.auto_grade_answer(
+                        answer, GradingService.question_key(answer, keys)
+                    )['points_earned']
+            attempts.append({
+                'level': level,
+                'exam': exam,
+                'answered': sum(1 for answer in answers if answer.answer),
+                'total_questions': exam.total_questions if exam else None,
+                'score': score,
+                'total_possible': keys[exam.id].total_possible if exam and exam.id in keys else 0,
+                'is_current': is_current,
+            })
+        return attempts
     
     @staticmethod
     @transaction.atomic
@@ -145,7 +171,7 @@ class GradingService:
         
         Args:
             session: Student session to grade
-            manual_grades: Dictionary of {question_id: {'is_correct': bool, 'points': int}}
+            manual_grades: Dictionary of {question_id: {'is_correct': bool, 'points': number}}
             
         Returns:
             Summary of grading results
@@ -155,21 +181,28 @@ class GradingService:
         auto_graded = 0
         manual_graded = 0
         requires_manual = []
+        to_save = []
+        key = answer_keys.get_answer_key(session.exam)
         
-        for answer in session.answers.select_related('question').all():
+        for answer in GradingService.get_answer_sheet(session):
             question_id = answer.question.id
             
             # Check for manual grade first
             if manual_grades and question_id in manual_grades:
                 grade_info = manual_grades[question_id]
                 answer.is_correct = grade_info.get('is_correct')
-                answer.points_earned = grade_info.get('points', 0)
+                answer.points_earned = GradingService.points(grade_info.get('points', 0))
+                answer.grading_status = 'MANUAL'
                 manual_graded += 1
+            elif not answer_store.is_stored(answer):
+                # Unanswered: nothing to grade, scores zero
+                pass
             else:
-                # Auto grade
-                grade_result = GradingService.auto_grade_answer(answer)
-                answer.is_correct = grade_result['is_correct']
-                answer.points_earned = grade_result['points_earned']
+                # Auto grade (a grade given by hand is kept)
+                if answer.grading_status == 'MANUAL':
+                    grade_result = {'requires_manual_grading': False}
+                else:
+                    grade_result = answer.auto_grade(key.get(question_id))
                 
                 if grade_result['requires_manual_grading']:
                     requires_manual.append({
@@ -180,18 +213,19 @@ class GradingService:
                 else:
                     auto_graded += 1
             
-            answer.save()
+            if answer_store.is_stored(answer) or (manual_grades and question_id in manual_grades):
+                to_save.append(answer)
             
             # Calculate totals (exclude LONG answers from total possible)
             if answer.question.question_type not in ['LONG']:
                 total_possible += answer.question.points
                 total_score += answer.points_earned
         
+        answer_store.save_grades(to_save)
+        
         # Update session score
         session.score = total_score
-        session.percentage_score = (
-            (total_score / total_possible * 100) if total_possible > 0 else 0
-        )
+        session.percentage_score = GradingService.percentage(total_score, total_possible)
         session.save()
         
         logger.info(
@@ -201,7 +235,7 @@ class GradingService:
         )
         
         return {
-            'total_score': total_score,
+            'total_score': float(total_score),
             'total_possible': total_possible,
             'percentage_score': float(session.percentage_score or 0),
             'auto_graded': auto_graded,
@@ -210,6 +244,201 @@ class GradingService:
             'is_complete': len(requires_manual) == 0
         }
     
+    @staticmethod
+    def points(value) -> Decimal:
+        """
+        Points as stored on an answer (two decimal places, halves rounded up).
+        
+        Raises:
+            ValueError: If value is not a finite number
+        """
+        try:
+            points = Decimal(str(value))
+        except InvalidOperation:
+            raise ValueError(f"Invalid points: {value!r}")
+        if not points.is_finite():
+            raise ValueError(f"Invalid points: {value!r}")
+        return points.quantize(Decimal('0.01'), rounding=ROUND_HALF_UP)
+    
+    @staticmethod
+    def percentage(score, total_possible) -> Decimal:
+        """Percentage score as stored on the session (two decimal places)."""
+        if total_possible <= 0:
+            return Decimal('0.00')
+        return (Decimal(score) * 100 / Decimal(total_possible)).quantize(Decimal('0.01'))
+    
+    @staticmethod
+    def get_grading_queue(
+        exam_id=None,
+        level_id: Optional[int] = None,
+        date_from: Optional[date] = None,
+        date_to: Optional[date] = None,
+        after: Optional[int] = None,
+        limit: int = DEFAULT_PAGE_SIZE
+    ) -> Dict[str, Any]:
+        """
+        Return a page of answers waiting for manual grading, oldest first.
+        
+        Pages are keyset-paginated on the answer id and read off the partial
+        index on pending answers, so every page costs the same however deep
+        into the queue it is.
+        
+        Args:
+            exam_id: Only answers to this exam
+            level_id: Only answers to exams of this curriculum level
+            date_from: Only sessions completed on or after this day
+            date_to: Only sessions completed on or before this day
+            after: ID of the last answer of the previous page
+            limit: Page size
+            
+        Returns:
+            Dictionary with 'items' (list of dicts) and 'next' (the after
+            value of the next page, None on the last page)
+        """
+        answers = StudentAnswer.objects.filter(grading_status='PENDING')
+        if exam_id:
+            answers = answers.filter(question__exam_id=exam_id)
+        if level_id:
+            answers = answers.filter(question__exam__curriculum_level_id=level_id)
+        if date_from:
+            answers = answers.filter(session__completed_at__date__gte=date_from)
+        if date_to:
+            answers = answers.filter(session__completed_at__date__lte=date_to)
+        if after:
+            answers = answers.filter(id__gt=after)
+        
+        page = list(
+            answers.select_related('session', 'question__exam')
+            .order_by('id')[:limit + 1]
+        )
+        items = [
+            {
+                'id': answer.id,
+                'session_id': str(answer.session_id),
+                'student_name': answer.session.student_name,
+                'completed_at': answer.session.completed_at.isoformat() if answer.session.completed_at else None,
+                'exam_id': str(answer.question.exam_id),
+                'exam_name': answer.question.exam.name,
+                'level_id': answer.question.exam.curriculum_level_id,
+                'question_id': answer.question_id,
+                'question_number': answer.question.question_number,
+                'question_type': answer.question.question_type,
+                'answer': answer.answer,
+                'max_points': answer.question.points,
+            }
+            for answer in page[:limit]
+        ]
+        return {
+            'items': items,
+            'next': page[limit - 1].id if len(page) > limit else None,
+        }
+    
+    @staticmethod
+    @transaction.atomic
+    def apply_manual_grades(grades: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Apply many manual grades at once and rescore the affected sessions.
+        
+        Runs in one transaction with a fixed number of queries: lock the
+        affected sessions, lock and load the answers, save the grades, rescore
+        the sessions set-wise. Sessions are locked before answers and in id
+        order, as regrade_chunk does, so a regrade running at the same time
+        waits for the grades instead of writing back what it read before them.
+        
+        Args:
+            grades: [{'answer_id': int, 'points': number (two decimals), 'is_correct': bool
+                (optional; full points when left out)}]
+            
+        Returns:
+            Dictionary with 'graded' answers and 'sessions' rescored
+            
+        Raises:
+            AnswerValidationException: If a grade is malformed, its answer does
+                not exist, or points are out of range
+        """
+        by_id = {}
+        for grade in grades:
+            try:
+                by_id[int(grade['answer_id'])] = grade
+            except (KeyError, TypeError, ValueError):
+                raise AnswerValidationException(
+                    "Each grade needs a numeric answer_id", code="INVALID_GRADE", details={'grade': grade}
+                )
+        
+        sessions = {
+            session.id: session
+            for session in StudentSession.objects.select_for_update(of=('self',))
+            .filter(id__in=StudentAnswer.objects.filter(id__in=by_id).values('session_id'))
+            .select_related('exam')
+            .order_by('id')
+        }
+        answers = list(
+            StudentAnswer.objects.select_for_update(of=('self',))
+            .filter(id__in=by_id)
+            .select_related('question')
+        )
+        for answer in answers:
+            # The locked copy, with the packed answers as they are now
+            answer.session = sessions[answer.session_id]
+        missing = set(by_id) - {answer.id for answer in answers}
+        if missing:
+            raise AnswerValidationException(
+                "Answers not found", code="ANSWER_NOT_FOUND", details={'answer_ids': sorted(missing)}
+            )
+        
+        for answer in answers:
+            grade = by_id[answer.id]
+            try:
+                points = GradingService.points(grade.get('points'))
+            except ValueError:
+                points = -1
+            if not 0 <= points <= answer.question.points:
+                raise AnswerValidationException(
+                    f"Points must be between 0 and {answer.question.points}",
+                    code="INVALID_POINTS",
+                    details={'answer_id': answer.id, 'points': grade.get('points')}
+                )
+            is_correct = grade.get('is_correct')
+            answer.is_correct = points == answer.question.points if is_correct is None else bool(is_correct)
+            answer.points_earned = points
+            answer.grading_status = 'MANUAL'
+        
+        answer_store.save_grades(answers)
+        GradingService.rescore_sessions(
+            [session for session in sessions.values() if session.completed_at]
+        )
+        
+        logger.info(f"Applied {len(answers)} manual grades across {len(sessions)} sessions")
+        return {'graded': len(answers), 'sessions': len(sessions)}
+    
+    @staticmethod
+    def rescore_sessions(sessions: List[StudentSession]) -> None:
+        """
+        Recompute the scores of completed sessions from their stored grades.
+        
+        One query loads the answers of all sessions (per storage), one
+        bulk_update saves the scores. Sessions need their exam loaded.
+        
+        Args:
+            sessions: StudentSession instances
+        """
+        if not sessions:
+            return
+        keys = {session.exam_id: answer_keys.get_answer_key(session.exam) for session in sessions}
+        scores = {}
+        for answer in answer_store.load_answers(sessions):
+            if answer.question.question_type not in ['LONG']:
+                scores[answer.session_id] = scores.get(answer.session_id, 0) + answer.points_earned
+        
+        from .session_service import SessionService
+        for session in sessions:
+            session.score = scores.get(session.id, 0)
+            session.percentage_score = GradingService.percentage(
+                session.score, keys[session.exam_id].total_possible
+            )
+            SessionService.invalidate_snapshot(session.id)
+        StudentSession.objects.bulk_update(sessions, ['score', 'percentage_score'], batch_size=500)
+    
     @staticmethod
     def get_session_analytics(session: StudentSession) -> Dict[str, Any]:
         """
@@ -221,7 +450,7 @@ class GradingService:
         Returns:
             Dictionary with analytics data
         """
-        answers = session.answers.select_related('question').all()
+        answers = GradingService.get_answer_sheet(session)
         
         # Group by question type
         type_performance = {}
@@ -257,7 +486,7 @@ class GradingService:
         return {
             'type_performance': type_performance,
             'total_questions': session.exam.total_questions,
-            'questions_answered': answers.filter(answer__gt='').count(),
+            'questions_answered': sum(1 for answer in answers if answer.answer),
             'time_spent_seconds': session.time_spent_seconds,
             'time_per_question': time_per_question,
             'difficulty_adjustments': session.difficulty_adjustments,
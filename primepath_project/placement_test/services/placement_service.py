@@ -1,17 +1,91 @@
 """
 Service for handling placement logic and exam matching.
 """
-from typing import Optional, Tuple
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from django.conf import settings
 from django.db import transaction
-from core.models import PlacementRule, CurriculumLevel
-from core.constants import ACADEMIC_RANK_PERCENTILES
+from core.models import PlacementRule, CurriculumLevel, ExamLevelMapping
+from core.constants import (
+    ACADEMIC_RANK_PERCENTILES, PERCENTILE_TO_RANK, MATRIX_RANK_PERCENTILE_RANGES,
+    MIN_GRADE, MAX_GRADE
+)
 from core.exceptions import PlacementRuleException, ExamNotFoundException, ValidationException
+from core.cache import CompiledCache
 from ..models import Exam
+from . import exam_selection
+import csv
+import io
+import json
 import logging
 
 logger = logging.getLogger(__name__)
 
 
+def _compile_rule_table() -> Dict[int, List[Optional[PlacementRule]]]:
+    """
+    Compile all placement rules into {grade: [rule for percentile 0..100]}.
+
+    Each slot holds the rule find_matching_rule would have picked with the
+    range query: the lowest priority value wins, ties go to the oldest rule.
+    """
+    rules = PlacementRule.objects.select_related(
+        'curriculum_level__subprogram__program'
+    ).order_by('priority', 'id')
+
+    table = {}
+    for rule in rules:
+        slots = table.setdefault(rule.grade, [None] * 101)
+        low = max(rule.min_rank_percentile, 0)
+        high = min(rule.max_rank_percentile, 100)
+        for percentile in range(low, high + 1):
+            if slots[percentile] is None:
+                slots[percentile] = rule
+    return table
+
+
+def _compile_level_ladder() -> Dict[str, Any]:
+    """
+    Compile the curriculum ladder: every level in difficulty order.
+
+    Returns a dict with 'levels' (list indexed by a dense global ordinal) and
+    'ordinals' ({level_id: ordinal}), so neighbour lookups are O(1).
+    """
+    levels = list(
+        CurriculumLevel.objects.select_related('subprogram__program').order_by(
+            'subprogram__program__order',
+            'subprogram__order',
+            'level_number'
+        )
+    )
+    return {
+        'levels': levels,
+        'ordinals': {level.id: ordinal for ordinal, level in enumerate(levels)},
+    }
+
+
+def _compile_exam_pools() -> Dict[int, List[Tuple[Exam, int]]]:
+    """
+    Compile {curriculum_level_id: [(exam, slot), ...]} for active mapped exams.
+    
+    Pools are ordered by slot so strategies can rely on a stable order.
+    """
+    mappings = ExamLevelMapping.objects.filter(
+        exam__is_active=True
+    ).select_related('exam').order_by('curriculum_level_id', 'slot')
+    
+    pools = {}
+    for mapping in mappings:
+        pools.setdefault(mapping.curriculum_level_id, []).append(
+            (mapping.exam, mapping.slot)
+        )
+    return pools
+
+
+rule_table = CompiledCache('placement_rule_table', _compile_rule_table)
+level_ladder = CompiledCache('curriculum_level_ladder', _compile_level_ladder)
+exam_pools = CompiledCache('exam_level_pools', _compile_exam_pools)
+
+
 class PlacementService:
     """Handles placement rule matching and exam assignment logic."""
     
@@ -43,6 +117,9 @@ class PlacementService:
         """
         Find the matching placement rule for given grade and rank.
         
+        Resolved from the compiled rule table, so no query is issued unless
+        the rules changed since this worker last compiled them.
+        
         Args:
             grade: Student's grade (1-12)
             academic_rank: Student's academic rank
@@ -55,11 +132,8 @@ class PlacementService:
         """
         percentile = PlacementService.get_percentile_for_rank(academic_rank)
         
-        matching_rule = PlacementRule.objects.filter(
-            grade=grade,
-            min_rank_percentile__lte=percentile,
-            max_rank_percentile__gte=percentile
-        ).order_by('priority').first()
+        slots = rule_table.get().get(grade)
+        matching_rule = slots[percentile] if slots and 0 <= percentile <= 100 else None
         
         if not matching_rule:
             logger.warning(
@@ -78,12 +152,124 @@ class PlacementService:
         return matching_rule
     
     @staticmethod
-    def find_exam_for_level(curriculum_level: CurriculumLevel) -> Exam:
+    def invalidate_rule_table() -> None:
+        """Force every worker to recompile placement rules after the current transaction."""
+        rule_table.invalidate_on_commit()
+    
+    @staticmethod
+    def invalidate_level_ladder() -> None:
+        """Force every worker to recompile the curriculum ladder after the current transaction."""
+        level_ladder.invalidate_on_commit()
+    
+    @staticmethod
+    def get_level_ordinal(curriculum_level_id: int) -> Optional[int]:
+        """Return the dense global ordinal of a curriculum level, or None if unknown."""
+        return level_ladder.get()['ordinals'].get(curriculum_level_id)
+    
+    @staticmethod
+    def get_level(curriculum_level_id: int) -> Optional[CurriculumLevel]:
+        """Return a curriculum level from the cached ladder, or None if unknown."""
+        ladder = level_ladder.get()
+        ordinal = ladder['ordinals'].get(curriculum_level_id)
+        return ladder['levels'][ordinal] if ordinal is not None else None
+    
+    @staticmethod
+    def get_adjacent_level(
+        current_level_id: int,
+        adjustment: int
+    ) -> Optional[CurriculumLevel]:
+        """
+        Return the level `adjustment` steps away on the curriculum ladder.
+        
+        Args:
+            current_level_id: ID of the current curriculum level
+            adjustment: Signed number of steps (+1 harder, -1 easier)
+            
+        Returns:
+            CurriculumLevel, or None if the current level is unknown or the
+            target falls off either end of the ladder
+        """
+        ladder = level_ladder.get()
+        current_index = ladder['ordinals'].get(current_level_id)
+        if current_index is None:
+            logger.error(f"Current level {current_level_id} not found in level ladder")
+            return None
+        
+        new_index = current_index + adjustment
+        if not 0 <= new_index < len(ladder['levels']):
+            logger.info(
+                f"Cannot adjust difficulty: new_index={new_index} out of bounds"
+            )
+            return None
+        
+        return ladder['levels'][new_index]
+    
+    @staticmethod
+    def invalidate_exam_pools() -> None:
+        """Force every worker to recompile the per-level exam pools after the current transaction."""
+        exam_pools.invalidate_on_commit()
+    
+    @staticmethod
+    def get_exam_pool(curriculum_level_id: int) -> List[Tuple[Exam, int]]:
+        """Return the cached [(exam, slot), ...] of active exams mapped to a level."""
+        return exam_pools.get().get(curriculum_level_id, [])
+    
+    @staticmethod
+    def get_pooled_exam(curriculum_level_id: int, exam_id) -> Optional[Exam]:
+        """Return an exam from a level's cached pool, or None if it left the pool."""
+        for exam, _ in PlacementService.get_exam_pool(curriculum_level_id):
+            if exam.id == exam_id:
+                return exam
+        return None
+    
+    @staticmethod
+    def resolve_adjacent_exams(
+        curriculum_level_id: int
+    ) -> Dict[int, Optional[Tuple[CurriculumLevel, Exam]]]:
+        """
+        Pick the exams a session would switch to one level down and up.
+        
+        Uses only the cached ladder and exam pools, so it is cheap enough to
+        run at session start and after every adjustment. Most of these picks
+        are never used, so a stateful strategy is only previewed (see
+        exam_selection.get_preview); the real pick is made if the session
+        switches (SessionService.get_adjustment_target).
+        
+        Args:
+            curriculum_level_id: Current curriculum level ID
+            
+        Returns:
+            {-1: (level, exam) or None, 1: (level, exam) or None}
+        """
+        adjacent = {}
+        for adjustment in (-1, 1):
+            adjacent[adjustment] = None
+            level = PlacementService.get_adjacent_level(curriculum_level_id, adjustment)
+            if level is None:
+                continue
+            pool = PlacementService.get_exam_pool(level.id)
+            if not pool:
+                logger.info(f"No exam to pre-resolve for adjacent level {level.id}")
+                continue
+            preview = exam_selection.get_preview(settings.PLACEMENT_EXAM_SELECTION_STRATEGY)
+            adjacent[adjustment] = (level, preview(level.id, pool))
+        return adjacent
+    
+    @staticmethod
+    def find_exam_for_level(
+        curriculum_level: CurriculumLevel,
+        strategy: Optional[str] = None
+    ) -> Exam:
         """
         Find an active exam for the given curriculum level using exam mappings.
         
+        The active pool comes from the compiled exam pool cache; the exam is
+        picked by the configured selection strategy.
+        
         Args:
             curriculum_level: Target curriculum level
+            strategy: Selection strategy name (defaults to
+                settings.PLACEMENT_EXAM_SELECTION_STRATEGY)
             
         Returns:
             Active Exam instance
@@ -91,30 +277,20 @@ class PlacementService:
         Raises:
             ExamNotFoundException: If no active exam exists
         """
-        from core.models import ExamLevelMapping
-        import random
-        
-        # Get all exam mappings for this curriculum level
-        mappings = ExamLevelMapping.objects.filter(
-            curriculum_level=curriculum_level
-        ).select_related('exam')
+        pool = PlacementService.get_exam_pool(curriculum_level.id)
         
-        # Filter for active exams only
-        active_exams = []
-        for mapping in mappings:
-            if mapping.exam and mapping.exam.is_active:
-                active_exams.append(mapping.exam)
-        
-        if not active_exams:
+        if not pool:
             raise ExamNotFoundException(
                 f"No active exam available for curriculum level {curriculum_level.full_name}",
                 code="NO_ACTIVE_EXAM",
                 details={'curriculum_level_id': curriculum_level.id}
             )
         
-        # Randomly select one of the available exams
-        exam = random.choice(active_exams)
-        logger.info(f"Selected exam {exam.id} for curriculum level {curriculum_level.id}")
+        strategy_name = strategy or settings.PLACEMENT_EXAM_SELECTION_STRATEGY
+        exam = exam_selection.get_strategy(strategy_name)(curriculum_level.id, pool)
+        logger.info(
+            f"Selected exam {exam.id} for curriculum level {curriculum_level.id} ({strategy_name})"
+        )
         
         return exam
     
@@ -164,30 +340,9 @@ class PlacementService:
                 code="INVALID_ADJUSTMENT"
             )
             
-        # Get all curriculum levels in order
-        all_levels = CurriculumLevel.objects.order_by(
-            'subprogram__program__order',
-            'subprogram__order',
-            'level_number'
-        )
-        
-        level_list = list(all_levels)
-        try:
-            current_index = level_list.index(current_level)
-        except ValueError:
-            logger.error(f"Current level {current_level.id} not found in level list")
+        new_level = PlacementService.get_adjacent_level(current_level.id, adjustment)
+        if new_level is None:
             return None
-            
-        new_index = current_index + adjustment
-        
-        # Check bounds
-        if not 0 <= new_index < len(level_list):
-            logger.info(
-                f"Cannot adjust difficulty: new_index={new_index} out of bounds"
-            )
-            return None
-            
-        new_level = level_list[new_index]
         
         # Try to find exam for new level
         try:
@@ -195,4 +350,282 @@ class PlacementService:
             return new_level, new_exam
         except ExamNotFoundException:
             logger.warning(f"No exam available for adjusted level {new_level.id}")
-            return None
\ No newline at end of file
+            return None
+    
+    @staticmethod
+    def parse_applicant_rows(content: str, file_format: str) -> List[Dict[str, Any]]:
+        """
+        Parse an applicant roster from CSV or JSON text.
+        
+        CSV needs a header with `grade` and `academic_rank` columns; JSON is a
+        list of objects (or {"students": [...]}) with the same keys. An optional
+        `student_name` column is carried through to the report.
+        
+        Args:
+            content: Raw file content
+            file_format: 'csv' or 'json'
+            
+        Returns:
+            List of row dictionaries
+            
+        Raises:
+            ValidationException: If the content cannot be parsed
+        """
+        if file_format == 'json':
+            try:
+                data = json.loads(content)
+            except json.JSONDecodeError as e:
+                raise ValidationException(f"Invalid JSON roster: {e}", code="INVALID_JSON")
+            if isinstance(data, dict):
+                data = data.get('students', [])
+            if not isinstance(data, list):
+                raise ValidationException(
+                    "JSON roster must be a list of students",
+                    code="INVALID_ROSTER"
+                )
+            bad_rows = [index for index, row in enumerate(data, start=1) if not isinstance(row, dict)]
+            if bad_rows:
+                raise ValidationException(
+                    "Every student in a JSON roster must be an object",
+                    code="INVALID_ROSTER",
+                    details={'rows': bad_rows[:20]}
+                )
+            return data
+        
+        if file_format == 'csv':
+            reader = csv.DictReader(io.StringIO(content))
+            missing = {'grade', 'academic_rank'} - set(reader.fieldnames or [])
+            if missing:
+                raise ValidationException(
+                    f"CSV roster is missing columns: {', '.join(sorted(missing))}",
+                    code="INVALID_ROSTER"
+                )
+            return list(reader)
+        
+        raise ValidationException(
+            f"Unsupported roster format: {file_format}",
+            code="INVALID_FORMAT"
+        )
+    
+    @staticmethod
+    def simulate_placements(rows: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Resolve a whole applicant roster against the compiled rule set.
+        
+        Nothing is written and exam selection counters are not touched: each
+        placed level reports its active exam pool instead of a concrete pick.
+        
+        Args:
+            rows: Iterable of {'grade', 'academic_rank', optional 'student_name'}
+            
+        Returns:
+            Dictionary with per-level counts (in curriculum order) and the
+            students that could not be placed, with a reason code
+        """
+        table = rule_table.get()
+        pools = exam_pools.get()
+        ordinals = level_ladder.get()['ordinals']
+        
+        level_counts = {}
+        levels = {}
+        unplaced = []
+        total = 0
+        
+        for index, row in enumerate(rows, start=1):
+            total += 1
+            academic_rank = str(row.get('academic_rank') or '').strip().upper()
+            flagged = {
+                'row': index,
+                'student_name': str(row.get('student_name') or row.get('name') or '').strip(),
+                'grade': row.get('grade'),
+                'academic_rank': academic_rank,
+            }
+            
+            try:
+                grade = int(row.get('grade'))
+            except (TypeError, ValueError):
+                unplaced.append({**flagged, 'code': 'INVALID_GRADE', 'reason': 'Invalid grade value'})
+                continue
+            
+            percentile = ACADEMIC_RANK_PERCENTILES.get(academic_rank)
+            if percentile is None:
+                unplaced.append({
+                    **flagged, 'code': 'INVALID_RANK',
+                    'reason': f'Invalid academic rank: {academic_rank}'
+                })
+                continue
+            
+            slots = table.get(grade)
+            rule = slots[percentile] if slots else None
+            if rule is None:
+                unplaced.append({
+                    **flagged, 'code': 'NO_MATCHING_RULE',
+                    'reason': f'No placement rule for grade {grade} with rank {academic_rank}'
+                })
+                continue
+            
+            level = rule.curriculum_level
+            if not pools.get(level.id):
+                unplaced.append({
+                    **flagged, 'code': 'NO_ACTIVE_EXAM',
+                    'reason': f'No active exam for {level.full_name}'
+                })
+                continue
+            
+            levels[level.id] = level
+            level_counts[level.id] = level_counts.get(level.id, 0) + 1
+        
+        level_report = []
+        for level_id in sorted(level_counts, key=lambda pk: ordinals.get(pk, len(ordinals))):
+            pool = pools[level_id]
+            level_report.append({
+                'curriculum_level_id': level_id,
+                'curriculum_level': levels[level_id].full_name,
+                'count': level_counts[level_id],
+                'exams': [
+                    {'exam_id': str(exam.id), 'exam_name': exam.name, 'slot': slot}
+                    for exam, slot in pool
+                ],
+                'expected_per_exam': round(level_counts[level_id] / len(pool), 1),
+            })
+        
+        logger.info(
+            f"Simulated placement for {total} applicants: "
+            f"{total - len(unplaced)} placed, {len(unplaced)} flagged"
+        )
+        
+        return {
+            'total': total,
+            'placed': total - len(unplaced),
+            'flagged': len(unplaced),
+            'levels': level_report,
+            'unplaced': unplaced,
+        }
+
+    
+    @staticmethod
+    def analyze_rules(rules: Optional[Iterable[PlacementRule]] = None) -> Dict[str, Any]:
+        """
+        Check placement rules for gaps, overlaps and unreachable rules.
+        
+        Rules are swept per grade as percentile intervals in a single pass.
+        Only percentiles that academic ranks map to can reach a rule, so a
+        gap is a warning when it swallows such a percentile, and a rule is
+        unreachable when it wins none of them. Overlapping rules of equal
+        priority that point to different levels are ambiguous; overlaps
+        settled by priority are reported for information.
+        
+        Args:
+            rules: Rules to analyze, possibly unsaved; all stored rules if None.
+                Equal-priority ties are broken by position, as in the table.
+            
+        Returns:
+            Dictionary with 'is_valid', 'issues' (each with severity, type,
+            grade, percentile range, rule refs and affected ranks) and counts
+        """
+        if rules is None:
+            rules = PlacementRule.objects.order_by('priority', 'id')
+        
+        reachable = sorted(PERCENTILE_TO_RANK)
+        by_grade = {grade: [] for grade in range(MIN_GRADE, MAX_GRADE + 1)}
+        refs = {}
+        wins = {}
+        issues = []
+        
+        def issue(severity, issue_type, grade, low, high, message, rule_keys=()):
+            affected = [] if issue_type == 'unreachable' else reachable
+            issues.append({
+                'severity': severity,
+                'type': issue_type,
+                'grade': grade,
+                'min_percentile': low,
+                'max_percentile': high,
+                'rules': [refs[key] for key in rule_keys],
+                'academic_ranks': [PERCENTILE_TO_RANK[p] for p in affected if low <= p <= high],
+                'matrix_ranks': [
+                    rank for rank, (rank_low, rank_high) in MATRIX_RANK_PERCENTILE_RANGES.items()
+                    if rank_low <= high and low <= rank_high
+                ],
+                'message': message,
+            })
+        
+        for position, rule in enumerate(rules):
+            refs[position] = {
+                'id': rule.id,
+                'grade': rule.grade,
+                'min_percentile': rule.min_rank_percentile,
+                'max_percentile': rule.max_rank_percentile,
+                'priority': rule.priority,
+                'curriculum_level_id': rule.curriculum_level_id,
+            }
+            wins[position] = 0
+            low = max(rule.min_rank_percentile, 0)
+            high = min(rule.max_rank_percentile, 100)
+            if rule.grade not in by_grade or low > high:
+                continue
+            by_grade[rule.grade].append((low, high, rule.priority, position, rule.curriculum_level_id))
+        
+        for grade, intervals in by_grade.items():
+            if not intervals:
+                issue('warning', 'gap', grade, 0, 100, f"Grade {grade} has no placement rules")
+                continue
+            
+            # Sweep the boundaries; the active set is constant between them
+            intervals.sort()
+            boundaries = sorted({0, 101} | {iv[0] for iv in intervals} | {iv[1] + 1 for iv in intervals})
+            active = []
+            next_start = 0
+            for low, next_low in zip(boundaries, boundaries[1:]):
+                high = next_low - 1
+                active = [iv for iv in active if iv[1] >= low]
+                while next_start < len(intervals) and intervals[next_start][0] <= low:
+                    active.append(intervals[next_start])
+                    next_start += 1
+                segment_reachable = [p for p in reachable if low <= p <= high]
+                
+                if not active:
+                    issue(
+                        'warning' if segment_reachable else 'info', 'gap', grade, low, high,
+                        f"Grade {grade}: no rule covers percentiles {low}-{high}"
+                    )
+                    continue
+                
+                best_priority = min(iv[2] for iv in active)
+                contenders = [iv for iv in active if iv[2] == best_priority]
+                winner = min(contenders, key=lambda iv: iv[3])
+                wins[winner[3]] += len(segment_reachable)
+                
+                if len(active) > 1:
+                    if len({iv[4] for iv in contenders}) > 1:
+                        severity = 'error' if segment_reachable else 'warning'
+                        detail = f", {len(contenders)} with equal priority and different levels"
+                    else:
+                        severity = 'info'
+                        detail = " (resolved by priority)"
+                    issue(
+                        severity, 'overlap', grade, low, high,
+                        f"Grade {grade}: {len(active)} rules overlap on percentiles {low}-{high}{detail}",
+                        [iv[3] for iv in active]
+                    )
+        
+        for position, count in wins.items():
+            if count:
+                continue
+            ref = refs[position]
+            issue(
+                'error', 'unreachable', ref['grade'], ref['min_percentile'], ref['max_percentile'],
+                f"Rule for grade {ref['grade']} ({ref['min_percentile']}-{ref['max_percentile']}%) "
+                f"can never be matched by a student",
+                [position]
+            )
+        
+        counts = {severity: 0 for severity in ('error', 'warning', 'info')}
+        for item in issues:
+            counts[item['severity']] += 1
+        
+        return {
+            'is_valid': counts['error'] == 0,
+            'rule_count': len(refs),
+            'counts': counts,
+            'issues': issues,
+        }
@@ -0,0 +1,266 @@
+"""
+Service for regrading completed sessions after an exam's answer key changed.
+
+Saving answers for an exam that students have already taken schedules a
+RegradeJob. The regrade_sessions command runs pending jobs: it walks the
+exam's completed sessions in id order, in chunks of REGRADE_CHUNK_SIZE, each
+regraded in its own transaction with bulk updates. Chunks can be spread over
+a process pool. After every chunk the job stores its progress and the id of
+the last session done, so a failed or interrupted job resumes where it
+stopped; a job left RUNNING by a runner that died stops sending heartbeats
+and is resumed by the next runner. Sessions whose score changed get a RegradeChange row with the old
+and new score.
+"""
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from typing import Callable, Dict, List, Optional
+
+from django.db import connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core.constants import REGRADE_CHUNK_SIZE, REGRADE_STALE_SECONDS
+from ..models import Exam, RegradeChange, RegradeJob, StudentSession
+from . import answer_keys, answer_store
+from .grading_service import GradingService
+from .answer_keys import AnswerKey
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+@transaction.atomic
+def regrade_chunk(job_id: int, session_ids: List) -> Dict[str, int]:
+    """
+    Regrade some completed sessions against their exam's current key.
+
+    Only auto-graded questions are regraded; grades given by hand are kept.
+    Sessions are locked in id order before their answers are read, the same
+    order GradingService.apply_manual_grades locks in. Takes a fixed number
+    of queries however many sessions are passed. Safe to repeat: a chunk
+    that is regraded again changes nothing and records no changes.
+
+    Args:
+        job_id: RegradeJob the changes are recorded for
+        session_ids: IDs of the sessions to regrade
+
+    Returns:
+        Dictionary with 'sessions' regraded and 'changed' (sessions whose
+        score changed)
+    """
+    sessions = list(
+        StudentSession.objects.select_for_update(of=('self',))
+        .filter(id__in=session_ids, completed_at__isnull=False)
+        .select_related('exam')
+        .order_by('id')
+    )
+    keys = {session.exam_id: answer_keys.get_answer_key(session.exam) for session in sessions}
+
+    regraded, scores = [], {}
+    for answer in answer_store.load_answers(sessions):
+        key = keys[answer.session.exam_id].get(answer.question_id)
+        if key is not None and not key.requires_manual_grading and answer.grading_status != 'MANUAL':
+            was = (answer.is_correct, answer.points_earned, answer.grading_status)
+            answer.auto_grade(key)
+            if (answer.is_correct, answer.points_earned, answer.grading_status) != was:
+                regraded.append(answer)
+        if answer.question.question_type not in ['LONG']:
+            scores[answer.session_id] = scores.get(answer.session_id, 0) + answer.points_earned
+    answer_store.save_grades(regraded)
+
+    changed, changes = [], []
+    for session in sessions:
+        score = scores.get(session.id, 0)
+        new_percentage = GradingService.percentage(score, keys[session.exam_id].total_possible)
+        if session.score == score and session.percentage_score == new_percentage:
+            continue
+        changes.append(RegradeChange(
+            job_id=job_id,
+            session=session,
+            old_score=session.score,
+            new_score=score,
+            old_percentage=session.percentage_score,
+            new_percentage=new_percentage,
+        ))
+        session.score = score
+        session.percentage_score = new_percentage
+        changed.append(session)
+
+    StudentSession.objects.bulk_update(changed, ['score', 'percentage_score'], batch_size=500)
+    RegradeChange.objects.bulk_create(changes, batch_size=500)
+    if changed:
+        from .session_service import SessionService
+        for session in changed:
+            SessionService.invalidate_snapshot(session.id)
+    return {'sessions': len(sessions), 'changed': len(changed)}
+
+
+class RegradeService:
+    """Schedules and runs regrades of completed sessions."""
+
+    @staticmethod
+    def schedule_regrade(exam: Exam) -> Optional[RegradeJob]:
+        """
+        Schedule a regrade of an exam's completed sessions.
+
+        A job still pending for the exam is reused. A running job keeps
+        running (it grades against the current key chunk by chunk), and a new
+        job covers the sessions it already did.
+
+        Args:
+            exam: Exam whose key changed
+
+        Returns:
+            The pending RegradeJob, or None if no session has been completed
+        """
+        if not StudentSession.objects.filter(exam=exam, completed_at__isnull=False).exists():
+            return None
+
+        job = RegradeJob.objects.filter(exam=exam, status='PENDING').first()
+        if job is None:
+            job = RegradeJob.objects.create(exam=exam, key_version=exam.updated_at)
+        elif job.key_version != exam.updated_at:
+            job.key_version = exam.updated_at
+            job.save(update_fields=['key_version'])
+
+        logger.info(f"Scheduled regrade job {job.id} for exam {exam.id}")
+        return job
+
+    @staticmethod
+    def schedule_if_key_changed(exam: Exam, key_before: AnswerKey) -> Optional[RegradeJob]:
+        """
+        Schedule a regrade if an exam's key grades differently than before an edit.
+
+        Args:
+            exam: Exam whose questions were edited
+            key_before: Its answer key from before the edit
+
+        Returns:
+            The pending RegradeJob, or None if nothing needs regrading
+        """
+        exam.refresh_from_db(fields=['updated_at'])
+        if answer_keys.get_answer_key(exam).grades_like(key_before):
+            return None
+        return RegradeService.schedule_regrade(exam)
+
+    @staticmethod
+    def run_job(
+        job: RegradeJob,
+        chunk_size: int = REGRADE_CHUNK_SIZE,
+        workers: int = 1,
+        progress: Optional[Callable[[RegradeJob], None]] = None
+    ) -> RegradeJob:
+        """
+        Run (or resume) a regrade job.
+
+        Args:
+            job: RegradeJob to run; a failed or interrupted one resumes after
+                its last session
+            chunk_size: Sessions regraded per transaction
+            workers: Processes regrading chunks in parallel (1: in this process)
+            progress: Called with the job after every chunk
+
+        Returns:
+            The finished job
+
+        Raises:
+            Whatever a chunk raised; the job is marked FAILED first
+        """
+        sessions = StudentSession.objects.filter(exam_id=job.exam_id, completed_at__isnull=False)
+        remaining = sessions.order_by('id')
+        if job.last_session_id is not None:
+            remaining = remaining.filter(id__gt=job.last_session_id)
+        session_ids = list(remaining.values_list('id', flat=True))
+        chunks = [session_ids[i:i + chunk_size] for i in range(0, len(session_ids), chunk_size)]
+
+        job.status = 'RUNNING'
+        job.started_at = job.started_at or timezone.now()
+        job.heartbeat_at = timezone.now()
+        job.total_sessions = job.processed_sessions + len(session_ids)
+        job.error = ''
+        job.save(update_fields=['status', 'started_at', 'heartbeat_at', 'total_sessions', 'error'])
+        logger.info(f"Regrading {len(session_ids)} sessions for job {job.id} in {len(chunks)} chunks")
+
+        try:
+            if workers > 1 and len(chunks) > 1:
+                # Forked workers must not share the parent's connections
+                connections.close_all()
+                with ProcessPoolExecutor(
+                    max_workers=workers, mp_context=multiprocessing.get_context('fork')
+                ) as executor:
+                    results = executor.map(regrade_chunk, [job.id] * len(chunks), chunks)
+                    RegradeService._record_progress(job, chunks, results, progress)
+            else:
+                results = (regrade_chunk(job.id, chunk) for chunk in chunks)
+                RegradeService._record_progress(job, chunks, results, progress)
+        except Exception as e:
+            job.status = 'FAILED'
+            job.error = str(e)
+            job.save(update_fields=['status', 'error'])
+            logger.error(f"Regrade job {job.id} failed: {e}", exc_info=True)
+            raise
+
+        job.status = 'DONE'
+        job.finished_at = timezone.now()
+        job.save(update_fields=['status', 'finished_at'])
+        logger.info(
+            f"Regrade job {job.id} done: {job.changed_sessions} of "
+            f"{job.processed_sessions} sessions changed score"
+        )
+        return job
+
+    @staticmethod
+    def _record_progress(job, chunks, results, progress) -> None:
+        # Results arrive in chunk order, so everything up to the last
+        # session of a chunk is done once its result is in
+        for chunk, result in zip(chunks, results):
+            job.processed_sessions += len(chunk)
+            job.changed_sessions += result['changed']
+            job.last_session_id = chunk[-1]
+            job.heartbeat_at = timezone.now()
+            job.save(update_fields=[
+                'processed_sessions', 'changed_sessions', 'last_session_id', 'heartbeat_at'
+            ])
+            if progress:
+                progress(job)
+
+    @staticmethod
+    def run_pending(
+        chunk_size: int = REGRADE_CHUNK_SIZE,
+        workers: int = 1,
+        progress: Optional[Callable[[RegradeJob], None]] = None
+    ) -> List[RegradeJob]:
+        """
+        Run every pending job, oldest first.
+
+        Also resumes RUNNING jobs whose heartbeat is older than
+        REGRADE_STALE_SECONDS: their runner died mid-run, and they carry on
+        after their last session. Jobs are claimed with a conditional update
+        on their status and heartbeat, so several runners can work side by
+        side without running a job twice.
+
+        Returns:
+            The jobs run
+        """
+        stale = timezone.now() - timedelta(seconds=REGRADE_STALE_SECONDS)
+        jobs = RegradeJob.objects.filter(
+            Q(status='PENDING')
+            | Q(status='RUNNING', heartbeat_at__lt=stale)
+            | Q(status='RUNNING', heartbeat_at__isnull=True)
+        ).select_related('exam')
+
+        done = []
+        for job in jobs:
+            claimed = RegradeJob.objects.filter(
+                id=job.id, status=job.status, heartbeat_at=job.heartbeat_at
+            ).update(status='RUNNING', heartbeat_at=timezone.now())
+            if not claimed:
+                continue
+            if job.status == 'RUNNING':
+                logger.warning(
+                    f"Regrade job {job.id} stopped sending heartbeats at {job.heartbeat_at}; "
+                    f"resuming after session {job.last_session_id}"
+                )
+            done.append(RegradeService.run_job(job, chunk_size, workers, progress))
+        return done
@@ -1,12 +1,28 @@
 """
 Service for managing student test sessions.
 """
-from typing import Dict, Any, Optional
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+from django.conf import settings
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import F, Q
 from django.utils import timezone
-from core.models import School
-from core.exceptions import ValidationException, SessionAlreadyCompletedException
+from core.schools import resolve_school
+from core.constants import (
+    CACHE_TTL_SECONDS, SESSION_SNAPSHOT_KEY_PREFIX, SESSION_DEADLINE_KEY_PREFIX,
+    ANSWER_IDEMPOTENCY_KEY_PREFIX,
+    SESSION_TIMEOUT_HOURS, SESSION_EXPIRY_GRACE_MINUTES, SESSION_REAPER_BATCH_SIZE,
+    SESSION_DEADLINE_GRACE_SECONDS
+)
+from core.exceptions import (
+    ValidationException, SessionAlreadyCompletedException, SessionExpiredException,
+    SessionNotFoundException, ExamNotFoundException
+)
 from ..models import StudentSession, StudentAnswer, Exam, Question, DifficultyAdjustment
+from .placement_service import PlacementService
+from .grading_service import GradingService
+from . import answer_buffer, answer_keys, answer_store, exam_selection
 import logging
 
 logger = logging.getLogger(__name__)
@@ -24,7 +40,12 @@ class SessionService:
         request_meta: Dict[str, str]
     ) -> StudentSession:
         """
-        Create a new student session with answer placeholders.
+        Create a new student session.
+        
+        No answer rows are created here; a StudentAnswer is inserted the first
+        time the student answers a question (see submit_answer). Sessions
+        created while PLACEMENT_ANSWER_STORAGE is 'packed' keep their answers
+        in packed_answers instead (see answer_store).
         
         Args:
             student_data: Dictionary containing student information
@@ -35,38 +56,36 @@ class SessionService:
         Returns:
             Created StudentSession instance
         """
-        # Handle school creation/retrieval
-        school = None
-        school_name = student_data.get('school_name')
-        if school_name:
-            school, _ = School.objects.get_or_create(name=school_name)
+        # Spelling variants of a name resolve to the same directory entry
+        school_name = student_data.get('school_name') or ''
+        school = resolve_school(school_name)
+        
+        # Pre-resolve the exams one level down/up for instant adjustment
+        adjacent = PlacementService.resolve_adjacent_exams(curriculum_level_id)
+        easier = adjacent[-1] or (None, None)
+        harder = adjacent[1] or (None, None)
         
-        # Create session
+        # Create session; the deadline is fixed now and enforced on every write
         session = StudentSession.objects.create(
             student_name=student_data['student_name'],
             parent_phone=student_data.get('parent_phone', ''),
             school=school,
-            school_name_manual=school_name if not school else '',
+            school_name_manual='' if school else school_name,
             grade=student_data['grade'],
             academic_rank=student_data['academic_rank'],
             exam=exam,
             original_curriculum_level_id=curriculum_level_id,
             final_curriculum_level_id=curriculum_level_id,
+            easier_curriculum_level=easier[0],
+            easier_exam=easier[1],
+            harder_curriculum_level=harder[0],
+            harder_exam=harder[1],
+            deadline_at=timezone.now() + timedelta(minutes=exam.timer_minutes),
+            packed_answers=answer_store.initial_packed_answers(),
             ip_address=request_meta.get('REMOTE_ADDR'),
             user_agent=request_meta.get('HTTP_USER_AGENT', '')
         )
-        
-        # Create answer placeholders for all questions
-        questions = exam.questions.all()
-        answer_objects = [
-            StudentAnswer(
-                session=session,
-                question=question,
-                answer=''
-            )
-            for question in questions
-        ]
-        StudentAnswer.objects.bulk_create(answer_objects)
+        exam_selection.record_session_started(exam.id)
         
         logger.info(
             f"Created session {session.id} for {student_data['student_name']}",
@@ -80,44 +99,16 @@ class SessionService:
         return session
     
     @staticmethod
-    def submit_answer(
-        session: StudentSession,
-        question_id: int,
-        answer: Any
-    ) -> StudentAnswer:
+    def format_answer(answer: Any) -> str:
         """
-        Submit an answer for a specific question.
+        Convert a submitted answer into the text stored on StudentAnswer.
         
         Args:
-            session: Student session
-            question_id: Question ID
-            answer: Answer text
+            answer: Answer as sent by the test page (string, dict or JSON string)
             
         Returns:
-            Updated StudentAnswer instance
-            
-        Raises:
-            SessionAlreadyCompletedException: If session is completed
-            ValidationException: If question is invalid
+            Answer text
         """
-        if session.is_completed:
-            raise SessionAlreadyCompletedException(
-                "Cannot submit answers to a completed test",
-                code="SESSION_COMPLETED"
-            )
-        
-        try:
-            student_answer = StudentAnswer.objects.get(
-                session=session,
-                question_id=question_id
-            )
-        except StudentAnswer.DoesNotExist:
-            raise ValidationException(
-                "Invalid question for this session",
-                code="INVALID_QUESTION",
-                details={'question_id': question_id, 'session_id': str(session.id)}
-            )
-        
         # Handle different answer formats
         if isinstance(answer, dict):
             # Check if it's MIXED type with checkboxes and text
@@ -125,14 +116,14 @@ class SessionService:
                 # MIXED type with both checkboxes and text
                 checkboxes = answer.get('checkboxes', [])
                 text = answer.get('text', '').strip()
-                
+        
                 # Combine checkbox answers and text answer
                 if checkboxes and text:
-                    student_answer.answer = f"{','.join(checkboxes)}|TEXT:{text}"
+                    return f"{','.join(checkboxes)}|TEXT:{text}"
                 elif checkboxes:
-                    student_answer.answer = ','.join(checkboxes)
+                    return ','.join(checkboxes)
                 else:
-                    student_answer.answer = text
+                    return text
             else:
                 # Multiple SHORT answers (A: answer1, B: answer2, etc.)
                 # Convert dict to formatted string
@@ -140,7 +131,7 @@ class SessionService:
                 for letter, ans in answer.items():
                     if ans.strip():  # Only include non-empty answers
                         formatted_answers.append(f"{letter}: {ans.strip()}")
-                student_answer.answer = " | ".join(formatted_answers)
+                return " | ".join(formatted_answers)
         elif isinstance(answer, str) and answer.startswith('{') and answer.endswith('}'):
             # Handle JSON string from frontend
             try:
@@ -151,15 +142,89 @@ class SessionService:
                 for letter, ans in answer_dict.items():
                     if ans.strip():
                         formatted_answers.append(f"{letter}: {ans.strip()}")
-                student_answer.answer = " | ".join(formatted_answers)
+                return " | ".join(formatted_answers)
             except json.JSONDecodeError:
                 # If JSON parsing fails, treat as regular string
-                student_answer.answer = str(answer)
+                return str(answer)
         else:
             # Regular string answer (MCQ, SHORT, LONG, or CHECKBOX)
-            student_answer.answer = str(answer)
+            return str(answer)
+    
+    @staticmethod
+    def submit_answer(
+        session: StudentSession,
+        question_id: int,
+        answer: Any,
+        seq: Optional[int] = None
+    ) -> Optional[StudentAnswer]:
+        """
+        Submit an answer for a specific question.
         
-        student_answer.save()
+        The answer row is upserted on (session, question): the first answer
+        inserts it, later ones overwrite the answer text. With a client
+        sequence number, the row is only overwritten by a higher one, so
+        retried and out-of-order deliveries cannot replace a newer answer.
+        
+        Args:
+            session: Student session
+            question_id: Question ID
+            answer: Answer text
+            seq: Client sequence number of this write, if the client sends one
+            
+        Returns:
+            Updated StudentAnswer instance, or None if the write was a
+            duplicate or older than the saved answer
+            
+        Raises:
+            SessionAlreadyCompletedException: If session is completed
+            SessionExpiredException: If the deadline has passed (the session
+                is completed first)
+            ValidationException: If question is invalid
+        """
+        if session.is_completed:
+            raise SessionAlreadyCompletedException(
+                "Cannot submit answers to a completed test",
+                code="SESSION_COMPLETED"
+            )
+        SessionService.enforce_deadline(session)
+        
+        if not Question.objects.filter(id=question_id, exam_id=session.exam_id).exists():
+            raise ValidationException(
+                "Invalid question for this session",
+                code="INVALID_QUESTION",
+                details={'question_id': question_id, 'session_id': str(session.id)}
+            )
+        
+        student_answer = StudentAnswer(
+            session=session,
+            question_id=question_id,
+            answer=SessionService.format_answer(answer),
+            client_seq=seq or 0
+        )
+        answers = {int(question_id): student_answer.answer}
+        seqs = {int(question_id): seq} if seq is not None else None
+        
+        if not answer_buffer.buffer_answers(session.id, answers, seqs):
+            if seqs or answer_store.is_packed(session):
+                with transaction.atomic():
+                    written = SessionService.write_answers(
+                        session.id, answers, seqs, packed=answer_store.is_packed(session)
+                    )
+                    if not written:
+                        logger.debug(
+                            f"Dropped stale answer for session {session.id}, "
+                            f"question {question_id} (seq {seq})"
+                        )
+                        return None
+            else:
+                StudentAnswer.objects.bulk_create(
+                    [student_answer],
+                    update_conflicts=True,
+                    unique_fields=['session', 'question'],
+                    update_fields=['answer', 'updated_at'],
+                )
+        
+        SessionService.invalidate_snapshot(session.id)
         
         logger.debug(
             f"Answer submitted for session {session.id}, question {question_id}"
@@ -168,7 +233,263 @@ class SessionService:
         return student_answer
     
     @staticmethod
-    @transaction.atomic
+    def update_answer(session_id, question_id: int, answer: Any, seq: Optional[int] = None) -> bool:
+        """
+        Overwrite an existing answer with a single conditional UPDATE.
+        
+        The UPDATE is scoped by session_id and question_id and only matches
+        while the session is in progress, before its deadline, and the
+        question belongs to its current exam, so no session or answer has to
+        be loaded first. It matches nothing for a question's first answer, an
+        unknown question, a completed session, a late write or a write whose
+        sequence number is not above the saved one; callers then fall back to
+        submit_answer, which inserts the row, drops the stale write or raises
+        the right error.
+        
+        Args:
+            session_id: Session ID
+            question_id: Question ID
+            answer: Answer as sent by the test page
+            seq: Client sequence number of this write, if the client sends one
+            
+        Returns:
+            True if the answer was saved, False if the caller must fall back
+        """
+        if answer_buffer.is_enabled() or answer_store.is_packed_mode():
+            return False
+        
+        rows = StudentAnswer.objects.filter(
+            session_id=session_id,
+            question_id=question_id,
+            question__exam_id=F('session__exam_id'),
+            session__completed_at__isnull=True
+        ).filter(
+            Q(session__deadline_at__isnull=True) |
+            Q(session__deadline_at__gte=timezone.now() - timedelta(seconds=SESSION_DEADLINE_GRACE_SECONDS))
+        )
+        changes = {'answer': SessionService.format_answer(answer), 'updated_at': timezone.now()}
+        if seq is not None:
+            rows = rows.filter(client_seq__lt=seq)
+            changes['client_seq'] = seq
+        updated = rows.update(**changes)
+        if updated:
+            SessionService.invalidate_snapshot(session_id)
+        return updated > 0
+    
+    @staticmethod
+    def submit_answers(
+        session: StudentSession,
+        answers: List[Dict[str, Any]],
+        seq: Optional[int] = None
+    ) -> int:
+        """
+        Submit a batch of answers.
+        
+        Answers are validated with one query and written with write_answers
+        (or appended to the write-behind buffer). When a question appears
+        more than once the answer with the highest sequence number wins, or
+        the last one if they have none.
+        
+        Args:
+            session: Student session
+            answers: List of {'question_id': ..., 'answer': ...} dictionaries;
+                an item may carry its own 'seq'
+            seq: Client sequence number for items without their own
+            
+        Returns:
+            Number of questions saved; duplicates and writes older than the
+            saved answer are not counted
+            
+        Raises:
+            SessionAlreadyCompletedException: If session is completed
+            SessionExpiredException: If the deadline has passed (the session
+                is completed first)
+            ValidationException: If the batch is malformed or names a question
+                outside the session's exam
+        """
+        if session.is_completed:
+            raise SessionAlreadyCompletedException(
+                "Cannot submit answers to a completed test",
+                code="SESSION_COMPLETED"
+            )
+        SessionService.enforce_deadline(session)
+        
+        latest = {}
+        seqs = {}
+        for item in answers:
+            try:
+                question_id = int(item['question_id'])
+            except (KeyError, TypeError, ValueError):
+                raise ValidationException(
+                    "Each answer needs a numeric question_id",
+                    code="MISSING_QUESTION_ID",
+                    details={'answer': item}
+                )
+            item_seq = SessionService.parse_seq(item.get('seq', seq))
+            if item_seq is not None:
+                if item_seq < seqs.get(question_id, 0):
+                    continue
+                seqs[question_id] = item_seq
+            latest[question_id] = SessionService.format_answer(item.get('answer', ''))
+        
+        if not latest:
+            return 0
+        
+        valid_ids = set(
+            Question.objects.filter(id__in=latest, exam_id=session.exam_id)
+            .values_list('id', flat=True)
+        )
+        invalid_ids = sorted(set(latest) - valid_ids)
+        if invalid_ids:
+            raise ValidationException(
+                "Invalid question for this session",
+                code="INVALID_QUESTION",
+                details={'question_ids': invalid_ids, 'session_id': str(session.id)}
+            )
+        
+        saved = len(latest)
+        if not answer_buffer.buffer_answers(session.id, latest, seqs):
+            with transaction.atomic():
+                saved = SessionService.write_answers(
+                    session.id, latest, seqs, packed=answer_store.is_packed(session)
+                )
+        if saved:
+            SessionService.invalidate_snapshot(session.id)
+        
+        logger.debug(f"Saved {saved} of {len(latest)} answers for session {session.id}")
+        
+        return saved
+    
+    @staticmethod
+    def write_answers(
+        session_id,
+        answers: Dict[int, str],
+        seqs: Optional[Dict[int, int]] = None,
+        packed: Optional[bool] = None
+    ) -> int:
+        """
+        Write formatted answers to the session's answer storage.
+        
+        Packed sessions are written by answer_store.write_packed; for the
+        rest:
+        
+        Existing rows are changed with a single bulk_update and the rest are
+        inserted with a single bulk_create; rows a concurrent save inserted
+        in between are overwritten rather than rejected. Answers with a
+        sequence number only replace rows holding a lower one; those rows are
+        locked first, so the check holds against concurrent writes. Call
+        inside a transaction.
+        
+        Args:
+            session_id: Session ID
+            answers: {question_id: answer text}, already validated
+            seqs: {question_id: client sequence number} for sequenced answers
+            packed: Whether the session uses packed storage; looked up when
+                not known
+            
+        Returns:
+            Number of answers written
+        """
+        if packed is not False:
+            written = answer_store.write_packed(session_id, answers, seqs)
+            if written is not None:
+                return written
+        
+        answers = dict(answers)
+        seqs = seqs or {}
+        now = timezone.now()
+        existing = StudentAnswer.objects.filter(session_id=session_id, question_id__in=answers)
+        if seqs:
+            existing = existing.select_for_update()
+        
+        changed = []
+        for student_answer in existing:
+            text = answers.pop(student_answer.question_id)
+            seq = seqs.get(student_answer.question_id)
+            if seq is not None:
+                if seq <= student_answer.client_seq:
+                    # Duplicate or out-of-order delivery: keep the row as it is
+                    continue
+                student_answer.client_seq = seq
+            student_answer.answer = text
+            student_answer.updated_at = now
+            changed.append(student_answer)
+        StudentAnswer.objects.bulk_update(changed, ['answer', 'client_seq', 'updated_at'])
+        
+        StudentAnswer.objects.bulk_create(
+            [
+                StudentAnswer(
+                    session_id=session_id,
+                    question_id=question_id,
+                    answer=text,
+                    client_seq=seqs.get(question_id) or 0
+                )
+                for question_id, text in answers.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['session', 'question'],
+            update_fields=['answer', 'client_seq', 'updated_at'],
+        )
+        return len(changed) + len(answers)
+    
+    @staticmethod
+    def parse_seq(value: Any) -> Optional[int]:
+        """
+        Validate a client sequence number.
+        
+        Raises:
+            ValidationException: If the value is not a non-negative integer
+        """
+        if value is None or value == '':
+            return None
+        try:
+            seq = int(value)
+        except (TypeError, ValueError):
+            seq = -1
+        if seq < 0:
+            raise ValidationException(
+                "seq must be a non-negative integer",
+                code="INVALID_SEQ",
+                details={'seq': value}
+            )
+        return seq
+    
+    @staticmethod
+    def _idempotency_cache_key(session_id, idempotency_key: str) -> str:
+        return f'{ANSWER_IDEMPOTENCY_KEY_PREFIX}{session_id}_{idempotency_key}'
+    
+    @staticmethod
+    def get_write_result(session_id, idempotency_key: Optional[str]) -> Optional[Dict[str, Any]]:
+        """
+        Return the response already sent for an answer write, if any.
+        
+        Lets a client retry a save with the same Idempotency-Key as often as
+        it likes: repeats are answered from the cache without touching the
+        database.
+        """
+        if not idempotency_key:
+            return None
+        try:
+            return cache.get(SessionService._idempotency_cache_key(session_id, idempotency_key))
+        except Exception as e:
+            logger.warning(f"Idempotency cache unavailable: {e}")
+            return None
+    
+    @staticmethod
+    def remember_write_result(session_id, idempotency_key: Optional[str], result: Dict[str, Any]) -> None:
+        """Store the response of an answer write under its Idempotency-Key."""
+        if not idempotency_key:
+            return
+        try:
+            cache.set(
+                SessionService._idempotency_cache_key(session_id, idempotency_key),
+                result,
+                timeout=CACHE_TTL_SECONDS
+            )
+        except Exception as e:
+            logger.warning(f"Idempotency cache unavailable: {e}")
+    
+    @staticmethod
     def complete_session(session: StudentSession) -> Dict[str, Any]:
         """
         Complete a test session and calculate scores.
@@ -181,6 +502,8 @@ class SessionService:
             
         Raises:
             SessionAlreadyCompletedException: If already completed
+            AnswersNotSavedException: If buffered answers could not be written
+                yet; nothing is graded and the client should retry
         """
         if session.is_completed:
             raise SessionAlreadyCompletedException(
@@ -188,26 +511,49 @@ class SessionService:
                 code="ALREADY_COMPLETED"
             )
         
-        # Auto-grade all answers
-        total_score = 0
-        total_possible = 0
-        graded_count = 0
+        # Answers still in the write-behind buffer must be graded too. Flushed
+        # (and committed) before the grading transaction, so no transaction is
+        # held open while waiting for the buffer lock
+        answer_buffer.flush_session(session.id, wait=True, strict=True)
+        return SessionService._complete_session(session)
+    
+    @staticmethod
+    @transaction.atomic
+    def _complete_session(session: StudentSession) -> Dict[str, Any]:
+        # The check above ran on the caller's copy; a double submit, the
+        # reaper or end_exam_sessions may have completed the session since.
+        # The row stays locked until the grades are saved
+        locked = (
+            StudentSession.objects.select_for_update(of=('self',))
+            .select_related('exam')
+            .get(id=session.id)
+        )
+        if locked.completed_at is not None:
+            raise SessionAlreadyCompletedException(
+                "Test has already been completed",
+                code="ALREADY_COMPLETED"
+            )
+        caller_session, session = session, locked
         
-        for answer in session.answers.all():
-            answer.auto_grade()
-            answer.save()
-            
+        # Grade the answers given to the current exam against its compiled
+        # key (one query for the answers; the key holds the totals), so
+        # unanswered questions score 0 without being loaded. Answers to exams
+        # left through a difficulty adjustment are archived attempts, left
+        # as they are
+        key = answer_keys.get_answer_key(session.exam)
+        answers = answer_store.load_answers([session])
+        total_score = 0
+        for answer in answers:
+            answer.auto_grade(key.get(answer.question_id))
             # Only count non-long answer questions in score
             if answer.question.question_type not in ['LONG']:
-                total_possible += answer.question.points
                 total_score += answer.points_earned
-                graded_count += 1
+        total_possible = key.total_possible
+        graded_count = key.graded_count
         
         # Update session with results
         session.score = total_score
-        session.percentage_score = (
-            (total_score / total_possible * 100) if total_possible > 0 else 0
-        )
+        session.percentage_score = GradingService.percentage(total_score, total_possible)
         session.completed_at = timezone.now()
         
         # Calculate time spent
@@ -215,80 +561,559 @@ class SessionService:
         session.time_spent_seconds = int(time_diff.total_seconds())
         
         session.save()
+        for field in ('score', 'percentage_score', 'completed_at', 'time_spent_seconds'):
+            setattr(caller_session, field, getattr(session, field))
+        # One bulk_update for all grades, or a rewrite of packed_answers
+        # (and the row projection)
+        answer_store.save_grades(answers)
+        exam_selection.record_session_finished(session.exam_id)
+        SessionService.invalidate_snapshot(session.id)
         
         logger.info(
             f"Completed session {session.id} with score {session.percentage_score:.1f}%",
             extra={
                 'session_id': str(session.id),
-                'score': total_score,
+                'score': float(total_score),
                 'percentage': float(session.percentage_score or 0),
                 'time_spent': session.time_spent_seconds
             }
         )
         
         return {
-            'total_score': total_score,
+            'total_score': float(total_score),
             'total_possible': total_possible,
             'percentage_score': float(session.percentage_score or 0),
             'graded_count': graded_count,
             'time_spent_seconds': session.time_spent_seconds
         }
     
+    @staticmethod
+    def complete_sessions(session_ids) -> int:
+        """
+        Grade and complete many in-progress sessions at once.
+        
+        Uses a fixed number of queries per call however many sessions it
+        completes: lock the sessions, load and grade their answers, save the
+        grades with one bulk_update, then save the scores the same way.
+        Sessions already completed, or locked by a concurrent completion,
+        are skipped, as are sessions whose buffered answers could not all be
+        written yet (they are left for the next run). Completion time is now;
+        time spent is capped at the exam timer.
+        
+        Args:
+            session_ids: IDs of the sessions to complete
+            
+        Returns:
+            Number of sessions completed
+        """
+        session_ids = list(session_ids)
+        # Flushed before the grading transaction (see complete_session)
+        incomplete = set(answer_buffer.flush_pending(session_ids)['incomplete'])
+        if incomplete:
+            logger.warning(f"Not completing {len(incomplete)} sessions with answers still buffered")
+            session_ids = [session_id for session_id in session_ids if session_id not in incomplete]
+        return SessionService._complete_sessions(session_ids)
+    
     @staticmethod
     @transaction.atomic
+    def _complete_sessions(session_ids: List) -> int:
+        sessions = list(
+            StudentSession.objects.select_for_update(skip_locked=True, of=('self',))
+            .filter(id__in=session_ids, completed_at__isnull=True)
+            .select_related('exam')
+        )
+        if not sessions:
+            return 0
+        
+        # Current exam only: answers from before a difficulty adjustment stay as they are
+        keys = {session.exam_id: answer_keys.get_answer_key(session.exam) for session in sessions}
+        answers = answer_store.load_answers(sessions)
+        GradingService.grade_answers(answers, keys)
+        
+        scores = {}
+        for answer in answers:
+            if answer.question.question_type not in ['LONG']:
+                scores[answer.session_id] = scores.get(answer.session_id, 0) + answer.points_earned
+        
+        now = timezone.now()
+        finished_per_exam = {}
+        for session in sessions:
+            total_possible = keys[session.exam_id].total_possible
+            session.score = scores.get(session.id, 0)
+            session.percentage_score = GradingService.percentage(session.score, total_possible)
+            session.completed_at = now
+            session.time_spent_seconds = min(
+                int((now - session.started_at).total_seconds()),
+                session.exam.timer_minutes * 60
+            )
+            finished_per_exam[session.exam_id] = finished_per_exam.get(session.exam_id, 0) + 1
+            SessionService.invalidate_snapshot(session.id)
+        
+        StudentSession.objects.bulk_update(
+            sessions,
+            ['score', 'percentage_score', 'completed_at', 'time_spent_seconds'],
+            batch_size=500
+        )
+        answer_store.project_rows(sessions)
+        for exam_id, count in finished_per_exam.items():
+            exam_selection.record_session_finished(exam_id, count)
+        
+        logger.info(f"Auto-completed {len(sessions)} sessions")
+        return len(sessions)
+    
+    @staticmethod
+    def find_expired_sessions(
+        limit: int = SESSION_REAPER_BATCH_SIZE,
+        grace_minutes: int = SESSION_EXPIRY_GRACE_MINUTES,
+        exam_id=None
+    ) -> List:
+        """
+        Return IDs of in-progress sessions whose time has run out, oldest first.
+        
+        A session has expired once started_at + exam.timer_minutes +
+        grace_minutes has passed, or SESSION_TIMEOUT_HOURS after it started.
+        Sessions are grouped by the few distinct timer lengths so every
+        condition is a plain range on started_at.
+        
+        Args:
+            limit: Maximum number of IDs to return
+            grace_minutes: Extra minutes allowed after the timer
+            exam_id: Only look at sessions on this exam
+            
+        Returns:
+            List of session IDs
+        """
+        now = timezone.now()
+        in_progress = StudentSession.objects.filter(completed_at__isnull=True)
+        if exam_id:
+            in_progress = in_progress.filter(exam_id=exam_id)
+        
+        expired = Q(started_at__lt=now - timedelta(hours=SESSION_TIMEOUT_HOURS))
+        timers = Exam.objects.filter(
+            id__in=in_progress.values('exam_id')
+        ).order_by().values_list('timer_minutes', flat=True).distinct()
+        for minutes in timers:
+            expired |= Q(
+                exam__timer_minutes=minutes,
+                started_at__lt=now - timedelta(minutes=minutes + grace_minutes)
+            )
+        
+        return list(
+            in_progress.filter(expired).order_by('started_at').values_list('id', flat=True)[:limit]
+        )
+    
+    @staticmethod
+    def reap_expired_sessions(
+        batch_size: int = SESSION_REAPER_BATCH_SIZE,
+        grace_minutes: int = SESSION_EXPIRY_GRACE_MINUTES,
+        max_batches: Optional[int] = None
+    ) -> Dict[str, int]:
+        """
+        Auto-complete expired sessions in batches of `batch_size`.
+        
+        Args:
+            batch_size: Sessions completed per transaction
+            grace_minutes: Extra minutes allowed after the exam timer
+            max_batches: Stop after this many batches (None: until none are left)
+            
+        Returns:
+            Dictionary with 'completed' sessions and 'batches' run
+        """
+        completed = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            session_ids = SessionService.find_expired_sessions(batch_size, grace_minutes)
+            if not session_ids:
+                break
+            count = SessionService.complete_sessions(session_ids)
+            batches += 1
+            completed += count
+            if count == 0:
+                # Everything left is locked by concurrent completions or
+                # still has answers being buffered
+                break
+        return {'completed': completed, 'batches': batches}
+    
+    @staticmethod
+    def end_exam_sessions(exam: Exam, batch_size: int = SESSION_REAPER_BATCH_SIZE) -> int:
+        """
+        Grade and complete every in-progress session on an exam right away.
+        
+        Args:
+            exam: Exam whose sessions should end
+            batch_size: Sessions completed per transaction
+            
+        Returns:
+            Number of sessions completed
+        """
+        completed = 0
+        while True:
+            session_ids = list(
+                StudentSession.objects.filter(exam=exam, completed_at__isnull=True)
+                .order_by('started_at').values_list('id', flat=True)[:batch_size]
+            )
+            if not session_ids:
+                break
+            count = SessionService.complete_sessions(session_ids)
+            completed += count
+            if count == 0:
+                break
+        
+        logger.info(f"Ended {completed} in-progress sessions for exam {exam.id}")
+        return completed
+    
+    @staticmethod
+    def enforce_deadline(session: StudentSession) -> None:
+        """
+        Reject a write that arrives after the session's deadline.
+        
+        The check is against the deadline stored on the already loaded
+        session, so it costs no query while the test is running. Late writes
+        complete the session with the answers saved so far before raising.
+        SESSION_DEADLINE_GRACE_SECONDS allows for requests that were in
+        flight when the timer ran out.
+        
+        Args:
+            session: StudentSession instance
+            
+        Raises:
+            SessionExpiredException: If the deadline plus grace has passed
+        """
+        if session.deadline_at is None:
+            return
+        if timezone.now() <= session.deadline_at + timedelta(seconds=SESSION_DEADLINE_GRACE_SECONDS):
+            return
+        
+        SessionService.complete_sessions([session.id])
+        logger.info(f"Session {session.id} is past its deadline {session.deadline_at}; completed it")
+        raise SessionExpiredException(
+            code="SESSION_EXPIRED",
+            details={
+                'session_id': str(session.id),
+                'deadline_at': session.deadline_at.isoformat(),
+            }
+        )
+    
+    @staticmethod
+    def get_deadline(session_id) -> Optional[datetime]:
+        """
+        Return a session's deadline, cached after the first lookup.
+        
+        The deadline never changes once the session is created, so the
+        cached value does not need invalidating.
+        
+        Args:
+            session_id: Session ID
+            
+        Returns:
+            Deadline, or None for sessions created without one
+            
+        Raises:
+            SessionNotFoundException: If the session does not exist
+        """
+        key = f'{SESSION_DEADLINE_KEY_PREFIX}{session_id}'
+        try:
+            cached = cache.get(key)
+        except Exception as e:
+            logger.warning(f"Deadline cache unavailable: {e}")
+            cached = None
+        if cached is not None:
+            # Stored as a 1-tuple so that a missing deadline is cached too
+            return cached[0]
+        
+        row = StudentSession.objects.filter(id=session_id).values_list('deadline_at').first()
+        if row is None:
+            raise SessionNotFoundException(
+                code="SESSION_NOT_FOUND",
+                details={'session_id': str(session_id)}
+            )
+        try:
+            cache.set(key, row, timeout=SESSION_TIMEOUT_HOURS * 3600)
+        except Exception:
+            pass
+        return row[0]
+    
+    @staticmethod
+    async def aget_deadline(session_id) -> Optional[datetime]:
+        """Async version of get_deadline, for the ASGI views."""
+        key = f'{SESSION_DEADLINE_KEY_PREFIX}{session_id}'
+        try:
+            cached = await cache.aget(key)
+        except Exception as e:
+            logger.warning(f"Deadline cache unavailable: {e}")
+            cached = None
+        if cached is not None:
+            return cached[0]
+        
+        row = await StudentSession.objects.filter(id=session_id).values_list('deadline_at').afirst()
+        if row is None:
+            raise SessionNotFoundException(
+                code="SESSION_NOT_FOUND",
+                details={'session_id': str(session_id)}
+            )
+        try:
+            await cache.aset(key, row, timeout=SESSION_TIMEOUT_HOURS * 3600)
+        except Exception:
+            pass
+        return row[0]
+    
+    @staticmethod
+    def get_adjustment_target(
+        session: StudentSession,
+        adjustment: int
+    ) -> Optional[Tuple[Any, Exam]]:
+        """
+        Return the (level, exam) a difficulty adjustment would switch to.
+        
+        Uses the exams pre-resolved on the session; falls back to resolving
+        from the placement caches when none was stored or the stored exam has
+        since left its level's pool. With a stateful selection strategy (round
+        robin) only the level is reused and the exam is picked now, so the
+        rotation only advances for switches that happen.
+        
+        Args:
+            session: Current session
+            adjustment: +1 for harder, -1 for easier
+            
+        Returns:
+            Tuple of (new_level, new_exam) or None if adjustment not possible
+        """
+        if adjustment not in [-1, 1]:
+            raise ValidationException(
+                "Invalid adjustment value. Must be -1 or 1",
+                code="INVALID_ADJUSTMENT"
+            )
+        
+        if adjustment == 1:
+            level_id, exam_id = session.harder_curriculum_level_id, session.harder_exam_id
+        else:
+            level_id, exam_id = session.easier_curriculum_level_id, session.easier_exam_id
+        
+        if level_id and exam_id:
+            level = PlacementService.get_level(level_id)
+            if level and exam_selection.is_stateful(settings.PLACEMENT_EXAM_SELECTION_STRATEGY):
+                try:
+                    return level, PlacementService.find_exam_for_level(level)
+                except ExamNotFoundException:
+                    logger.warning(f"No exam available for adjusted level {level.id}")
+                    return None
+            exam = PlacementService.get_pooled_exam(level_id, exam_id)
+            if level and exam:
+                return level, exam
+        
+        current_level = PlacementService.get_level(session.final_curriculum_level_id)
+        if current_level is None:
+            return None
+        return PlacementService.adjust_difficulty(current_level, adjustment)
+    
+    @staticmethod
     def adjust_session_difficulty(
         session: StudentSession,
         adjustment: int,
         new_level,
-        new_exam: Exam
-    ) -> StudentSession:
+        new_exam: Exam,
+        expected_exam_id=None
+    ) -> bool:
         """
         Adjust the difficulty of a session by changing the exam.
         
+        Answers to the current exam are kept: they stay on the session as the
+        archived attempt at the old level, referenced by the adjustment's
+        from_exam. Answers to the new exam are created lazily on submission.
+        
+        The switch is a conditional UPDATE that only applies while the session
+        is still on `expected_exam_id` (default: the exam loaded on `session`),
+        so a repeated or concurrent click for the same switch is a no-op
+        instead of a second adjustment. The neighbours of the new level are
+        pre-resolved again in the same UPDATE, so the next adjustment is also
+        a plain swap.
+        
         Args:
             session: Current session
             adjustment: +1 or -1
             new_level: New curriculum level
             new_exam: New exam instance
+            expected_exam_id: Exam the client was taking when it asked to adjust
             
         Returns:
-            Updated session
+            True if the session was switched, False if it had already moved on
+            
+        Raises:
+            SessionAlreadyCompletedException: If the session is completed
+            AnswersNotSavedException: If buffered answers could not be written
+                yet; the session is not switched
         """
         if session.is_completed:
             raise SessionAlreadyCompletedException(
                 "Cannot adjust difficulty of completed session"
             )
         
+        from_exam_id = expected_exam_id or session.exam_id
+        if str(from_exam_id) != str(session.exam_id):
+            return False
+        
+        # Buffered answers belong to the attempt being archived; written and
+        # committed before the switch, so a failed switch cannot lose them
+        answer_buffer.flush_session(session.id, wait=True, strict=True)
+        return SessionService._switch_exam(session, adjustment, new_level, new_exam, from_exam_id)
+    
+    @staticmethod
+    @transaction.atomic
+    def _switch_exam(
+        session: StudentSession,
+        adjustment: int,
+        new_level,
+        new_exam: Exam,
+        from_exam_id
+    ) -> bool:
+        adjacent = PlacementService.resolve_adjacent_exams(new_level.id)
+        easier = adjacent[-1] or (None, None)
+        harder = adjacent[1] or (None, None)
+        
+        switched = StudentSession.objects.filter(
+            id=session.id,
+            exam_id=from_exam_id,
+            completed_at__isnull=True
+        ).update(
+            final_curriculum_level=new_level,
+            exam=new_exam,
+            difficulty_adjustments=F('difficulty_adjustments') + adjustment,
+            easier_curriculum_level=easier[0],
+            easier_exam=easier[1],
+            harder_curriculum_level=harder[0],
+            harder_exam=harder[1],
+        )
+        if not switched:
+            if StudentSession.objects.filter(id=session.id, completed_at__isnull=False).exists():
+                raise SessionAlreadyCompletedException(
+                    "Cannot adjust difficulty of completed session"
+                )
+            logger.info(f"Ignored stale difficulty adjustment for session {session.id}")
+            return False
+        
         # Record the adjustment
         DifficultyAdjustment.objects.create(
             session=session,
-            from_level=session.final_curriculum_level,
+            from_level_id=session.final_curriculum_level_id,
             to_level=new_level,
+            from_exam_id=from_exam_id,
+            to_exam=new_exam,
             adjustment=adjustment
         )
         
-        # Update session
+        exam_selection.record_session_finished(from_exam_id)
+        exam_selection.record_session_started(new_exam.id)
+        SessionService.invalidate_snapshot(session.id)
+        
         session.final_curriculum_level = new_level
         session.exam = new_exam
         session.difficulty_adjustments += adjustment
-        session.save()
-        
-        # Clear existing answers and create new ones
-        session.answers.all().delete()
-        
-        answer_objects = [
-            StudentAnswer(
-                session=session,
-                question=question,
-                answer=''
-            )
-            for question in new_exam.questions.all()
-        ]
-        StudentAnswer.objects.bulk_create(answer_objects)
+        session.easier_curriculum_level, session.easier_exam = easier
+        session.harder_curriculum_level, session.harder_exam = harder
         
         logger.info(
             f"Adjusted difficulty for session {session.id}: "
             f"{adjustment:+d} to level {new_level.full_name}"
         )
         
-        return session
\ No newline at end of file
+        return True
+    
+    @staticmethod
+    def _snapshot_keys(session_id) -> Tuple[str, str]:
+        key = f'{SESSION_SNAPSHOT_KEY_PREFIX}{session_id}'
+        return key, f'{key}_version'
+    
+    @staticmethod
+    def invalidate_snapshot(session_id) -> None:
+        """
+        Mark the cached snapshot of a session stale once the transaction commits.
+        
+        Bumps a per-session version instead of deleting the snapshot, so a
+        reader that built its snapshot from data older than this write cannot
+        store it as current.
+        """
+        _, version_key = SessionService._snapshot_keys(session_id)
+        
+        def bump():
+            try:
+                try:
+                    cache.incr(version_key)
+                except ValueError:
+                    if not cache.add(version_key, 1, timeout=CACHE_TTL_SECONDS):
+                        cache.incr(version_key)
+            except Exception as e:
+                logger.warning(f"Could not invalidate snapshot for session {session_id}: {e}")
+        
+        transaction.on_commit(bump)
+    
+    @staticmethod
+    def get_snapshot(session_id) -> Dict[str, Any]:
+        """
+        Return the compact state needed to restore the test page.
+        
+        The stored part (exam, timer, answers) is served from the cache while
+        its version matches; remaining time is always computed per request.
+        
+        Args:
+            session_id: Session ID
+            
+        Returns:
+            Dictionary with session_id, exam_id, exam_version, completed,
+            remaining_seconds and answers as [[question_number, answer], ...]
+            
+        Raises:
+            SessionNotFoundException: If the session does not exist
+        """
+        key, version_key = SessionService._snapshot_keys(session_id)
+        try:
+            cached = cache.get_many([key, version_key])
+        except Exception as e:
+            logger.warning(f"Snapshot cache unavailable: {e}")
+            cached = {}
+        
+        version = cached.get(version_key, 0)
+        entry = cached.get(key)
+        if entry and entry[0] == version:
+            snapshot = entry[1]
+        else:
+            snapshot = SessionService._build_snapshot(session_id)
+            try:
+                cache.set(key, (version, snapshot), timeout=CACHE_TTL_SECONDS)
+            except Exception:
+                pass
+        
+        result = {name: value for name, value in snapshot.items() if name != 'deadline_at'}
+        if snapshot['completed']:
+            result['remaining_seconds'] = 0
+        else:
+            remaining = (snapshot['deadline_at'] - timezone.now()).total_seconds()
+            result['remaining_seconds'] = max(0, int(remaining))
+        return result
+    
+    @staticmethod
+    def _build_snapshot(session_id) -> Dict[str, Any]:
+        try:
+            session = StudentSession.objects.select_related('exam').get(id=session_id)
+        except StudentSession.DoesNotExist:
+            raise SessionNotFoundException(
+                code="SESSION_NOT_FOUND",
+                details={'session_id': str(session_id)}
+            )
+        
+        answer_buffer.flush_session(session.id, wait=True)
+        answers = sorted(
+            (answer for answer in answer_store.load_answers([session]) if answer.answer),
+            key=lambda answer: answer.question.question_number
+        )
+        
+        return {
+            'session_id': str(session.id),
+            'exam_id': str(session.exam_id),
+            'exam_version': session.exam.updated_at.isoformat(),
+            'completed': session.is_completed,
+            'deadline_at': session.deadline_at or (
+                session.started_at + timedelta(minutes=session.exam.timer_minutes)
+            ),
+            'timer_seconds': session.exam.timer_minutes * 60,
+            'answers': [[answer.question.question_number, answer.answer] for answer in answers],
+        }
@@ -0,0 +1,36 @@
+"""
+Signal handlers that keep compiled placement caches in sync with the database.
+"""
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from core.models import PlacementRule, Program, SubProgram, CurriculumLevel, ExamLevelMapping
+from .models import Exam, Question
+from .services import PlacementService
+from .services.answer_keys import touch_exam
+
+
+@receiver([post_save, post_delete], sender=PlacementRule)
+def placement_rules_changed(sender, **kwargs):
+    PlacementService.invalidate_rule_table()
+
+
+@receiver([post_save, post_delete], sender=Program)
+@receiver([post_save, post_delete], sender=SubProgram)
+@receiver([post_save, post_delete], sender=CurriculumLevel)
+def curriculum_changed(sender, **kwargs):
+    # Compiled rules hold level instances too, so both caches go stale
+    PlacementService.invalidate_level_ladder()
+    PlacementService.invalidate_rule_table()
+
+
+@receiver([post_save, post_delete], sender=ExamLevelMapping)
+@receiver([post_save, post_delete], sender=Exam)
+def exam_pool_changed(sender, **kwargs):
+    PlacementService.invalidate_exam_pools()
+
+
+@receiver([post_save, post_delete], sender=Question)
+def question_changed(sender, instance, **kwargs):
+    # New exam version: compiled answer keys are rebuilt on next use (bulk
+    # edits run inside answer_keys.deferred_exam_touches and bump it once)
+    touch_exam(instance.exam_id)
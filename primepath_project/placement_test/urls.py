@@ -1,15 +1,23 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import views, async_views
 
 app_name = 'placement_test'
 
+# Async versions of the endpoints hit while a test is running (ASGI deployments)
+student_views = async_views if getattr(settings, 'PLACEMENT_ASYNC_VIEWS', False) else views
+
 urlpatterns = [
     path('start/', views.start_test, name='start_test'),
     path('session/<uuid:session_id>/', views.take_test, name='take_test'),
-    path('session/<uuid:session_id>/submit/', views.submit_answer, name='submit_answer'),
+    path('session/<uuid:session_id>/snapshot/', student_views.session_snapshot, name='session_snapshot'),
+    path('session/<uuid:session_id>/time/', student_views.session_time, name='session_time'),
+    path('session/<uuid:session_id>/submit/', student_views.submit_answer, name='submit_answer'),
+    path('session/<uuid:session_id>/submit-batch/', student_views.submit_answers, name='submit_answers'),
     path('session/<uuid:session_id>/adjust-difficulty/', views.adjust_difficulty, name='adjust_difficulty'),
-    path('session/<uuid:session_id>/complete/', views.complete_test, name='complete_test'),
+    path('session/<uuid:session_id>/complete/', student_views.complete_test, name='complete_test'),
     path('session/<uuid:session_id>/result/', views.test_result, name='test_result'),
+    path('simulate/', views.simulate_placement, name='simulate_placement'),
     
     path('exams/', views.exam_list, name='exam_list'),
     path('exams/create/', views.create_exam, name='create_exam'),
@@ -20,13 +28,16 @@ urlpatterns = [
     path('exams/<uuid:exam_id>/audio/add/', views.add_audio, name='add_audio'),
     path('exams/<uuid:exam_id>/questions/', views.manage_questions, name='manage_questions'),
     path('exams/<uuid:exam_id>/delete/', views.delete_exam, name='delete_exam'),
+    path('exams/<uuid:exam_id>/end-sessions/', views.end_exam_sessions, name='end_exam_sessions'),
     
     path('sessions/', views.session_list, name='session_list'),
     path('sessions/<uuid:session_id>/', views.session_detail, name='session_detail'),
     path('sessions/<uuid:session_id>/grade/', views.grade_session, name='grade_session'),
     path('sessions/<uuid:session_id>/export/', views.export_result, name='export_result'),
+    path('grading/queue/', views.grading_queue, name='grading_queue'),
+    path('grading/grade/', views.grade_answers, name='grade_answers'),
     
-    path('audio/<int:audio_id>/', views.get_audio, name='get_audio'),
+    path('audio/<int:audio_id>/', student_views.get_audio, name='get_audio'),
     path('questions/<int:question_id>/update/', views.update_question, name='update_question'),
     path('exams/<uuid:exam_id>/create-questions/', views.create_questions, name='create_questions'),
     path('exams/<uuid:exam_id>/save-answers/', views.save_exam_answers, name='save_exam_answers'),
@@ -1,20 +1,25 @@
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.http import JsonResponse, HttpResponse, Http404, FileResponse
 from django.views.decorators.http import require_http_methods, require_POST
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import never_cache
 from django.utils import timezone
 from django.db import transaction
 from django.db.models import Q, Count, Avg
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
 from .models import Exam, AudioFile, Question, StudentSession, StudentAnswer, DifficultyAdjustment
-from core.models import School, PlacementRule, CurriculumLevel
+from core.models import PlacementRule, CurriculumLevel
 from core.exceptions import (
     PlacementRuleException, ExamNotFoundException, SessionAlreadyCompletedException,
-    ValidationException, FileProcessingException, AudioFileException, ExamConfigurationException
+    SessionExpiredException, ValidationException, FileProcessingException, AudioFileException, ExamConfigurationException
 )
 from core.decorators import handle_errors, validate_request_data, teacher_required
-from .services import PlacementService, SessionService, ExamService, GradingService
+from .services import PlacementService, SessionService, ExamService, GradingService, RegradeService
+from .services import answer_buffer, answer_keys
+from core.constants import DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE
+from datetime import date
 import json
 import uuid
 import logging
@@ -72,64 +77,224 @@ def start_test(request):
             logger.error(f"Error creating test session: {str(e)}", exc_info=True)
             raise
     
-    schools = School.objects.all().order_by('name')
+    # Schools are suggested through core:school_search as the student types
     return render(request, 'placement_test/start_test.html', {
-        'schools': schools,
         'grades': range(1, 13),
         'academic_ranks': StudentSession.ACADEMIC_RANKS
     })
 
 
+def _adjacent_exam_urls(session):
+    """PDF and audio URLs of the pre-resolved easier/harder exams, for prefetching."""
+    exams = [
+        PlacementService.get_pooled_exam(level_id, exam_id)
+        for level_id, exam_id in (
+            (session.easier_curriculum_level_id, session.easier_exam_id),
+            (session.harder_curriculum_level_id, session.harder_exam_id),
+        )
+        if level_id and exam_id
+    ]
+    exams = [exam for exam in exams if exam]
+    if not exams:
+        return []
+    
+    urls = [exam.pdf_file.url for exam in exams if exam.pdf_file]
+    audio_ids = AudioFile.objects.filter(exam__in=exams).values_list('id', flat=True)
+    urls.extend(reverse('placement_test:get_audio', args=[audio_id]) for audio_id in audio_ids)
+    return urls
+
+
 def take_test(request, session_id):
     session = get_object_or_404(StudentSession, id=session_id)
     
     if session.is_completed:
         return redirect('placement_test:test_result', session_id=session_id)
+    try:
+        SessionService.enforce_deadline(session)
+    except SessionExpiredException:
+        return redirect('placement_test:test_result', session_id=session_id)
     
     exam = session.exam
     questions = exam.questions.select_related('audio_file').all()
     audio_files = exam.audio_files.all()
-    student_answers = {sa.question_id: sa for sa in session.answers.all()}
     
+    timer_seconds = exam.timer_minutes * 60
+    if session.deadline_at:
+        timer_seconds = max(0, int((session.deadline_at - timezone.now()).total_seconds()))
+    
+    # Saved answers and the remaining time are restored by the page itself
+    # from session_snapshot, which also covers reconnects without a reload
     context = {
         'session': session,
         'exam': exam,
         'questions': questions,
         'audio_files': audio_files,
-        'student_answers': student_answers,
-        'timer_seconds': exam.timer_minutes * 60,
+        'timer_seconds': timer_seconds,
+        'prefetch_urls': _adjacent_exam_urls(session),
     }
     return render(request, 'placement_test/student_test.html', context)
 
 
-@require_http_methods(["POST"])
+@require_http_methods(["GET"])
 @handle_errors(ajax_only=True)
-def submit_answer(request, session_id):
-    """Submit an answer for a specific question."""
+def session_snapshot(request, session_id):
+    """Compact JSON state of a session, used to restore the test page."""
+    return JsonResponse(SessionService.get_snapshot(session_id))
+
+
+def _time_payload(deadline):
+    """Response data of session_time for a session deadline."""
+    now = timezone.now()
+    return {
+        'server_time': int(now.timestamp() * 1000),
+        'deadline': int(deadline.timestamp() * 1000) if deadline else None,
+        'remaining_seconds': max(0, int((deadline - now).total_seconds())) if deadline else None,
+    }
+
+
+@never_cache
+@require_http_methods(["GET"])
+@handle_errors(ajax_only=True)
+def session_time(request, session_id):
+    """
+    Server clock and session deadline, in epoch milliseconds.
+    
+    The test page counts down against the deadline and uses server_time to
+    correct for its own clock, so periodic syncs do not drift. Served from
+    the cache after the first request for a session.
+    """
+    return JsonResponse(_time_payload(SessionService.get_deadline(session_id)))
+
+
+def _idempotency_key(request, data):
+    """Idempotency-Key header, or the idempotency_key field of the submitted data."""
+    key = request.headers.get('Idempotency-Key') or data.get('idempotency_key')
+    if key and len(str(key)) > 100:
+        raise ValidationException(
+            "Idempotency key is too long",
+            code="INVALID_IDEMPOTENCY_KEY"
+        )
+    return str(key) if key else None
+
+
+def _parse_answer_submission(request):
+    """
+    Read a single answer save from the request body.
+    
+    Returns:
+        (question_id, answer, seq, idempotency_key)
+    """
     try:
-        session = get_object_or_404(StudentSession, id=session_id)
-        
         data = json.loads(request.body)
-        question_id = data.get('question_id')
-        answer = data.get('answer', '')
-        
-        if not question_id:
-            raise ValidationException(
-                "Question ID is required",
-                code="MISSING_QUESTION_ID"
-            )
-        
-        # Use SessionService to submit the answer
-        SessionService.submit_answer(
+    except json.JSONDecodeError:
+        raise ValidationException("Invalid JSON data", code="INVALID_JSON")
+    
+    question_id = data.get('question_id')
+    if not question_id:
+        raise ValidationException(
+            "Question ID is required",
+            code="MISSING_QUESTION_ID"
+        )
+    try:
+        question_id = int(question_id)
+    except (TypeError, ValueError):
+        raise ValidationException(
+            "Question ID must be a number",
+            code="INVALID_QUESTION_ID"
+        )
+    
+    seq = SessionService.parse_seq(data.get('seq'))
+    return question_id, data.get('answer', ''), seq, _idempotency_key(request, data)
+
+
+def _save_answer(session_id, question_id, answer, seq, idempotency_key):
+    """Save one answer and return the response data of submit_answer."""
+    result = SessionService.get_write_result(session_id, idempotency_key)
+    if result is not None:
+        return result
+    
+    # Changing an existing answer is one conditional UPDATE
+    if SessionService.update_answer(session_id, question_id, answer, seq):
+        accepted = True
+    else:
+        # First answer to the question, a stale write, or an error to
+        # report (404/409/400)
+        session = get_object_or_404(StudentSession, id=session_id)
+        accepted = SessionService.submit_answer(
             session=session,
             question_id=question_id,
-            answer=answer
-        )
-        
-        return JsonResponse({'success': True})
-        
-    except json.JSONDecodeError:
+            answer=answer,
+            seq=seq
+        ) is not None
+    
+    result = {'success': True, 'accepted': accepted, 'seq': seq}
+    SessionService.remember_write_result(session_id, idempotency_key, result)
+    return result
+
+
+@require_http_methods(["POST"])
+@handle_errors(ajax_only=True)
+def submit_answer(request, session_id):
+    """
+    Submit an answer for a specific question.
+    
+    Optional "seq" (client sequence number) and Idempotency-Key make the
+    save safe to retry: a repeated key gets the first response back, and a
+    write older than the saved answer is acknowledged with accepted=false
+    without changing it.
+    """
+    return JsonResponse(_save_answer(session_id, *_parse_answer_submission(request)))
+
+
+def _parse_answers_submission(request):
+    """
+    Read a batch of answers from a JSON body or from beacon form fields.
+    
+    Returns:
+        (answers, seq, idempotency_key)
+    """
+    try:
+        if 'answers' in request.POST:
+            data = request.POST
+            answers = json.loads(request.POST['answers'])
+        else:
+            data = json.loads(request.body)
+            answers = data.get('answers', [])
+    except (json.JSONDecodeError, AttributeError):
         raise ValidationException("Invalid JSON data", code="INVALID_JSON")
+    
+    if not isinstance(answers, list):
+        raise ValidationException("answers must be a list", code="INVALID_ANSWERS")
+    
+    seq = SessionService.parse_seq(data.get('seq'))
+    return answers, seq, _idempotency_key(request, data)
+
+
+def _save_answers(session_id, answers, seq, idempotency_key):
+    """Save a batch of answers and return the response data of submit_answers."""
+    result = SessionService.get_write_result(session_id, idempotency_key)
+    if result is not None:
+        return result
+    
+    session = get_object_or_404(StudentSession, id=session_id)
+    saved = SessionService.submit_answers(session, answers, seq)
+    result = {'success': True, 'saved': saved, 'seq': seq}
+    SessionService.remember_write_result(session_id, idempotency_key, result)
+    return result
+
+
+@require_http_methods(["POST"])
+@handle_errors(ajax_only=True)
+def submit_answers(request, session_id):
+    """
+    Submit a batch of answers for a session.
+    
+    Accepts a JSON body {"answers": [{"question_id": ..., "answer": ...}],
+    "seq": ..., "idempotency_key": ...} or, for navigator.sendBeacon on page
+    unload, form fields with the same names ("answers" holding the list as
+    JSON). seq and the key are optional and work as for submit_answer.
+    """
+    return JsonResponse(_save_answers(session_id, *_parse_answers_submission(request)))
 
 
 @require_http_methods(["POST"])
@@ -141,12 +306,20 @@ def adjust_difficulty(request, session_id):
     try:
         data = json.loads(request.body)
         adjustment = int(data.get('adjustment', 0))
+        expected_exam_id = data.get('exam_id')
         
-        # Use PlacementService to find new level and exam
-        result = PlacementService.adjust_difficulty(
-            current_level=session.final_curriculum_level,
-            adjustment=adjustment
-        )
+        # A repeated click after the switch: the target would be worked out
+        # from the new exam, one more level away
+        if (expected_exam_id and not session.is_completed
+                and str(expected_exam_id) != str(session.exam_id)):
+            return JsonResponse({
+                'success': True,
+                'applied': False,
+                'redirect_url': f'/api/placement/session/{session_id}/'
+            })
+        
+        # Swap in the exam pre-resolved at session start when available
+        result = SessionService.get_adjustment_target(session, adjustment)
         
         if not result:
             return JsonResponse({
@@ -156,16 +329,19 @@ def adjust_difficulty(request, session_id):
         
         new_level, new_exam = result
         
-        # Use SessionService to update the session
-        SessionService.adjust_session_difficulty(
+        # Only switches if the session is still on the exam the client saw,
+        # so repeated clicks do not stack adjustments
+        applied = SessionService.adjust_session_difficulty(
             session=session,
             adjustment=adjustment,
             new_level=new_level,
-            new_exam=new_exam
+            new_exam=new_exam,
+            expected_exam_id=expected_exam_id
         )
         
         return JsonResponse({
             'success': True,
+            'applied': applied,
             'redirect_url': f'/api/placement/session/{session_id}/'
         })
         
@@ -198,12 +374,34 @@ def test_result(request, session_id):
     context = {
         'session': session,
         'exam': session.exam,
-        'answers': session.answers.select_related('question').all(),
+        'answers': GradingService.get_answer_sheet(session),
+        'attempts': GradingService.get_attempts(session),
         'curriculum_recommendation': session.final_curriculum_level,
     }
     return render(request, 'placement_test/test_result.html', context)
 
 
+@require_http_methods(["POST"])
+@handle_errors(ajax_only=True)
+def simulate_placement(request):
+    """Simulate placement for an applicant roster without creating sessions."""
+    upload = request.FILES.get('roster')
+    try:
+        if upload:
+            file_format = request.POST.get('format') or upload.name.rsplit('.', 1)[-1].lower()
+            content = upload.read().decode('utf-8-sig')
+        else:
+            file_format = 'json'
+            content = request.body.decode('utf-8')
+    except UnicodeDecodeError:
+        raise ValidationException("Roster must be UTF-8 encoded", code="INVALID_ENCODING")
+    
+    rows = PlacementService.parse_applicant_rows(content, file_format)
+    report = PlacementService.simulate_placements(rows)
+    
+    return JsonResponse({'success': True, **report})
+
+
 def exam_list(request):
     exams = Exam.objects.select_related('curriculum_level__subprogram__program').all()
     return render(request, 'placement_test/exam_list.html', {'exams': exams})
@@ -301,6 +499,7 @@ def exam_detail(request, exam_id):
         'exam': exam,
         'questions': questions,
         'audio_files': audio_files,
+        'in_progress_count': exam.sessions.filter(completed_at__isnull=True).count(),
     }
     return render(request, 'placement_test/exam_detail.html', context)
 
@@ -385,9 +584,15 @@ def update_question(request, question_id):
     question = get_object_or_404(Question, id=question_id)
     
     try:
+        key_before = answer_keys.get_answer_key(question.exam)
         question.correct_answer = request.POST.get('correct_answer', '')
         question.points = int(request.POST.get('points', 1))
+        if 'scoring_scheme' in request.POST:
+            question.scoring_scheme = ExamService.validate_scoring_scheme(
+                question.question_type, request.POST['scoring_scheme']
+            )
         question.save()
+        RegradeService.schedule_if_key_changed(question.exam, key_before)
         
         return JsonResponse({'success': True})
     except Exception as e:
@@ -488,11 +693,13 @@ def session_list(request):
 def session_detail(request, session_id):
     """Display detailed information about a specific session."""
     session = get_object_or_404(StudentSession, id=session_id)
-    answers = StudentAnswer.objects.filter(session=session).select_related('question').order_by('question__question_number')
+    answer_buffer.flush_session(session.id, wait=True)
+    answers = GradingService.get_answer_sheet(session)
     
     context = {
         'session': session,
         'answers': answers,
+        'answered_count': sum(1 for answer in answers if answer.answer),
     }
     return render(request, 'placement_test/session_detail.html', context)
 
@@ -502,6 +709,77 @@ def grade_session(request, session_id):
     return render(request, 'placement_test/grade_session.html', {'session': session})
 
 
+def _query_int(request, name, default=None, minimum=1, maximum=None):
+    value = request.GET.get(name)
+    if not value:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValidationException(f"{name} must be an integer", code="INVALID_PARAMETER", details={name: value})
+    if value < minimum or (maximum is not None and value > maximum):
+        raise ValidationException(f"{name} is out of range", code="INVALID_PARAMETER", details={name: value})
+    return value
+
+
+def _query_date(request, name):
+    value = request.GET.get(name)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        raise ValidationException(f"{name} must be a date (YYYY-MM-DD)", code="INVALID_PARAMETER", details={name: value})
+
+
+@require_http_methods(["GET"])
+@teacher_required
+@handle_errors(ajax_only=True)
+def grading_queue(request):
+    """
+    Page through answers waiting for manual grading, oldest first.
+    
+    Query parameters: exam (UUID), level (ID), date_from and date_to
+    (YYYY-MM-DD, day the session was completed), after (the next value of
+    the previous page) and limit.
+    """
+    exam_id = request.GET.get('exam') or None
+    if exam_id:
+        try:
+            exam_id = uuid.UUID(exam_id)
+        except ValueError:
+            raise ValidationException("exam must be a UUID", code="INVALID_PARAMETER", details={'exam': exam_id})
+    
+    page = GradingService.get_grading_queue(
+        exam_id=exam_id,
+        level_id=_query_int(request, 'level'),
+        date_from=_query_date(request, 'date_from'),
+        date_to=_query_date(request, 'date_to'),
+        after=_query_int(request, 'after'),
+        limit=_query_int(request, 'limit', DEFAULT_PAGE_SIZE, maximum=MAX_PAGE_SIZE),
+    )
+    return JsonResponse({'success': True, **page})
+
+
+@require_http_methods(["POST"])
+@teacher_required
+@handle_errors(ajax_only=True)
+def grade_answers(request):
+    """
+    Apply manual grades: {"grades": [{"answer_id": ..., "points": ...,
+    "is_correct": ...}]}. All grades are applied or none.
+    """
+    try:
+        grades = json.loads(request.body).get('grades')
+    except (json.JSONDecodeError, AttributeError):
+        raise ValidationException("Invalid JSON data", code="INVALID_JSON")
+    if not isinstance(grades, list) or not grades:
+        raise ValidationException("grades must be a non-empty list", code="INVALID_GRADES")
+    
+    result = GradingService.apply_manual_grades(grades)
+    return JsonResponse({'success': True, **result})
+
+
 def export_result(request, session_id):
     """Export session results as PDF or CSV."""
     session = get_object_or_404(StudentSession, id=session_id)
@@ -559,37 +837,53 @@ def update_exam_name(request, exam_id):
         }, status=500)
 
 
-@handle_errors()
-def get_audio(request, audio_id):
-    """Stream audio file instead of loading into memory."""
-    audio = get_object_or_404(AudioFile, id=audio_id)
+def _open_audio(audio):
+    """
+    Open an audio file for streaming.
     
-    try:
-        # Check if file exists
-        if not audio.audio_file:
-            raise AudioFileException(
-                "Audio file reference is missing",
-                code="NO_FILE_REFERENCE",
-                details={'audio_id': audio_id}
-            )
+    Returns:
+        (file, size in bytes)
         
-        # Use FileResponse for efficient file streaming
-        response = FileResponse(
-            audio.audio_file.open('rb'),
-            content_type='audio/mpeg'
+    Raises:
+        AudioFileException: If the file reference is missing or the file is
+            not on disk
+    """
+    # Check if file exists
+    if not audio.audio_file:
+        raise AudioFileException(
+            "Audio file reference is missing",
+            code="NO_FILE_REFERENCE",
+            details={'audio_id': audio.id}
         )
-        response['Content-Disposition'] = f'inline; filename="{audio.audio_file.name}"'
-        response['Content-Length'] = audio.audio_file.size
-        return response
+    
+    try:
+        return audio.audio_file.open('rb'), audio.audio_file.size
     except (FileNotFoundError, IOError) as e:
-        logger.error(f"Audio file error: {e}, path: {audio.audio_file.path if audio.audio_file else 'No file'}")
+        logger.error(f"Audio file error: {e}, path: {audio.audio_file.path}")
         raise AudioFileException(
             "Audio file not found on disk",
             code="FILE_NOT_FOUND",
-            details={'audio_id': audio_id, 'path': audio.audio_file.path if audio.audio_file else 'No file'}
+            details={'audio_id': audio.id, 'path': audio.audio_file.path}
         )
 
 
+def _audio_headers(response, audio, size):
+    response['Content-Disposition'] = f'inline; filename="{audio.audio_file.name}"'
+    response['Content-Length'] = size
+    return response
+
+
+@handle_errors()
+def get_audio(request, audio_id):
+    """Stream audio file instead of loading into memory."""
+    audio = get_object_or_404(AudioFile, id=audio_id)
+    audio_file, size = _open_audio(audio)
+    
+    # Use FileResponse for efficient file streaming
+    response = FileResponse(audio_file, content_type='audio/mpeg')
+    return _audio_headers(response, audio, size)
+
+
 @require_http_methods(["POST"])
 @csrf_exempt
 @handle_errors(ajax_only=True)
@@ -603,7 +897,10 @@ def save_exam_answers(request, exam_id):
         audio_assignments = data.get('audio_assignments', {})
         
         # Use ExamService to update questions
+        key_before = answer_keys.get_answer_key(exam)
         results = ExamService.update_exam_questions(exam, questions_data)
+        # Students who already took the exam are regraded in the background
+        regrade_job = RegradeService.schedule_if_key_changed(exam, key_before)
         
         # Handle audio assignments if provided
         audio_results = {}
@@ -615,7 +912,8 @@ def save_exam_answers(request, exam_id):
             'message': f'Successfully saved {len(questions_data)} questions',
             'details': results,
             'audio_assignments_saved': len(audio_assignments),
-            'audio_results': audio_results
+            'audio_results': audio_results,
+            'regrade_job_id': regrade_job.id if regrade_job else None
         })
         
     except json.JSONDecodeError:
@@ -636,6 +934,18 @@ def delete_exam(request, exam_id):
     return redirect('placement_test:exam_list')
 
 
+@require_http_methods(["POST"])
+@handle_errors(template_name='placement_test/exam_detail.html')
+def end_exam_sessions(request, exam_id):
+    """Grade and complete every in-progress session on an exam now."""
+    exam = get_object_or_404(Exam, id=exam_id)
+    
+    ended = SessionService.end_exam_sessions(exam)
+    
+    messages.success(request, f'Ended {ended} in-progress session{"" if ended == 1 else "s"} for "{exam.name}".')
+    return redirect('placement_test:exam_detail', exam_id=exam.id)
+
+
 @login_required
 @teacher_required
 def update_audio_names(request, exam_id):
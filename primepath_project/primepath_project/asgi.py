@@ -0,0 +1,22 @@
+"""
+ASGI config for primepath_project project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serving through it enables the async student endpoints
+(PLACEMENT_ASYNC_VIEWS) and turns off persistent database connections
+(DB_CONN_MAX_AGE), unless the environment sets them explicitly.
+See ASGI_DEPLOYMENT.md for the uvicorn/gunicorn setup.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.0/howto/deployment/asgi/
+"""
+
+import os
+
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'primepath_project.settings')
+os.environ.setdefault('PLACEMENT_ASYNC_VIEWS', 'True')
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+
+application = get_asgi_application()
@@ -58,6 +58,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'primepath_project.wsgi.application'
+ASGI_APPLICATION = 'primepath_project.asgi.application'
 
 # Database
 DATABASES = {
@@ -125,6 +126,48 @@ ENABLE_DIFFICULTY_ADJUSTMENT = config('ENABLE_DIFFICULTY_ADJUSTMENT', default=Tr
 ENABLE_AUDIO_SUPPORT = config('ENABLE_AUDIO_SUPPORT', default=True, cast=bool)
 ENABLE_AUTO_GRADING = config('ENABLE_AUTO_GRADING', default=True, cast=bool)
 
+# Placement: how an exam is picked among the active exams mapped to a level
+# (uniform, weighted, round_robin, least_loaded)
+PLACEMENT_EXAM_SELECTION_STRATEGY = config('PLACEMENT_EXAM_SELECTION_STRATEGY', default='uniform')
+
+# Placement: how submitted answers are stored.
+# 'direct' writes StudentAnswer rows on every save. 'write_behind' buffers them in
+# the shared cache (Redis/Memcached; falls back to direct with a local or dummy
+# cache) and flushes them every PLACEMENT_ANSWER_FLUSH_INTERVAL seconds via the
+# flush_answer_buffer command, as soon as a session has
+# PLACEMENT_ANSWER_BUFFER_MAX_PENDING unflushed answers, and always before a test
+# is completed. The max pending count bounds how many answers per session a cache
+# loss can drop; 1 effectively disables buffering.
+PLACEMENT_ANSWER_WRITE_MODE = config('PLACEMENT_ANSWER_WRITE_MODE', default='direct')
+PLACEMENT_ANSWER_FLUSH_INTERVAL = config('PLACEMENT_ANSWER_FLUSH_INTERVAL', default=5, cast=int)
+PLACEMENT_ANSWER_BUFFER_MAX_PENDING = config('PLACEMENT_ANSWER_BUFFER_MAX_PENDING', default=20, cast=int)
+
+# Placement: where answers live. 'rows' keeps one StudentAnswer row per answer;
+# 'packed' keeps all answers of a session in StudentSession.packed_answers (applies
+# to sessions started after the change). With PLACEMENT_ANSWER_PROJECT_ROWS, packed
+# sessions also get StudentAnswer rows once completed, for the admin and reporting.
+# Without it, only answers graded by hand get rows, for the manual grading queue.
+PLACEMENT_ANSWER_STORAGE = config('PLACEMENT_ANSWER_STORAGE', default='rows')
+PLACEMENT_ANSWER_PROJECT_ROWS = config('PLACEMENT_ANSWER_PROJECT_ROWS', default=True, cast=bool)
+
+# Placement: how typed (SHORT and MIXED) answers are matched against the key.
+# Text is compared after folding case, dropping punctuation and collapsing
+# whitespace as set here; with a max distance above 0, answers of at least
+# PLACEMENT_SHORT_ANSWER_FUZZY_MIN_LENGTH characters may also be that many
+# edits (Levenshtein) away from an accepted answer. Changes apply to answers
+# graded afterwards; run regrade_sessions --exam to regrade finished tests.
+PLACEMENT_SHORT_ANSWER_IGNORE_CASE = config('PLACEMENT_SHORT_ANSWER_IGNORE_CASE', default=True, cast=bool)
+PLACEMENT_SHORT_ANSWER_IGNORE_PUNCTUATION = config('PLACEMENT_SHORT_ANSWER_IGNORE_PUNCTUATION', default=False, cast=bool)
+PLACEMENT_SHORT_ANSWER_COLLAPSE_WHITESPACE = config('PLACEMENT_SHORT_ANSWER_COLLAPSE_WHITESPACE', default=True, cast=bool)
+PLACEMENT_SHORT_ANSWER_MAX_DISTANCE = config('PLACEMENT_SHORT_ANSWER_MAX_DISTANCE', default=0, cast=int)
+PLACEMENT_SHORT_ANSWER_FUZZY_MIN_LENGTH = config('PLACEMENT_SHORT_ANSWER_FUZZY_MIN_LENGTH', default=5, cast=int)
+
+# Placement: serve answer saves, test completion, the test page's snapshot and
+# clock polls, and audio with the async views in placement_test/async_views.py.
+# primepath_project/asgi.py turns this on; keep it off under WSGI, where async
+# views only add overhead. See ASGI_DEPLOYMENT.md.
+PLACEMENT_ASYNC_VIEWS = config('PLACEMENT_ASYNC_VIEWS', default=False, cast=bool)
+
 # Logging configuration
 # from core.logging_config import LOGGING_CONFIG
 # LOGGING = LOGGING_CONFIG
@@ -29,8 +29,9 @@ MIDDLEWARE.insert(1, 'django.middleware.security.SecurityMiddleware')
 # Production static files handling
 STATICFILES_STORAGE = 'django.contrib.staticfiles.storage.ManifestStaticFilesStorage'
 
-# Production database connection pooling
-DATABASES['default']['CONN_MAX_AGE'] = 60
+# Production database connection pooling (asgi.py defaults it to 0: under ASGI
+# requests run in short-lived threads, so persistent connections are not reused)
+DATABASES['default']['CONN_MAX_AGE'] = config('DB_CONN_MAX_AGE', default=60, cast=int)
 
 # Production caching
 CACHES = {